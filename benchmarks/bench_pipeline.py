@@ -0,0 +1,199 @@
+"""Headless throughput and latency benchmark for the server -> client1 pipeline.
+
+Each case starts server.py as a subprocess and runs client1's real ingestion
+path (fetch_live_data -> ingest queue -> point store -> decimated scatter
+series) in a fresh worker process with a DearPyGui context but no viewport.
+Results are written as JSON tagged with the current git commit so runs can
+be compared across commits:
+
+    python benchmarks/bench_pipeline.py --duration 5
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/pipeline-<old>.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Default sweep; every combination is one case
+BATCH_SIZES = (10, 1_000, 10_000)
+INTERVALS = (0.1, 0.01)          # Seconds between server batches
+HISTORY_SIZES = (0, 1_000_000)   # Points already in the store when the case starts
+WIRE_FORMATS = ("json", "binary")
+
+SERVER_START_TIMEOUT = 10.0
+
+
+class TimedQueue(queue.Queue):
+    """Ingest queue that remembers when each batch was queued by the network thread."""
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.drained = []
+
+    def put(self, item, block=True, timeout=None):
+        super().put((time.perf_counter(), item), block, timeout)
+
+    def get_nowait(self):
+        queued_at, item = super().get_nowait()
+        self.drained.append(queued_at)
+        return item
+
+    def reset_drained(self):
+        self.drained = []
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_case(case, duration):
+    """Run one case in the current (fresh) process and return its measurements."""
+    sys.path.insert(0, REPO_ROOT)
+    import dearpygui.dearpygui as dpg
+    import client1
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "server.py"), "--port", str(port),
+         "--batch-size", str(case["batch_size"]), "--interval", str(case["interval"])],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        dpg.create_context()
+        client1.main_gui(1920, 1080)
+        client1.PORT = port
+        client1.WIRE_FORMAT = case["wire_format"]
+        client1.ingest_queue = TimedQueue(maxsize=client1.INGEST_QUEUE_SIZE)
+        client1.update_flag = True
+        if case["history"]:
+            rng = np.random.default_rng(0)
+            client1.point_store.append(rng.uniform(0, 5, case["history"]), rng.uniform(-20, 80, case["history"]))
+
+        latencies, frame_times = [], []
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            threading.Thread(target=client1.fetch_live_data, args=(client1.ingest_queue,), daemon=True).start()
+            start_total = client1.point_store.total
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            deadline = wall_start + duration
+            while time.perf_counter() < deadline:
+                frame_start = time.perf_counter()
+                client1.drain_ingest_queue()
+                client1.update_live_series()
+                now = time.perf_counter()
+                latencies.extend(now - queued_at for queued_at in client1.ingest_queue.drained)
+                client1.ingest_queue.reset_drained()
+                frame_times.append(now - frame_start)
+                # Stand-in for the time render_dearpygui_frame spends drawing (60 fps)
+                time.sleep(max(0.0, 1 / 60 - (time.perf_counter() - frame_start)))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            client1.stop_flag = True
+
+        points = client1.point_store.total - start_total
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            **case,
+            "points": int(points),
+            "points_per_sec": points / wall,
+            "latency_p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+            "latency_p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+            "frame_p99_ms": float(np.percentile(np.array(frame_times) * 1000, 99)),
+            "cpu_percent": 100.0 * cpu / wall,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_row(result, baseline=None):
+    latency = result["latency_p99_ms"]
+    line = (f"{result['wire_format']:>6} batch={result['batch_size']:>6} interval={result['interval']:<5} "
+            f"history={result['history']:>8}  {result['points_per_sec']:>12,.0f} pts/s  "
+            f"p50={result['latency_p50_ms'] or 0:7.2f} ms  p99={latency or 0:7.2f} ms  "
+            f"cpu={result['cpu_percent']:5.1f}%  rss={result['peak_rss_mb']:7.1f} MB")
+    if baseline:
+        change = result["points_per_sec"] / baseline["points_per_sec"] - 1 if baseline["points_per_sec"] else 0
+        line += f"  ({change:+.1%} throughput)"
+    print(line)
+
+
+def case_key(result):
+    return (result["wire_format"], result["batch_size"], result["interval"], result["history"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per case")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--intervals", type=float, nargs="+", default=INTERVALS)
+    parser.add_argument("--history", type=int, nargs="+", default=HISTORY_SIZES)
+    parser.add_argument("--wire-formats", nargs="+", choices=WIRE_FORMATS, default=WIRE_FORMATS)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare throughput against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    cases = [{"wire_format": w, "batch_size": b, "interval": i, "history": h}
+             for w, b, i, h in itertools.product(args.wire_formats, args.batch_sizes, args.intervals, args.history)]
+    results = []
+    # One process per case so peak RSS and imported state never leak between cases
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_case, case, args.duration).result()
+        results.append(result)
+        print_row(result, baseline.get(case_key(result)))
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "run_at": datetime.now().isoformat(timespec="seconds"),
+                   "duration": args.duration, "results": results}, f, indent=4)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
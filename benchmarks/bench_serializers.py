@@ -0,0 +1,120 @@
+"""Micro-benchmark of the serializer backends on the sample files in data/.
+
+For every JSON and YAML file in data/, times loading the document and
+dumping it again with each installed backend (stdlib json and orjson;
+libyaml and pure-Python PyYAML), plus encoding and decoding the file's
+points as one wire batch (JSON backends and msgpack). Results are written
+as JSON tagged with the current git commit:
+
+    python benchmarks/bench_serializers.py --min-time 0.2
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_pipeline import RESULTS_DIR, git_commit  # noqa: E402
+from loader import iter_dataset_batches  # noqa: E402
+from serializers import JSON_CODECS, MSGPACK_CODEC, YAML_BACKEND, YamlDumper, YamlLoader  # noqa: E402
+
+# Each operation is repeated until it has run for at least this many seconds
+MIN_TIME = 0.2
+
+# Every YAML backend that is installed; libyaml only if PyYAML was built with it
+YAML_BACKENDS = {"python": (yaml.SafeLoader, yaml.SafeDumper)}
+if YAML_BACKEND == "libyaml":
+    YAML_BACKENDS["libyaml"] = (YamlLoader, YamlDumper)
+
+
+# Seconds per call of `operation`, from as many calls as fit in `min_time`
+def time_per_call(operation, min_time):
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or calls < 3:
+        operation()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def json_cases(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    document = json.loads(data)
+    for name, codec in JSON_CODECS.items():
+        yield "load", name, lambda codec=codec: codec.loads(data)
+        yield "dump", name, lambda codec=codec: codec.dumps(document)
+
+
+def yaml_cases(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    document = yaml.load(data, Loader=YamlLoader)
+    for name, (loader, dumper) in YAML_BACKENDS.items():
+        yield "load", name, lambda loader=loader: yaml.load(data, Loader=loader)
+        yield "dump", name, lambda dumper=dumper: yaml.dump(document, Dumper=dumper, default_flow_style=False)
+
+
+# The file's points as one batch, in the shape each wire format carries them
+def wire_cases(path):
+    batches = list(iter_dataset_batches(path, 1 << 30))
+    if not batches:
+        return
+    xs, ys = batches[0][0].tolist(), batches[0][1].tolist()
+    points = [{"x": x, "y": y} for x, y in zip(xs, ys)]
+    for name, codec in JSON_CODECS.items():
+        payload = codec.dumps(points)
+        yield "encode batch", name, lambda codec=codec: codec.dumps([{"x": x, "y": y} for x, y in zip(xs, ys)])
+        yield "decode batch", name, lambda codec=codec, payload=payload: codec.loads(payload)
+    if MSGPACK_CODEC is not None:
+        payload = MSGPACK_CODEC.dumps({"x": xs, "y": ys})
+        yield "encode batch", "msgpack", lambda: MSGPACK_CODEC.dumps({"x": xs, "y": ys})
+        yield "decode batch", "msgpack", lambda: MSGPACK_CODEC.loads(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default=os.path.join(REPO_ROOT, "data"))
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds to repeat each operation for")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/serializers-<commit>.json)")
+    args = parser.parse_args()
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(args.data_dir, "*"))):
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".json":
+            cases = list(json_cases(path)) + list(wire_cases(path))
+        elif extension in (".yaml", ".yml"):
+            cases = list(yaml_cases(path))
+        else:
+            continue
+        # The first backend of each operation is the stdlib/pure-Python baseline
+        baselines = {}
+        for operation, backend, call in cases:
+            seconds = time_per_call(call, args.min_time)
+            baseline = baselines.setdefault(operation, seconds)
+            results.append({"file": os.path.basename(path), "operation": operation, "backend": backend,
+                            "us_per_call": seconds * 1e6, "speedup": baseline / seconds})
+            print(f"{os.path.basename(path):>18} {operation:>12} {backend:>8}  "
+                  f"{seconds * 1e6:10.1f} µs  {baseline / seconds:5.1f}x")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"serializers-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "run_at": datetime.now().isoformat(timespec="seconds"),
+                   "results": results}, f, indent=4)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Bytes per point and CPU per point of each wire format on server.py workloads.
+
+Every workload is a stream of batches like the ones server.py sends: its
+default random readings, the --rate stress distributions, a drifting
+sensor quantized to ADC resolution, and replays of the recordings in
+data/. Each batch is encoded and decoded with every wire format and the
+totals are compared with plain JSON:
+
+    python benchmarks/bench_wire.py --batch-size 1000
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_pipeline import RESULTS_DIR, git_commit  # noqa: E402
+from loader import iter_dataset_batches  # noqa: E402
+from loadgen import DriftingSensor, burst_batch, uniform_batch  # noqa: E402
+from protocol import FORMAT_JSON, WIRE_FORMATS, decode_points, encode_points  # noqa: E402
+
+# Points per workload; replays are limited to the length of their file
+WORKLOAD_POINTS = 200_000
+
+# Resolution of the quantized sensor: 1 mV and 0.1 °C steps
+ADC_STEPS = (0.001, 0.1)
+
+
+def synthetic_workloads(batch_size, points):
+    rng = np.random.default_rng(0)
+    batches = points // batch_size
+    drift = DriftingSensor(np.random.default_rng(1))
+    sensor = DriftingSensor(np.random.default_rng(2))
+
+    def quantized(size):
+        xs, ys = sensor.batch(size)
+        return np.round(xs / ADC_STEPS[0]) * ADC_STEPS[0], np.round(ys / ADC_STEPS[1]) * ADC_STEPS[1]
+
+    yield "random", [uniform_batch(rng, batch_size) for _ in range(batches)]
+    yield "drift", [drift.batch(batch_size) for _ in range(batches)]
+    yield "drift-adc", [quantized(batch_size) for _ in range(batches)]
+    bursts = (burst_batch(rng, batch_size) for _ in range(batches * 10))
+    yield "burst", [batch for batch in bursts if len(batch[0])][:batches // 10 or 1]
+
+
+def replay_workloads(batch_size):
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, "data", "*.json"))):
+        batches = [batch for batch in iter_dataset_batches(path, batch_size) if len(batch[0])]
+        if batches:
+            yield f"replay:{os.path.basename(path)}", batches
+
+
+def measure(batches, wire_format):
+    points = sum(len(xs) for xs, _ in batches)
+    start = time.process_time()
+    payloads = [encode_points(xs, ys, wire_format) for xs, ys in batches]
+    encode_cpu = time.process_time() - start
+    start = time.process_time()
+    for payload in payloads:
+        decode_points(payload, wire_format)
+    decode_cpu = time.process_time() - start
+    return {
+        "points": points,
+        "bytes_per_point": sum(len(payload) for payload in payloads) / points,
+        "encode_ns_per_point": encode_cpu / points * 1e9,
+        "decode_ns_per_point": decode_cpu / points * 1e9,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=WORKLOAD_POINTS, help="points per synthetic workload")
+    parser.add_argument("--wire-formats", nargs="+", choices=WIRE_FORMATS, default=WIRE_FORMATS)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/wire-<commit>.json)")
+    args = parser.parse_args()
+
+    results = []
+    workloads = list(synthetic_workloads(args.batch_size, args.points)) + list(replay_workloads(args.batch_size))
+    for name, batches in workloads:
+        baseline = measure(batches, FORMAT_JSON)
+        for wire_format in args.wire_formats:
+            result = baseline if wire_format == FORMAT_JSON else measure(batches, wire_format)
+            result = {"workload": name, "wire_format": wire_format, "batch_size": args.batch_size, **result}
+            results.append(result)
+            print(f"{name:>24} {wire_format:>8}  {result['bytes_per_point']:6.2f} B/pt "
+                  f"({result['bytes_per_point'] / baseline['bytes_per_point']:6.1%} of JSON)  "
+                  f"encode {result['encode_ns_per_point']:7.0f} ns/pt  decode {result['decode_ns_per_point']:7.0f} ns/pt")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"wire-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "run_at": datetime.now().isoformat(timespec="seconds"),
+                   "results": results}, f, indent=4)
+    print(f"Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
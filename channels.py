@@ -0,0 +1,49 @@
+import math
+
+import numpy as np
+
+from protocol import DEFAULT_CHANNEL
+from retention import DEFAULT_TIERS, TieredRetention
+
+
+class Channel:
+    """Point store and plot state of one tagged stream (one battery pack).
+
+    The default channel holds untagged batches and loaded datasets and is
+    drawn by the original "live_series"; every other channel gets its own
+    scatter series the first time one of its batches arrives.
+    """
+
+    def __init__(self, channel_id, store, tiers=DEFAULT_TIERS):
+        self.id = channel_id
+        self.store = store
+        self.retention = TieredRetention(store, tiers)
+        if channel_id == DEFAULT_CHANNEL:
+            self.label, self.series_tag = "Live Data", "live_series"
+        else:
+            self.label, self.series_tag = f"Pack {channel_id}", f"channel_series_{channel_id}"
+        self.visible = True
+        self.decimator = None
+        self.decimated_total = 0  # store.total already fed into the decimator
+        self.density_total = 0    # store.total already binned into the density grid
+        self.dirty = False        # Set when points arrive that the scatter series does not show yet
+        self.index = None         # SpatialIndex, built the first time the channel is queried
+        self.expired = 0          # Raw points aged out since the decimator was last rebuilt
+        self.shown_since = math.inf  # Start of the history span the decimator was built for
+
+
+# Group points by channel, yielding (channel, xs, ys) once per channel present.
+# Points arrive in runs (one per batch), so this is linear in the number of points.
+def split_by_channel(xs, ys, channels):
+    if not len(channels):
+        return
+    starts = np.flatnonzero(channels[1:] != channels[:-1]) + 1
+    if not len(starts):
+        yield int(channels[0]), xs, ys
+        return
+    runs = {}
+    for start, end in zip(np.concatenate(([0], starts)), np.concatenate((starts, [len(channels)]))):
+        runs.setdefault(int(channels[start]), []).append((start, end))
+    for channel, spans in runs.items():
+        yield (channel, np.concatenate([xs[start:end] for start, end in spans]),
+               np.concatenate([ys[start:end] for start, end in spans]))
@@ -6,6 +6,13 @@ import os
 from datetime import datetime
 import socket
 import threading
+import logging
+
+from decimate import decimate_points
+from protocol import FORMAT_JSON, FrameReader, ProtocolError, check_hello_reply, encode_hello, recv_frames
+from serializers import json_dumps, json_loads
+
+log = logging.getLogger("client")
 
 # Socket settings
 HOST = '127.0.0.1'  # Localhost
@@ -26,24 +33,37 @@ def get_screen_resolution():
 # Function to receive data from the server
 def fetch_live_data(fake_data_storage):
     global stop_flag
+    reader = FrameReader()
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
         client_socket.connect((HOST, PORT))
+        client_socket.sendall(encode_hello(FORMAT_JSON))  # This client stores JSON text as-is
+        answered = False  # The first frame is the server's answer to our hello
         while not stop_flag:
-            data = client_socket.recv(1024)  # Receive data from server
-            if data:
+            frames = recv_frames(client_socket, reader)  # Receive complete frames from server
+            if not frames:
+                break
+            for frame in frames:
+                if not answered:
+                    try:
+                        check_hello_reply(frame, FORMAT_JSON)
+                    except ProtocolError as e:
+                        log.error(f"{e}")
+                        return
+                    answered = True
+                    continue
                 try:
                     # Decode JSON and re-serialize to ensure proper format
-                    decoded_data = json.loads(data.decode('utf-8'))  # Decode JSON from server
-                    serialized_data = json.dumps(decoded_data)  # Re-serialize the data
+                    decoded_data = json_loads(frame)  # Decode JSON from server
+                    serialized_data = json_dumps(decoded_data).decode('utf-8')  # Re-serialize the data
                     dpg.set_value(fake_data_storage, serialized_data)  # Store the serialized data
-                    print(f"Received and stored data: {serialized_data}")  # Debug output
+                    log.debug("Received and stored data: %s", serialized_data)
                 except json.JSONDecodeError as e:
-                    print(f"Error decoding JSON from server: {e}")
+                    log.error(f"Error decoding JSON from server: {e}")
                 
 # Debugging: Add print statements to check data flow
 def write_file(path, data, data_type):
-    print(f"Writing {data_type.upper()} file to: {path}")
-    print(f"Data: {data}")  # Debug: Print data to ensure it's not empty
+    log.info(f"Writing {data_type.upper()} file to: {path}")
+    log.debug("Data: %s", data)
 
     with open(path, "w") as f:
         if data_type == "json":
@@ -51,7 +71,7 @@ def write_file(path, data, data_type):
         elif data_type == "yaml":
             yaml.dump(data, f, default_flow_style=False)
 
-    print(f"{data_type.upper()} file saved to: {path}")
+    log.info(f"{data_type.upper()} file saved to: {path}")
 
 # Save to a default folder with a timestamp
 def save_to_default(data, data_type):
@@ -71,7 +91,7 @@ def export_data(data_type, use_default):
     # Retrieve serialized data stored in DearPyGUI
     raw_data_json = dpg.get_value("fake_data_storage")
     if not raw_data_json:
-        print("Error: No data found in 'fake_data_storage'.")
+        log.error("No data found in 'fake_data_storage'.")
         return
 
     # Deserialize the JSON string into Python objects
@@ -95,7 +115,7 @@ def file_dialog_callback(sender, app_data, user_data):
     # Retrieve serialized data stored in DearPyGUI
     raw_data_json = dpg.get_value("fake_data_storage")
     if not raw_data_json:
-        print("Error: No data found in 'fake_data_storage'.")
+        log.error("No data found in 'fake_data_storage'.")
         return
 
     # Deserialize the JSON string into Python objects
@@ -147,13 +167,13 @@ def start_periodic_update(plot_id, fake_data_storage):
             args=(plot_id, fake_data_storage),
             daemon=True
         ).start()
-        print("Started periodic updates.")
+        log.info("Started periodic updates.")
 
 # Stop periodic updates
 def stop_periodic_update():
     global update_flag
     update_flag = False
-    print("Stopped periodic updates.")
+    log.info("Stopped periodic updates.")
 
 # Update plot function
 def update_plot(sender, app_data, user_data):
@@ -164,12 +184,15 @@ def update_plot(sender, app_data, user_data):
         data = json.loads(raw_data_json)
         x_data = [point["x"] for point in data]
         y_data = [point["y"] for point in data]
-        dpg.configure_item(plot_id, x=x_data, y=y_data)
-        print(f"Updated plot with data: {data}")  # Debug: Print the updated data
+        # Draw at most one point per pixel bin of the current plot
+        x_data, y_data = decimate_points(x_data, y_data, dpg.get_axis_limits("x_axis"), dpg.get_axis_limits("y_axis"),
+                                         dpg.get_item_width("main_plot"), dpg.get_item_height("main_plot"))
+        dpg.configure_item(plot_id, x=x_data.tolist(), y=y_data.tolist())
+        log.debug("Updated plot with data: %s", data)
     except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
+        log.error(f"Error decoding JSON: {e}")
     except (KeyError, TypeError) as e:
-        print(f"Error processing data: {e}")
+        log.error(f"Error processing data: {e}")
 
 # Main GUI
 def main_gui(screen_width, screen_height):
@@ -196,8 +219,8 @@ def main_gui(screen_width, screen_height):
 
         # Create a plot for displaying live data
         with dpg.plot(label="2D Plot", height=plot_height, width=plot_width, pos=(plot_x, plot_y), tag="main_plot") as plot_id:
-            x_axis = dpg.add_plot_axis(dpg.mvXAxis, label="Battery Voltage (V)")
-            y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="Temperature (°C)")
+            x_axis = dpg.add_plot_axis(dpg.mvXAxis, label="Battery Voltage (V)", tag="x_axis")
+            y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="Temperature (°C)", tag="y_axis")
             scatter_series = dpg.add_scatter_series([], [], label="Live Data", parent=y_axis)
 
             # Set axis limits
@@ -300,10 +323,12 @@ def main_gui(screen_width, screen_height):
 def stop_fetching_live_data():
     global stop_flag
     stop_flag = True
-    print("Stopped fetching live data.")
+    log.info("Stopped fetching live data.")
 
 # Entry Point
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("CLIENT_LOG_LEVEL", "INFO"))
+
     # Get screen resolution dynamically
     screen_width, screen_height = get_screen_resolution()
 
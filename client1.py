@@ -1,20 +1,153 @@
 import dearpygui.dearpygui as dpg
 import json
-import yaml
+import logging
+import math
 import tkinter as tk
 import os
+import queue
 from datetime import datetime
 import socket
 import threading
 import time
 
+import numpy as np
+
+from channels import Channel, split_by_channel
+from decimate import DensityGrid, PixelDecimator, decimate_points, decimate_series
+from exporter import ExportJob
+from ingest_process import IngestProcess
+from loader import LoadJob
+from metrics import MetricsSampler, metrics
+from point_store import PointStore, timestamp
+from recording import RECORDING_EXTENSION, Recorder
+from retention import DEFAULT_TIERS
+from shm_ring import RingReader, local_ring_name
+from spatial_index import SpatialIndex
+from stats import StreamStats
+from protocol import (DEFAULT_CHANNEL, FORMAT_JSON, FRAME_HEADER, SEQUENCE_REPLAYED, FrameReader, HelloRefused,
+                      ProtocolError, SequenceTracker, backoff_delays, check_hello_reply, decode_points,
+                      decode_sequenced, encode_hello, peek_channel, recv_frames)
+
+log = logging.getLogger("client1")
+
+# Log level for the client; DEBUG logs every received batch
+LOG_LEVEL = os.environ.get("CLIENT_LOG_LEVEL", "INFO")
+
 # Socket settings
 HOST = '127.0.0.1'  # Localhost
 PORT = 65432        # Port of the server
+CONNECT_TIMEOUT = 5.0  # Seconds to wait for the server to accept a connection
+RECV_TIMEOUT = 0.5     # Seconds between checks of stop_flag while the socket is idle
+WIRE_FORMAT = FORMAT_JSON  # Requested from the server on connect; FORMAT_BINARY is much cheaper, FORMAT_XOR_ZLIB
+                           # smaller for slowly varying signals (noisy batches arrive as plain binary)
+
+# Fixed plot ranges: battery voltage (V) and temperature (°C)
+X_LIMITS = (0, 5)
+Y_LIMITS = (-20, 80)
 
 # Flags for control
 stop_flag = False
-update_flag = False
+fetch_thread = None  # Network thread of the "thread" ingest mode
+update_flag = False  # Whether the render loop pushes new points to the plot
+
+# Decoded batches handed from the network thread to the render loop
+INGEST_QUEUE_SIZE = 1024
+ingest_queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+
+# "thread" decodes on a thread of this process; "process" moves socket reading and
+# decoding to a separate process that shares its points through shared memory
+INGEST_MODE = "thread"
+ingest_process = None
+ingest_counters = {}  # Stream counters of the ingest process already added to metrics
+
+# How points reach this client: "tcp", "shm" (the shared-memory ring a server started with
+# --shm publishes on this host), or "auto" to use the ring when HOST is local and one exists
+TRANSPORT = "auto"
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+local_reader = None
+
+# Seconds per frame the render loop may spend moving batches into the point store
+FRAME_BUDGET = 0.004
+
+# Maximum number of live points kept in memory; the oldest are overwritten
+POINT_CAPACITY = 1_000_000
+
+# Columnar store of the default channel: untagged live batches and loaded datasets
+point_store = PointStore(POINT_CAPACITY)
+
+# Points kept per tagged channel; smaller so dozens of packs fit in memory
+CHANNEL_CAPACITY = 250_000
+
+# How long each channel keeps raw points and coarser aggregates (see retention.DEFAULT_TIERS)
+RETENTION_TIERS = DEFAULT_TIERS
+RETENTION_CHECK_INTERVAL = 1.0  # Seconds between expiry passes
+retention_checked_at = 0.0
+
+# Every channel seen so far, each with its own store, retention tiers, decimator and scatter series
+channels = {DEFAULT_CHANNEL: Channel(DEFAULT_CHANNEL, point_store, RETENTION_TIERS)}
+
+# Time span the plot covers; spans longer than the raw tier keeps are drawn from aggregates
+VIEW_SPANS = {"Last minute": 60, "Last 10 minutes": 600, "Last hour": 3600, "Last day": 86400, "All": math.inf}
+view_span = 600
+shown_tier = None  # Name of the aggregate tier on the plot; None while raw points are shown
+AGGREGATE_REFRESH_INTERVAL = 1.0  # Aggregates only change once per bin, so redraw them at most this often
+aggregates_refreshed_at = 0.0
+# Raw views only ever add points, so they are rebuilt once points this far (as a fraction
+# of the span) older than the history span could still be on the plot
+SPAN_REBUILD_SLACK = 0.1
+density_shown_since = math.inf  # Start of the history span the density grid was built for
+
+# Channels whose batches are dropped before decoding. Replaced rather than mutated,
+# so the network thread can test membership without a lock.
+hidden_channels = frozenset()
+
+# Display modes: individual (decimated) points, or a 2D density heat map binned as batches arrive
+DISPLAY_SCATTER = "Scatter"
+DISPLAY_DENSITY = "Density"
+display_mode = DISPLAY_SCATTER
+density_grid = None
+
+# Selection tools on main_plot. The selected region is kept rather than the points in it,
+# so exports re-query it and include points that arrived after it was drawn.
+SELECT_OFF = "Off"
+SELECT_BOX = "Box"
+SELECT_LASSO = "Lasso"
+selection_tool = SELECT_OFF
+selection_path = []      # Plot coordinates of the drag in progress
+selection_region = None  # ("box", (x0, x1), (y0, y1)) or ("lasso", xs, ys)
+selection_refreshed_at = 0.0
+LASSO_MAX_VERTICES = 64  # Lasso paths are thinned to this many vertices before querying
+
+# Hover readout of the point nearest to the mouse, within this many pixels
+HOVER_RADIUS_PX = 12
+hover_position = None  # Plot coordinates the readout was last computed for
+
+# Dataset being loaded from disk on a background thread
+load_job = None
+
+# Active binary recording, written from the network thread; None when not recording
+recorder = None
+
+# Set when new points reach the store and the plot has not caught up yet
+plot_dirty = False
+
+# Streaming statistics over everything ingested, shown next to the plot
+live_stats = StreamStats(X_LIMITS, Y_LIMITS)
+STATS_REFRESH_INTERVAL = 0.25  # Seconds between side panel refreshes
+stats_refreshed_at = 0.0
+stats_dirty = False
+
+# Optional window plotting voltage and temperature against arrival time. Following keeps the
+# newest span in view; otherwise the time axis pans and zooms freely. Either way only the
+# visible time range is read from the stores.
+TIME_SERIES = (("voltage", "Voltage (V)", X_LIMITS), ("temperature", "Temperature (°C)", Y_LIMITS))
+TIME_FOLLOW_SPANS = {"10 s": 10, "1 min": 60, "10 min": 600, "1 h": 3600}
+time_follow = True
+time_follow_span = 60
+TIME_SERIES_REFRESH_INTERVAL = 0.1
+time_series_refreshed_at = 0.0
+time_series_view = None  # (time limits, width) the series were last drawn for
+time_series_dirty = False
 
 # Detect screen resolution
 def get_screen_resolution():
@@ -23,118 +156,809 @@ def get_screen_resolution():
     root.withdraw()  # Hide the Tkinter window
     return root.winfo_screenwidth(), root.winfo_screenheight()
 
-# Fetch live data from the server
-def fetch_live_data(fake_data_storage):
-    global stop_flag
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
+# Receive batches on a connected socket until the server goes away or stop_flag is set;
+# returns whether any frame arrived, so the caller knows the connection really worked
+def receive_batches(client_socket, batch_queue, tracker):
+    reader = FrameReader()
+    received = False
+    answered = False  # The first frame is the server's answer to our hello
+    while not stop_flag:
         try:
-            client_socket.connect((HOST, PORT))
-            print(f"Connected to server at {HOST}:{PORT}")
-            while not stop_flag:
-                data = client_socket.recv(1024)  # Receive data from server
-                if data:
-                    try:
-                        # Decode the received data
-                        new_data = json.loads(data.decode('utf-8'))
-
-                        # Retrieve existing data from fake_data_storage
-                        existing_data_json = dpg.get_value(fake_data_storage)
-                        existing_data = json.loads(existing_data_json)
-
-                        # Append new data points
-                        existing_data.extend(new_data)
-
-                        # Save the updated list back to fake_data_storage
-                        dpg.set_value(fake_data_storage, json.dumps(existing_data))
-
-                        print(f"Received and accumulated data: {new_data}")
-                    except json.JSONDecodeError as e:
-                        print(f"Error decoding JSON: {e}")
-        except Exception as e:
-            print(f"Error fetching live data: {e}")
-
-# Write data to a file
-def write_file(path, data, data_type):
-    with open(path, "w") as f:
-        if data_type == "json":
-            json.dump(data, f, indent=4)
-        elif data_type == "yaml":
-            yaml.dump(data, f, default_flow_style=False)
-    print(f"{data_type.upper()} file saved to: {path}")
+            frames = recv_frames(client_socket, reader)
+        except socket.timeout:
+            continue
+        if not frames:
+            log.info("Server closed the connection.")
+            return received
+        received = True
+        # A single recv may complete several batches; drain them all
+        for frame in frames:
+            if not answered:
+                check_hello_reply(frame, WIRE_FORMAT)
+                answered = True
+                continue
+            metrics.count("bytes_received", len(frame) + FRAME_HEADER.size)
+            metrics.count("batches_received")
+            try:
+                stream, sequence, _timestamp, flags, payload = decode_sequenced(frame)
+                gaps, missed = tracker.gaps, tracker.missed
+                if not tracker.accept(stream, sequence):
+                    metrics.count("duplicate_batches")
+                    continue
+                if tracker.gaps != gaps:
+                    metrics.count("sequence_gaps")
+                    metrics.count("batches_missed", tracker.missed - missed)
+                    log.warning(f"Missed {tracker.missed - missed} batches before #{sequence}; the server dropped "
+                                f"them because this client fell behind, or they left its replay buffer while away")
+                if flags & SEQUENCE_REPLAYED:
+                    metrics.count("batches_replayed")
+                channel = peek_channel(payload, WIRE_FORMAT)
+                if channel in hidden_channels:
+                    metrics.count("hidden_batches")
+                    continue
+                with metrics.timed("decode"):
+                    x_data, y_data = decode_points(payload, WIRE_FORMAT)
+                active_recorder = recorder
+                if active_recorder is not None:
+                    active_recorder.append(x_data, y_data)
+                # Blocks when the render loop falls behind, pushing back on the socket
+                batch_queue.put((channel, x_data, y_data))
+                log.debug("Received %d points", len(x_data))
+            except (json.JSONDecodeError, ProtocolError) as e:
+                metrics.count("malformed_batches")
+                log.error(f"Error decoding batch: {e}")
+            except (KeyError, TypeError) as e:
+                metrics.count("malformed_batches")
+                log.error(f"Error processing data: {e}")
+    return received
+
+# Fetch live data from the server and queue decoded batches for the render loop.
+# Reconnects with backoff whenever the connection drops, asking the server to
+# replay the batches sent in the meantime, until stop_flag is set.
+def fetch_live_data(batch_queue):
+    tracker = SequenceTracker()
+    delays = backoff_delays()
+    while not stop_flag:
+        try:
+            with socket.create_connection((HOST, PORT), timeout=CONNECT_TIMEOUT) as client_socket:
+                client_socket.settimeout(RECV_TIMEOUT)
+                client_socket.sendall(encode_hello(WIRE_FORMAT, True, tracker.stream, tracker.last))
+                if tracker.stream:
+                    metrics.count("reconnects")
+                    log.info(f"Reconnected to server at {HOST}:{PORT}, resuming after batch #{tracker.last}")
+                else:
+                    log.info(f"Connected to server at {HOST}:{PORT} ({WIRE_FORMAT})")
+                if receive_batches(client_socket, batch_queue, tracker):
+                    delays = backoff_delays()
+        except HelloRefused as e:
+            log.error(f"{e}; not reconnecting")  # Asking again would be refused again
+            return
+        except ProtocolError as e:
+            log.error(f"Protocol error, dropping connection: {e}")
+        except OSError as e:
+            log.warning(f"Connection to {HOST}:{PORT} failed: {e}")
+        if stop_flag:
+            break
+        delay = next(delays)
+        log.info(f"Reconnecting in {delay:.1f} s")
+        deadline = time.monotonic() + delay
+        while not stop_flag and time.monotonic() < deadline:
+            time.sleep(min(RECV_TIMEOUT, deadline - time.monotonic()))
+
+# Export jobs still running on background threads
+export_jobs = []
+
+# Metadata block written at the top of every export
+def export_metadata(region=None):
+    metadata = {
+        "export_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": "Live Data Feed"
+    }
+    if len(channels) > 1:
+        metadata["channels"] = sorted(channel.id for channel in visible_channels())
+    if region is not None:
+        shape, xs, ys = region
+        metadata["selection"] = {"shape": shape, "x": list(xs), "y": list(ys)}
+    return metadata
+
+def visible_channels():
+    return [channel for channel in channels.values() if channel.visible]
+
+# Points of every visible channel, one channel after another
+def visible_snapshot():
+    columns = [channel.store.snapshot() for channel in visible_channels()]
+    if not columns:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty
+    return np.concatenate([xs for xs, _ in columns]), np.concatenate([ys for _, ys in columns])
+
+# Write a snapshot of one store (by default, of all visible channels, or of just
+# the selected region with "Selection Only") to a file on a background thread
+def write_file(path, data_type, store=None):
+    region = None
+    if store is not None:
+        x_data, y_data = store.snapshot()
+    elif dpg.get_value("selection_only_checkbox"):
+        if selection_region is None:
+            log.error("Nothing is selected; draw a box or lasso, or untick Selection Only.")
+            return
+        region = selection_region
+        x_data, y_data = select_points(region)
+    else:
+        x_data, y_data = visible_snapshot()
+    compact = data_type == "json" and dpg.get_value("compact_json_checkbox")
+    export_jobs.append(ExportJob(path, x_data, y_data, data_type, export_metadata(region), compact).start())
+    log.info(f"Exporting {len(x_data)} points as {data_type.upper()} to: {path}")
 
 # Save to a default folder with a timestamp
-def save_to_default(data, data_type):
+def save_to_default(data_type):
     default_folder = os.path.join(os.getcwd(), "data")
     os.makedirs(default_folder, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     save_path = os.path.join(default_folder, f"output_{timestamp}.{data_type}")
-    write_file(save_path, data, data_type)
+    write_file(save_path, data_type)
 
 # Export function
 def export_data(data_type, use_default):
-    raw_data_json = dpg.get_value("fake_data_storage")
-    if not raw_data_json:
-        print("Error: No data found in 'fake_data_storage'.")
+    if not any(len(channel.store) for channel in visible_channels()):
+        log.error("No data found in the visible channels.")
         return
     try:
-        raw_data = json.loads(raw_data_json)
-        structured_data = {
-            "metadata": {
-                "export_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "source": "Live Data Feed"
-            },
-            "regions": [{"x": point["x"], "y": point["y"]} for point in raw_data]
-        }
         if use_default:
-            save_to_default(structured_data, data_type)
+            save_to_default(data_type)
         else:
             dpg.show_item(f"file_dialog_{data_type}")
     except Exception as e:
-        print(f"Error exporting data: {e}")
+        log.error(f"Error exporting data: {e}")
 
 # File dialog callback
 def file_dialog_callback(sender, app_data, user_data):
     selected_path = app_data["file_path_name"]
     data_type = user_data
-    raw_data_json = dpg.get_value("fake_data_storage")
     try:
-        raw_data = json.loads(raw_data_json)
-        structured_data = {
-            "metadata": {
-                "export_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "source": "Live Data Feed"
-            },
-            "regions": [{"x": point["x"], "y": point["y"]} for point in raw_data]
-        }
-        write_file(selected_path, structured_data, data_type)
+        write_file(selected_path, data_type)
     except Exception as e:
-        print(f"Error processing export: {e}")
+        log.error(f"Error processing export: {e}")
 
-# Periodically update the plot
-def periodic_update_plot(plot_id, fake_data_storage, interval=1.0):
-    global update_flag
-    while update_flag:
-        raw_data_json = dpg.get_value(fake_data_storage)
-        if raw_data_json:
-            data = json.loads(raw_data_json)
-            x_data = [point["x"] for point in data]
-            y_data = [point["y"] for point in data]
-            dpg.configure_item(plot_id, x=x_data, y=y_data)
-        time.sleep(interval)
-
-# Start periodic updates
-def start_periodic_update(plot_id, fake_data_storage):
+# Record button callback: start or stop appending incoming batches to a binary log
+def toggle_recording(sender, app_data):
+    global recorder
+    if app_data and recorder is None:
+        default_folder = os.path.join(os.getcwd(), "data")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        try:
+            os.makedirs(default_folder, exist_ok=True)
+            recorder = Recorder(os.path.join(default_folder, f"recording_{timestamp}{RECORDING_EXTENSION}"))
+        except OSError as e:
+            log.error(f"Could not start recording: {e}")
+            dpg.set_value(sender, False)
+            return
+        log.info(f"Recording to: {recorder.path}")
+    elif not app_data and recorder is not None:
+        finished, recorder = recorder, None
+        try:
+            finished.close()
+        except OSError as e:
+            log.error(f"Error finishing recording {finished.path}: {e}")
+            return
+        log.info(f"Recorded {finished.points_written} points to: {finished.path}")
+
+# Open dataset dialog callback: load the file off the render thread
+def open_dataset_callback(sender, app_data):
+    global load_job
+    if load_job is not None:
+        log.warning("A dataset is already loading.")
+        return
+    load_job = LoadJob(app_data["file_path_name"]).start()
+    log.info(f"Loading dataset: {load_job.path}")
+
+# Replace the default channel's contents with a finished dataset load and redraw the plot
+def apply_loaded_dataset():
+    global load_job, density_grid
+    if load_job is None or not load_job.done:
+        return
+    job, load_job = load_job, None
+    if job.error:
+        log.error(f"Error loading {job.path}: {job.error}")
+        return
+    x_data, y_data, metadata = job.result
+    channel = channels[DEFAULT_CHANNEL]
+    if not channel.visible:
+        dpg.set_value(f"channel_checkbox_{channel.id}", True)
+        set_channel_visible(None, True, channel.id)
+    channel.store.clear()
+    channel.retention.reset()
+    live_stats.reset()
+    ingest_points(channel.id, x_data, y_data, pinned=True)
+    if len(x_data) > channel.store.capacity:
+        log.warning(f"Dataset has {len(x_data)} points; keeping the newest {channel.store.capacity}")
+    channel.decimator = channel.index = density_grid = None  # Rebuild from the new contents
+    start_plot_updates()
+    log.info(f"Loaded {len(channel.store)} points from {job.path} ({(metadata or {}).get('source', 'no metadata')})")
+
+# Show progress of running exports and report the ones that finished
+def update_export_progress():
+    if not export_jobs:
+        return
+    for job in [job for job in export_jobs if job.done]:
+        export_jobs.remove(job)
+        if job.error:
+            log.error(f"Error exporting {job.path}: {job.error}")
+        else:
+            log.info(f"{job.data_type.upper()} file saved to: {job.path}")
+    if export_jobs:
+        progress = min(job.progress for job in export_jobs)
+        dpg.set_value("export_progress", progress)
+        dpg.configure_item("export_progress", overlay=f"Exporting... {progress:.0%}", show=True)
+    else:
+        dpg.configure_item("export_progress", show=False)
+
+# Current plot size in pixels and visible axis ranges
+def current_view(plot_id):
+    x_limits, y_limits = tuple(dpg.get_axis_limits("x_axis")), tuple(dpg.get_axis_limits("y_axis"))
+    # Axes report (0, 0) until the first frame has been rendered
+    if x_limits[0] == x_limits[1] or y_limits[0] == y_limits[1]:
+        x_limits, y_limits = X_LIMITS, Y_LIMITS
+    return x_limits, y_limits, dpg.get_item_width(plot_id), dpg.get_item_height(plot_id)
+
+# Look up a channel, creating its store, scatter series and checkbox the first time it is seen
+def get_channel(channel_id):
+    channel = channels.get(channel_id)
+    if channel is None:
+        channel = channels[channel_id] = Channel(channel_id, PointStore(CHANNEL_CAPACITY), RETENTION_TIERS)
+        dpg.add_scatter_series([], [], label=channel.label, parent="y_axis", tag=channel.series_tag,
+                               show=display_mode == DISPLAY_SCATTER)
+        add_channel_checkbox(channel)
+        log.info(f"New channel: {channel.label}")
+    return channel
+
+# Hand a batch that reached the render thread to its channel's store, retention tiers and
+# the running statistics. Pinned batches (loaded datasets) have no arrival time and never age out.
+def ingest_points(channel_id, x_data, y_data, pinned=False):
+    global plot_dirty, stats_dirty, time_series_dirty
+    channel = get_channel(channel_id)
+    if not channel.visible:  # Queued before the channel was hidden
+        return
+    with metrics.timed("store_append"):
+        channel.retention.add(x_data, y_data, None if pinned else time.time())
+    live_stats.add(x_data, y_data)
+    channel.dirty = plot_dirty = stats_dirty = time_series_dirty = True
+
+# Move queued batches into the channel stores until the queue is empty or the budget is spent
+def drain_ingest_queue(budget=FRAME_BUDGET):
+    deadline = time.perf_counter() + budget
+    while time.perf_counter() < deadline:
+        try:
+            channel_id, x_data, y_data = ingest_queue.get_nowait()
+        except queue.Empty:
+            break
+        ingest_points(channel_id, x_data, y_data)
+
+# Copy points published to a shared ring since the last frame into the channel stores.
+# `source` is the IngestProcess or the RingReader of the local transport.
+def drain_shared_ring(source):
+    lost = source.lost
+    x_data, y_data, channel_ids = source.read_new()
+    if source.lost != lost:
+        metrics.count("points_dropped", source.lost - lost)
+    if len(x_data):
+        metrics.count("batches_received")
+        for channel_id, channel_x, channel_y in split_by_channel(x_data, y_data, channel_ids):
+            # The ingest process drops hidden channels itself; a server's ring carries them all
+            if channel_id in hidden_channels:
+                metrics.count("hidden_batches")
+                continue
+            ingest_points(channel_id, channel_x, channel_y)
+        active_recorder = recorder
+        if active_recorder is not None:
+            active_recorder.append(x_data, y_data)
+
+# Add what the ingest process counted since the last frame (replays, gaps, reconnects) to metrics
+def report_ingest_counters():
+    global ingest_counters
+    counters = ingest_process.counters
+    for name, value in counters.items():
+        if value != ingest_counters.get(name, 0):
+            metrics.count(name, value - ingest_counters.get(name, 0))
+    ingest_counters = counters
+
+# Age raw points and aggregate bins out of every channel's retention tiers
+def expire_retention():
+    global retention_checked_at, density_grid
+    now = time.time()
+    if now - retention_checked_at < RETENTION_CHECK_INTERVAL:
+        return
+    retention_checked_at = now
+    for channel in channels.values():
+        dropped = channel.retention.expire(now)
+        if not dropped:
+            continue
+        metrics.count("points_expired", dropped)
+        channel.expired += dropped
+        # The decimator and density grid only ever add points; once as many have
+        # aged out as remain, rebuild them so expired points leave the plot
+        if channel.expired >= len(channel.store):
+            channel.decimator = density_grid = None
+            channel.expired = 0
+
+# History combo callback: pick the time span, and with it the retention tier the plot draws from
+def set_view_span(sender, app_data):
+    global view_span, aggregates_refreshed_at, density_grid
+    view_span = VIEW_SPANS[app_data]
+    aggregates_refreshed_at = 0.0  # Redraw on the next frame
+    for channel in channels.values():
+        channel.decimator = None
+    density_grid = None
+
+# A channel's raw points in the history span, and the arrival time the span starts at. Loaded
+# (pinned) datasets never age out, so with one in the store everything from it on is shown.
+def raw_points_in_span(channel):
+    pinned = channel.retention.pinned_since()
+    if pinned is not None:
+        xs, ys, _total = channel.store.read_since(pinned)
+        return xs, ys, math.inf
+    since = timestamp() - view_span
+    _ts, xs, ys = channel.store.time_slice(since, math.inf)
+    return xs, ys, since
+
+# Whether points older than the history span may still be on a raw view built at `shown_since`
+def span_outdated(shown_since):
+    return timestamp() - view_span - shown_since > view_span * SPAN_REBUILD_SLACK
+
+# Redraw the plot for the current span: raw points while the raw tier covers it, else aggregate bins
+def update_plot():
+    global shown_tier, density_grid
+    tier = channels[DEFAULT_CHANNEL].retention.tier_for_span(view_span)
+    if tier is None:
+        if shown_tier is not None:
+            # Back from aggregates: the incremental views start over from the raw points
+            shown_tier = None
+            for channel in channels.values():
+                channel.decimator = None
+            density_grid = None
+            dpg.set_value("tier_text", "Showing raw points")
+        if display_mode == DISPLAY_DENSITY:
+            update_density_series("density_series")
+        else:
+            update_live_series()
+    else:
+        update_aggregate_series(tier.name)
+
+# Draw each visible channel's aggregate bins in the visible span: bin means as points, or
+# count-weighted in the density grid
+def update_aggregate_series(tier_name):
+    global shown_tier, aggregates_refreshed_at, density_grid
+    now = time.time()
+    if tier_name == shown_tier and now - aggregates_refreshed_at < AGGREGATE_REFRESH_INTERVAL:
+        return
+    shown_tier, aggregates_refreshed_at = tier_name, now
+    dpg.set_value("tier_text", f"Showing {tier_name} aggregates")
+    with metrics.timed("plot_update"):
+        view = current_view("main_plot")
+        if display_mode == DISPLAY_DENSITY:
+            density_grid = DensityGrid(*view)
+        for channel in visible_channels():
+            tier = channel.retention.tier_for_span(view_span)
+            bins = tier.bins_since(now - view_span)
+            if display_mode == DISPLAY_DENSITY:
+                density_grid.add(bins["x_mean"], bins["y_mean"], weights=bins["count"])
+            else:
+                x_shown, y_shown = decimate_points(bins["x_mean"], bins["y_mean"], *view)
+                dpg.configure_item(channel.series_tag, x=x_shown.tolist(), y=y_shown.tolist())
+        if display_mode == DISPLAY_DENSITY:
+            push_density_grid("density_series", density_grid)
+
+# Push new points to the scatter series of every visible channel; hidden ones cost nothing
+def update_live_series():
+    view = current_view("main_plot")
+    for channel in visible_channels():
+        update_channel_series(channel, view)
+
+# Feed a channel's new points to its decimator; rebuild it if the plot was resized or rescaled
+def update_channel_series(channel, view):
+    rebuild = (channel.decimator is None or channel.decimator.needs_rebuild(*view)
+               or span_outdated(channel.shown_since))
+    if not (channel.dirty or rebuild):
+        return
+    with metrics.timed("plot_update"):
+        if rebuild:
+            channel.decimator = PixelDecimator(*view)
+            x_new, y_new, channel.shown_since = raw_points_in_span(channel)
+            channel.decimated_total = channel.store.total
+        else:
+            x_new, y_new, channel.decimated_total = channel.store.read_since(channel.decimated_total)
+        channel.decimator.add(x_new, y_new)
+        channel.dirty = False
+        x_data, y_data = channel.decimator.points()
+        dpg.configure_item(channel.series_tag, x=x_data.tolist(), y=y_data.tolist())
+
+# Bin new points of the visible channels into the density grid and push it to the heat series;
+# rebuilt on resize, rescale or a change of visible channels
+def update_density_series(series_id):
+    global density_grid, plot_dirty, density_shown_since
+    view = current_view("main_plot")
+    rebuild = density_grid is None or density_grid.needs_rebuild(*view) or span_outdated(density_shown_since)
+    if not (plot_dirty or rebuild):
+        return
+    with metrics.timed("plot_update"):
+        if rebuild:
+            density_grid = DensityGrid(*view)
+            density_shown_since = math.inf
+            for channel in visible_channels():
+                x_new, y_new, since = raw_points_in_span(channel)
+                density_shown_since = min(density_shown_since, since)
+                channel.density_total = channel.store.total
+                density_grid.add(x_new, y_new)
+        else:
+            for channel in visible_channels():
+                x_new, y_new, channel.density_total = channel.store.read_since(channel.density_total)
+                density_grid.add(x_new, y_new)
+        plot_dirty = False
+        push_density_grid(series_id, density_grid)
+
+def push_density_grid(series_id, grid):
+    # Log scale keeps sparse cells visible next to the dense core
+    values = np.log1p(grid.rows())
+    rows, cols = values.shape
+    (x_min, x_max), (y_min, y_max) = grid.x_limits, grid.y_limits
+    dpg.configure_item(series_id, rows=rows, cols=cols, scale_max=max(float(values.max()), 1.0),
+                       bounds_min=(x_min, y_min), bounds_max=(x_max, y_max))
+    dpg.set_value(series_id, [values.ravel().tolist()])
+
+# Switch between the scatter and density views; the newly shown one catches up from the store
+def set_display_mode(sender, app_data):
+    global display_mode, plot_dirty, aggregates_refreshed_at
+    display_mode = app_data
+    aggregates_refreshed_at = 0.0
+    for channel in channels.values():
+        dpg.configure_item(channel.series_tag, show=channel.visible and display_mode == DISPLAY_SCATTER)
+    dpg.configure_item("density_series", show=display_mode == DISPLAY_DENSITY)
+    plot_dirty = True
+
+# Checkbox for a channel in the channel list, kept in channel ID order
+def add_channel_checkbox(channel):
+    later = [other for other in channels if other > channel.id and dpg.does_item_exist(f"channel_checkbox_{other}")]
+    dpg.add_checkbox(label=channel.label, default_value=channel.visible, callback=set_channel_visible,
+                     user_data=channel.id, parent="channel_list", tag=f"channel_checkbox_{channel.id}",
+                     before=f"channel_checkbox_{min(later)}" if later else 0)
+
+# Channel checkbox callback: hidden channels are skipped before decoding and never drawn
+def set_channel_visible(sender, app_data, user_data):
+    global hidden_channels, density_grid, aggregates_refreshed_at, time_series_dirty
+    channel = channels[user_data]
+    channel.visible = app_data
+    if app_data:
+        hidden_channels = hidden_channels - {channel.id}
+    else:
+        hidden_channels = hidden_channels | {channel.id}
+    if ingest_process is not None:
+        ingest_process.set_hidden(channel.id, not app_data)
+    dpg.configure_item(channel.series_tag, show=app_data and display_mode == DISPLAY_SCATTER)
+    density_grid = None  # Re-bin without (or with) this channel
+    aggregates_refreshed_at = 0.0
+    time_series_dirty = True
+
+def set_all_channels_visible(visible):
+    for channel in list(channels.values()):
+        if channel.visible != visible:
+            dpg.set_value(f"channel_checkbox_{channel.id}", visible)
+            set_channel_visible(None, visible, channel.id)
+
+# A channel's spatial index, brought up to date with its store
+def channel_index(channel):
+    if channel.index is None:
+        channel.index = SpatialIndex(X_LIMITS, Y_LIMITS)
+    channel.index.update(channel.store)
+    return channel.index
+
+# Points of the visible channels inside a selected region
+def select_points(region):
+    shape, xs, ys = region
+    with metrics.timed("selection_query"):
+        if shape == "box":
+            columns = [channel_index(channel).query_box(xs, ys) for channel in visible_channels()]
+        else:
+            columns = [channel_index(channel).query_polygon(xs, ys) for channel in visible_channels()]
+    if not columns:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty
+    return np.concatenate([x for x, _ in columns]), np.concatenate([y for _, y in columns])
+
+def set_selection_tool(sender, app_data):
+    global selection_tool
+    selection_tool = app_data
+
+# Track a left-button drag on the plot while a selection tool is active; select on release
+def update_selection_drag():
+    global selection_path
+    if selection_tool == SELECT_OFF:
+        return
+    pressed = dpg.is_mouse_button_down(dpg.mvMouseButton_Left)
+    if pressed and (selection_path or dpg.is_item_hovered("main_plot")):
+        position = list(dpg.get_plot_mouse_pos())
+        if selection_path and position == selection_path[-1]:
+            return
+        selection_path.append(position)
+        if selection_tool == SELECT_BOX:
+            (x0, y0), (x1, y1) = selection_path[0], selection_path[-1]
+            outline = [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+        else:
+            outline = selection_path + selection_path[:1]
+        dpg.configure_item("selection_outline", points=outline, show=True)
+    elif selection_path and not pressed:
+        path, selection_path = selection_path, []
+        if selection_tool == SELECT_BOX:
+            (x0, y0), (x1, y1) = path[0], path[-1]
+            set_selection(("box", (x0, x1), (y0, y1)))
+        elif len(path) >= 3:
+            vertices = path[::max(1, len(path) // LASSO_MAX_VERTICES)]
+            set_selection(("lasso", [x for x, _ in vertices], [y for _, y in vertices]))
+        else:
+            clear_selection()
+
+def set_selection(region):
+    global selection_region
+    selection_region = region
+    refresh_selection(force=True)
+
+def clear_selection():
+    global selection_region, selection_path
+    selection_region, selection_path = None, []
+    dpg.configure_item("selection_outline", show=False)
+    dpg.configure_item("selection_series", show=False)
+    dpg.set_value("selection_text", "")
+
+# Re-query the selected region and highlight it; throttled like the statistics panel
+def refresh_selection(force=False):
+    global selection_refreshed_at
+    now = time.monotonic()
+    if selection_region is None or not (force or now - selection_refreshed_at >= STATS_REFRESH_INTERVAL):
+        return
+    selection_refreshed_at = now
+    x_data, y_data = select_points(selection_region)
+    x_shown, y_shown = decimate_points(x_data, y_data, *current_view("main_plot"))
+    dpg.configure_item("selection_series", x=x_shown.tolist(), y=y_shown.tolist(), show=True)
+    dpg.set_value("selection_text", f"{len(x_data):,} points selected")
+
+# Show the nearest visible point under the mouse; recomputed only when the mouse moves
+def update_hover():
+    global hover_position
+    if selection_path or not dpg.is_item_hovered("main_plot"):
+        if hover_position is not None:
+            hover_position = None
+            dpg.configure_item("hover_annotation", show=False)
+        return
+    position = tuple(dpg.get_plot_mouse_pos())
+    if position == hover_position:
+        return
+    hover_position = position
+    _, _, width, height = current_view("main_plot")
+    max_distance = HOVER_RADIUS_PX / max(min(width, height), 1)
+    best = None
+    with metrics.timed("hover_query"):
+        for channel in visible_channels():
+            hit = channel_index(channel).nearest(*position, max_distance)
+            if hit is not None and (best is None or hit[2] < best[1][2]):
+                best = channel, hit
+    if best is None:
+        dpg.configure_item("hover_annotation", show=False)
+        return
+    channel, (x, y, _) = best
+    dpg.configure_item("hover_annotation", default_value=(x, y), show=True,
+                       label=f"{channel.label}: {x:.3f} V, {y:.2f} °C")
+
+# Start pushing new data to the plot
+def start_plot_updates():
     global update_flag
-    if not update_flag:
-        update_flag = True
-        threading.Thread(target=periodic_update_plot, args=(plot_id, fake_data_storage), daemon=True).start()
-        print("Started periodic updates.")
+    update_flag = True
+    log.info("Started plot updates.")
 
-# Stop periodic updates
-def stop_periodic_update():
+# Stop pushing new data to the plot (data keeps accumulating in the store)
+def stop_plot_updates():
     global update_flag
     update_flag = False
-    print("Stopped periodic updates.")
+    log.info("Stopped plot updates.")
+
+# Side panel with session and sliding-window statistics and histograms
+def build_stats_panel(pos, height):
+    with dpg.child_window(width=340, height=height, pos=pos, tag="stats_panel"):
+        dpg.add_text("Statistics")
+        dpg.add_text("", tag="stats_session_text")
+        dpg.add_text("", tag="stats_window_text")
+        centers = live_stats.session.x_hist.centers().tolist(), live_stats.session.y_hist.centers().tolist()
+        for axis_name, label, bin_centers in (("x", "Battery Voltage (V)", centers[0]), ("y", "Temperature (°C)", centers[1])):
+            with dpg.plot(label=label, height=max(150, (height - 160) // 2), width=-1):
+                dpg.add_plot_legend()
+                dpg.add_plot_axis(dpg.mvXAxis, no_tick_labels=False)
+                with dpg.plot_axis(dpg.mvYAxis, tag=f"stats_{axis_name}_hist_axis"):
+                    zeros = [0] * len(bin_centers)
+                    dpg.add_bar_series(bin_centers, zeros, label="session", tag=f"stats_{axis_name}_session_bars",
+                                       weight=bin_centers[1] - bin_centers[0])
+                    dpg.add_line_series(bin_centers, zeros, label="window", tag=f"stats_{axis_name}_window_line")
+
+def _describe(summary):
+    if not summary.count:
+        return "  no points"
+    return (f"  n = {summary.count:,}\n"
+            f"  V:  mean {summary.x.mean:.3f}  sd {summary.x.std:.3f}  [{summary.x.min:.3f}, {summary.x.max:.3f}]\n"
+            f"  °C: mean {summary.y.mean:.2f}  sd {summary.y.std:.2f}  [{summary.y.min:.2f}, {summary.y.max:.2f}]")
+
+# Refresh the side panel at most every STATS_REFRESH_INTERVAL seconds, and only after new data
+def update_stats_panel():
+    global stats_dirty, stats_refreshed_at
+    now = time.monotonic()
+    if not stats_dirty or now - stats_refreshed_at < STATS_REFRESH_INTERVAL:
+        return
+    stats_dirty, stats_refreshed_at = False, now
+    session, window = live_stats.session, live_stats.window()
+    dpg.set_value("stats_session_text", "Session\n" + _describe(session))
+    dpg.set_value("stats_window_text", "Sliding window\n" + _describe(window))
+    for axis_name in ("x", "y"):
+        session_hist = getattr(session, f"{axis_name}_hist")
+        window_hist = getattr(window, f"{axis_name}_hist")
+        centers = session_hist.centers().tolist()
+        # Scale the window onto the session so both shapes are comparable
+        scale = session_hist.counts.sum() / max(window_hist.counts.sum(), 1)
+        dpg.set_value(f"stats_{axis_name}_session_bars", [centers, session_hist.counts.tolist()])
+        dpg.set_value(f"stats_{axis_name}_window_line", [centers, (window_hist.counts * scale).tolist()])
+        dpg.fit_axis_data(f"stats_{axis_name}_hist_axis")
+
+# Rates and timings shown in the performance overlay, sampled once a second
+metrics_sampler = MetricsSampler()
+
+OVERLAY_RATES = ("bytes_received", "batches_received", "malformed_batches", "points_dropped", "hidden_batches",
+                 "points_expired", "batches_replayed", "batches_missed")
+OVERLAY_TIMINGS = ("decode", "store_append", "plot_update", "frame", "hover_query", "selection_query",
+                   "time_series_query")
+
+# Window with voltage and temperature against time, one linked subplot each; hidden until toggled on
+def build_time_series_window():
+    with dpg.window(label="Time Series", width=900, height=600, pos=(80, 80), show=False, tag="time_series_window"):
+        with dpg.group(horizontal=True):
+            dpg.add_checkbox(label="Follow Live", default_value=time_follow, callback=set_time_follow,
+                             tag="time_follow_checkbox")
+            dpg.add_combo(list(TIME_FOLLOW_SPANS), label="Span", width=100, callback=set_time_follow_span,
+                          default_value=next(name for name, span in TIME_FOLLOW_SPANS.items()
+                                             if span == time_follow_span))
+        with dpg.subplots(len(TIME_SERIES), 1, link_all_x=True, width=-1, height=-1):
+            for name, label, limits in TIME_SERIES:
+                with dpg.plot(label=label, tag=f"time_plot_{name}"):
+                    dpg.add_plot_legend()
+                    dpg.add_plot_axis(dpg.mvXAxis, scale=dpg.mvPlotScale_Time, tag=f"time_x_{name}")
+                    dpg.add_plot_axis(dpg.mvYAxis, label=label, tag=f"time_y_{name}")
+                    dpg.set_axis_limits(f"time_y_{name}", *limits)
+
+def set_time_follow(sender, app_data):
+    global time_follow
+    time_follow = app_data
+    if not time_follow:
+        # Unlock the time axes where they are, so the user can pan and zoom from there
+        for name, _label, _limits in TIME_SERIES:
+            dpg.set_axis_limits_auto(f"time_x_{name}")
+
+def set_time_follow_span(sender, app_data):
+    global time_follow_span
+    time_follow_span = TIME_FOLLOW_SPANS[app_data]
+
+# Redraw the time series from the points in the visible time range of each visible channel.
+# Each store finds the range by binary search, so a long session costs no more than a short one.
+def update_time_series():
+    global time_series_refreshed_at, time_series_view, time_series_dirty
+    if not dpg.is_item_shown("time_series_window"):
+        return
+    now = time.time()
+    if now - time_series_refreshed_at < TIME_SERIES_REFRESH_INTERVAL:
+        return
+    time_series_refreshed_at = now
+    if time_follow:
+        bounds = [channel.store.time_bounds() for channel in visible_channels()]
+        newest = max((bound[1] for bound in bounds if bound), default=timestamp())
+        t_limits = (newest - time_follow_span, newest)
+        for name, _label, _limits in TIME_SERIES:
+            dpg.set_axis_limits(f"time_x_{name}", *t_limits)
+    else:
+        t_limits = tuple(dpg.get_axis_limits(f"time_x_{TIME_SERIES[0][0]}"))
+    width = dpg.get_item_rect_size(f"time_plot_{TIME_SERIES[0][0]}")[0]
+    if (t_limits, width) == time_series_view and not time_series_dirty:
+        return
+    time_series_view, time_series_dirty = (t_limits, width), False
+    with metrics.timed("time_series_query"):
+        for channel in channels.values():
+            columns = channel.store.time_slice(*t_limits) if channel.visible else None
+            for index, (name, _label, _limits) in enumerate(TIME_SERIES):
+                tag = f"time_series_{name}_{channel.id}"
+                if not dpg.does_item_exist(tag):
+                    dpg.add_line_series([], [], label=channel.label, parent=f"time_y_{name}", tag=tag)
+                dpg.configure_item(tag, show=channel.visible)
+                if columns is not None:
+                    ts, values = decimate_series(columns[0], columns[1 + index], t_limits, width or 800)
+                    dpg.set_value(tag, [ts.tolist(), values.tolist()])
+
+# Window with live plots of pipeline metrics; hidden until toggled on
+def build_metrics_overlay():
+    with dpg.window(label="Performance", width=520, height=560, pos=(40, 40), show=False, tag="metrics_window"):
+        dpg.add_text("", tag="metrics_summary")
+        with dpg.plot(label="Rates (per second)", height=240, width=-1):
+            dpg.add_plot_legend()
+            dpg.add_plot_axis(dpg.mvXAxis, label="Seconds ago", tag="metrics_rate_x")
+            with dpg.plot_axis(dpg.mvYAxis, log_scale=True, tag="metrics_rate_y"):
+                for name in OVERLAY_RATES:
+                    dpg.add_line_series([], [], label=name, tag=f"metrics_rate_{name}")
+        with dpg.plot(label="p99 time (ms)", height=240, width=-1):
+            dpg.add_plot_legend()
+            dpg.add_plot_axis(dpg.mvXAxis, label="Seconds ago", tag="metrics_time_x")
+            with dpg.plot_axis(dpg.mvYAxis, log_scale=True, tag="metrics_time_y"):
+                for name in OVERLAY_TIMINGS:
+                    dpg.add_line_series([], [], label=name, tag=f"metrics_time_{name}")
+
+# Sample the metrics registry and refresh the overlay if it is visible
+def update_metrics_overlay():
+    sample = metrics_sampler.poll()
+    if sample is None or not dpg.is_item_shown("metrics_window"):
+        return
+    history = list(metrics_sampler.history)
+    ages = [sample["time"] - past["time"] for past in history]
+    for name in OVERLAY_RATES:
+        dpg.set_value(f"metrics_rate_{name}", [ages, [past["rates"].get(name, 0) for past in history]])
+    for name in OVERLAY_TIMINGS:
+        dpg.set_value(f"metrics_time_{name}", [ages, [past["p99_ms"].get(name, 0) for past in history]])
+    for axis in ("metrics_rate_x", "metrics_rate_y", "metrics_time_x", "metrics_time_y"):
+        dpg.fit_axis_data(axis)
+    rates, p99 = sample["rates"], sample["p99_ms"]
+    dpg.set_value("metrics_summary",
+                  f"{rates.get('bytes_received', 0) / 1e6:.2f} MB/s  {rates.get('batches_received', 0):.0f} batches/s  "
+                  f"frame p99 {p99.get('frame', 0):.1f} ms  plot p99 {p99.get('plot_update', 0):.1f} ms")
+
+# Dump metrics checkbox: append a JSON line per sample to data/metrics_<timestamp>.jsonl
+def toggle_metrics_dump(sender, app_data):
+    if app_data:
+        default_folder = os.path.join(os.getcwd(), "data")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(default_folder, f"metrics_{timestamp}.jsonl")
+        metrics_sampler.set_dump_path(path)
+        log.info(f"Dumping metrics to: {path}")
+    else:
+        metrics_sampler.set_dump_path(None)
+        log.info("Stopped dumping metrics.")
+
+# Drive DearPyGui frame by frame so all dpg calls happen on this thread
+# (requires dpg.configure_app(manual_callback_management=True))
+# Run the callbacks DearPyGui queued since the last frame. One that raises is logged and the
+# rest still run, instead of the exception ending the render loop and the whole GUI with it.
+def run_queued_callbacks():
+    for job in dpg.get_callback_queue() or ():
+        try:
+            dpg.run_callbacks([job])
+        except Exception:
+            log.exception(f"Error in callback for {job[1]}")
+
+def run_render_loop():
+    frame_start = time.perf_counter()
+    while dpg.is_dearpygui_running():
+        now = time.perf_counter()
+        metrics.observe("frame", now - frame_start)
+        frame_start = now
+        update_metrics_overlay()
+        run_queued_callbacks()
+        update_export_progress()
+        apply_loaded_dataset()
+        drain_ingest_queue()
+        if ingest_process is not None:
+            drain_shared_ring(ingest_process)
+            report_ingest_counters()
+        if local_reader is not None:
+            drain_shared_ring(local_reader)
+            if local_reader.closed:
+                fall_back_to_network()
+        expire_retention()
+        if update_flag:
+            update_plot()
+        update_selection_drag()
+        update_hover()
+        refresh_selection()
+        update_stats_panel()
+        update_time_series()
+        dpg.render_dearpygui_frame()
 
 # Callback to dynamically update the plot width
 def update_plot_width(sender, app_data, user_data):
@@ -158,6 +982,10 @@ def update_button_positions(plot_id):
     # Position buttons on the left
     dpg.set_item_pos("export_json_button", (plot_left, button_y))
     dpg.set_item_pos("export_yaml_button", (plot_left, button_y + 40))  # Offset below the first button
+    dpg.set_item_pos("compact_json_checkbox", (plot_left + 200, button_y))
+    dpg.set_item_pos("selection_only_checkbox", (plot_left + 350, button_y))
+    dpg.set_item_pos("export_progress", (plot_left + 200, button_y + 40))
+    dpg.set_item_pos("stats_panel", (plot_left + dpg.get_item_width(plot_id) + 20, plot_pos[1]))
 
 # Main GUI
 # def main_gui(screen_width, screen_height):
@@ -247,10 +1075,6 @@ def main_gui(screen_width, screen_height):
     window_width = int(screen_width * 1)
     window_height = int(screen_height * 1)
 
-    # Add a value registry for storing data
-    with dpg.value_registry():
-        dpg.add_string_value(tag="fake_data_storage", default_value="[]")
-
     # Create the main window
     with dpg.window(label="Main Window", width=window_width, height=window_height):
         plot_width = int(window_width * 0.8)
@@ -260,11 +1084,20 @@ def main_gui(screen_width, screen_height):
 
         # Plot configuration
         with dpg.plot(label="2D Plot", height=plot_height, width=plot_width, pos=(plot_x, plot_y), tag="main_plot") as plot_id:
-            x_axis = dpg.add_plot_axis(dpg.mvXAxis, label="Battery Voltage (V)")
-            y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="Temperature (°C)")
-            scatter_series = dpg.add_scatter_series([], [], label="Live Data", parent=y_axis)
-            dpg.set_axis_limits(x_axis, 0, 5)
-            dpg.set_axis_limits(y_axis, -20, 80)
+            x_axis = dpg.add_plot_axis(dpg.mvXAxis, label="Battery Voltage (V)", tag="x_axis")
+            y_axis = dpg.add_plot_axis(dpg.mvYAxis, label="Temperature (°C)", tag="y_axis")
+            dpg.add_scatter_series([], [], label="Live Data", parent=y_axis, tag="live_series")
+            dpg.add_heat_series([0.0], 1, 1, label="Density", parent=y_axis, tag="density_series", show=False,
+                                format="", bounds_min=(X_LIMITS[0], Y_LIMITS[0]), bounds_max=(X_LIMITS[1], Y_LIMITS[1]))
+            dpg.add_scatter_series([], [], label="Selection", parent=y_axis, tag="selection_series", show=False)
+            dpg.draw_polyline([[0, 0], [0, 0]], color=(255, 255, 0, 255), thickness=1, show=False, tag="selection_outline")
+            dpg.add_plot_annotation(label="", default_value=(0, 0), offset=(10, -10), show=False, tag="hover_annotation")
+            dpg.set_axis_limits(x_axis, *X_LIMITS)
+            dpg.set_axis_limits(y_axis, *Y_LIMITS)
+
+        dpg.bind_colormap(plot_id, dpg.mvPlotColormap_Viridis)
+
+        build_stats_panel((plot_x + plot_width + 20, plot_y), plot_height)
 
         # Adjusted layout for sliders and buttons
         slider_x = plot_x - 350
@@ -295,9 +1128,7 @@ def main_gui(screen_width, screen_height):
             dpg.add_spacer(height=20)  # Add more space for better separation
             dpg.add_button(
                 label="Start Live Data",
-                callback=lambda: threading.Thread(
-                    target=fetch_live_data, args=("fake_data_storage",), daemon=True
-                ).start(),
+                callback=start_fetching_live_data,
                 width=300
             )
             dpg.add_spacer(height=10)  # Add space between buttons
@@ -308,16 +1139,51 @@ def main_gui(screen_width, screen_height):
             )
             dpg.add_spacer(height=20)  # Larger space for grouping
             dpg.add_button(
-                label="Start Periodic Update",
-                callback=lambda: start_periodic_update(scatter_series, "fake_data_storage"),
+                label="Start Plot Updates",
+                callback=start_plot_updates,
                 width=350
             )
             dpg.add_spacer(height=10)
             dpg.add_button(
-                label="Stop Periodic Update",
-                callback=stop_periodic_update,
+                label="Stop Plot Updates",
+                callback=stop_plot_updates,
                 width=300
             )
+            dpg.add_spacer(height=20)
+            dpg.add_radio_button([DISPLAY_SCATTER, DISPLAY_DENSITY], default_value=display_mode,
+                                 horizontal=True, callback=set_display_mode, tag="display_mode_radio")
+            dpg.add_spacer(height=10)
+            dpg.add_combo(list(VIEW_SPANS), label="History", width=200, callback=set_view_span, tag="view_span_combo",
+                          default_value=next(name for name, span in VIEW_SPANS.items() if span == view_span))
+            dpg.add_text("Showing raw points", tag="tier_text")
+            dpg.add_spacer(height=10)
+            dpg.add_text("Selection")
+            with dpg.group(horizontal=True):
+                dpg.add_radio_button([SELECT_OFF, SELECT_BOX, SELECT_LASSO], default_value=selection_tool,
+                                     horizontal=True, callback=set_selection_tool, tag="selection_tool_radio")
+                dpg.add_button(label="Clear", callback=clear_selection)
+            dpg.add_text("", tag="selection_text")
+            dpg.add_spacer(height=10)
+            dpg.add_text("Channels")
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="Show All", callback=lambda: set_all_channels_visible(True), width=146)
+                dpg.add_button(label="Hide All", callback=lambda: set_all_channels_visible(False), width=146)
+            dpg.add_child_window(width=300, height=150, tag="channel_list")
+            add_channel_checkbox(channels[DEFAULT_CHANNEL])
+            dpg.add_spacer(height=10)
+            dpg.add_checkbox(label="Record", callback=toggle_recording, tag="record_checkbox")
+            dpg.add_spacer(height=10)
+            dpg.add_button(
+                label="Open Dataset",
+                callback=lambda: dpg.show_item("file_dialog_open"),
+                width=300
+            )
+            dpg.add_spacer(height=20)
+            dpg.add_checkbox(label="Show Time Series", tag="time_series_checkbox",
+                             callback=lambda sender, app_data: dpg.configure_item("time_series_window", show=app_data))
+            dpg.add_checkbox(label="Show Performance Overlay", tag="metrics_overlay_checkbox",
+                             callback=lambda sender, app_data: dpg.configure_item("metrics_window", show=app_data))
+            dpg.add_checkbox(label="Dump Metrics", callback=toggle_metrics_dump, tag="metrics_dump_checkbox")
 
 
         # Add export buttons, dynamically positioned below the plot
@@ -325,6 +1191,9 @@ def main_gui(screen_width, screen_height):
                        pos=(plot_x, plot_y + plot_height + 20), tag="export_json_button")
         dpg.add_button(label="Export to YAML", callback=lambda: export_data("yaml", False),
                        pos=(plot_x, plot_y + plot_height + 60), tag="export_yaml_button")
+        dpg.add_checkbox(label="Compact JSON", pos=(plot_x + 200, plot_y + plot_height + 20), tag="compact_json_checkbox")
+        dpg.add_checkbox(label="Selection Only", pos=(plot_x + 350, plot_y + plot_height + 20), tag="selection_only_checkbox")
+        dpg.add_progress_bar(width=300, pos=(plot_x + 200, plot_y + plot_height + 60), show=False, tag="export_progress")
 
         # File dialogs
         with dpg.file_dialog(directory_selector=False, show=False, callback=file_dialog_callback, user_data="json", tag="file_dialog_json"):
@@ -335,21 +1204,105 @@ def main_gui(screen_width, screen_height):
             dpg.add_file_extension(".yaml", color=(0, 255, 0, 255))
             dpg.add_file_extension(".*")
 
+        with dpg.file_dialog(directory_selector=False, show=False, callback=open_dataset_callback, tag="file_dialog_open",
+                             default_path=os.path.join(os.getcwd(), "data")):
+            dpg.add_file_extension("Datasets (*.json *.yaml *.csv *.ptrec){.json,.yaml,.csv,.ptrec}", color=(0, 255, 255, 255))
+            dpg.add_file_extension(".*")
+
+    build_metrics_overlay()
+    build_time_series_window()
+
 # Stop live data fetching
 def stop_fetching_live_data():
-    global stop_flag
+    global stop_flag, ingest_process, local_reader
     stop_flag = True
-    print("Stopped fetching live data.")
+    if local_reader is not None:
+        finished, local_reader = local_reader, None
+        finished.close()
+        if finished.lost:
+            log.warning(f"Fell behind the server's shared ring; {finished.lost} points were lost.")
+    if ingest_process is not None:
+        finished, ingest_process = ingest_process, None
+        finished.stop()
+        if finished.lost:
+            log.warning(f"Ingest process overran the shared ring; {finished.lost} points were lost.")
+    log.info("Stopped fetching live data.")
+
+# Attach to the shared-memory ring of a server on this host; None if there is none to use
+def open_local_transport():
+    if TRANSPORT == "tcp" or (TRANSPORT == "auto" and HOST not in LOCAL_HOSTS):
+        return None
+    try:
+        reader = RingReader(local_ring_name(PORT))
+    except (FileNotFoundError, ValueError) as e:
+        log.info(f"No shared-memory ring from the server: {e}")
+        return None
+    if reader.closed:
+        reader.close()
+        return None
+    log.info(f"Reading from shared-memory ring {reader.ring.name}")
+    return reader
+
+# Start live data from the local shared ring, a network thread or a separate ingest process
+def start_fetching_live_data():
+    global stop_flag, local_reader
+    stop_flag = False
+    if local_reader is not None:
+        return
+    local_reader = open_local_transport()
+    if local_reader is not None:
+        return
+    if TRANSPORT == "shm":
+        log.error("Shared-memory transport requested but the server is not publishing a ring.")
+        return
+    start_network_ingest()
+
+# The server closed its shared ring, or its heartbeat stopped (e.g. it crashed): carry on over TCP,
+# which reconnects with backoff until a server is listening again
+def fall_back_to_network():
+    global local_reader
+    finished, local_reader = local_reader, None
+    finished.close()
+    if finished.lost:
+        log.warning(f"Fell behind the server's shared ring; {finished.lost} points were lost.")
+    if TRANSPORT == "shm":
+        log.info("Server closed the shared-memory ring.")
+        stop_fetching_live_data()
+        return
+    log.info("Server closed or stopped writing the shared-memory ring; falling back to TCP.")
+    start_network_ingest()
+
+# Start receiving over TCP, in a network thread or a separate ingest process
+def start_network_ingest():
+    global fetch_thread, ingest_process, ingest_counters
+    if INGEST_MODE == "process":
+        if ingest_process is None or not ingest_process.is_alive():
+            ingest_process = IngestProcess(HOST, PORT, WIRE_FORMAT)
+            ingest_counters = {}
+            for channel_id in hidden_channels:
+                ingest_process.set_hidden(channel_id, True)
+            ingest_process.start()
+    elif fetch_thread is None or not fetch_thread.is_alive():
+        # A thread still winding down from a quick Stop/Start just keeps going, since stop_flag is clear again
+        fetch_thread = threading.Thread(target=fetch_live_data, args=(ingest_queue,), daemon=True)
+        fetch_thread.start()
 
 # Entry point
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     screen_width, screen_height = get_screen_resolution()
     dpg.create_context()
+    dpg.configure_app(manual_callback_management=True)  # Callbacks run from run_render_loop
     dpg.create_viewport(title="Example GUI", width=screen_width, height=screen_height)
     dpg.setup_dearpygui()
     scale_factor = screen_height / 1080
     dpg.set_global_font_scale(scale_factor)
     main_gui(screen_width, screen_height)
     dpg.show_viewport()
-    dpg.start_dearpygui()
+    run_render_loop()
+    if ingest_process is not None or local_reader is not None:
+        stop_fetching_live_data()
+    if recorder is not None:
+        recorder.close()
+    metrics_sampler.close()
     dpg.destroy_context()
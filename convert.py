@@ -0,0 +1,346 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import yaml
+
+from exporter import EXPORT_CHUNK_SIZE, open_export_writer
+from loader import DatasetError, iter_dataset_batches
+from recording import RECORDING_EXTENSION, Recorder, RecordingError
+
+# Output formats and the extension each is written with
+FORMATS = {"json": ".json", "yaml": ".yaml", "csv": ".csv", "binary": RECORDING_EXTENSION}
+
+# Files picked up when a directory is given as input
+INPUT_EXTENSIONS = (".json", ".yaml", ".yml", ".csv", RECORDING_EXTENSION)
+
+# Kept in each output directory: the size, mtime and hash of the source(s) each output was made from
+MANIFEST_NAME = ".convert-manifest.json"
+
+HASH_READ_SIZE = 1 << 20
+
+# Errors that mean a file is not a usable export, as opposed to a bug in this tool
+_INPUT_ERRORS = (DatasetError, RecordingError, OSError, ValueError, yaml.YAMLError)
+
+
+def data_type_of(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".yml":
+        return "yaml"
+    for data_type, known in FORMATS.items():
+        if extension == known:
+            return data_type
+    return None
+
+
+# Expand directories to the exports directly inside them (not hidden files such as the
+# manifest); files are taken as given
+def expand_inputs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if not name.startswith(".") and os.path.splitext(name)[1].lower() in INPUT_EXTENSIONS)
+        else:
+            files.append(path)
+    return files
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+# Stream batches into `output` in the given format; the file only appears once it is complete
+def write_batches(batches, output, data_type, metadata=None, compact=False):
+    tmp = output + ".tmp"
+    try:
+        if data_type == "binary":
+            recorder = Recorder(tmp, chunk_points=EXPORT_CHUNK_SIZE, flush_interval=math.inf)
+            for xs, ys in batches:
+                recorder.append(xs, ys)
+            recorder.close()
+            count = recorder.points_written
+        else:
+            with open(tmp, "w") as f:
+                writer = open_export_writer(f, data_type, metadata, compact)
+                for xs, ys in batches:
+                    writer.write(xs, ys)
+                writer.close()
+                count = writer.count
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+def _metadata(sources):
+    return {
+        "export_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source": "Converted from " + ", ".join(os.path.basename(source) for source in sources)
+    }
+
+
+def convert_file(source, output, data_type, compact=False, known_hash=None):
+    """Convert one export, streaming it batch by batch; runs in a worker process.
+
+    If `known_hash` is given and the source still hashes to it, the output
+    is already up to date (the source was only touched) and is left alone.
+    """
+    start = time.perf_counter()
+    result = {"source": source, "output": output}
+    try:
+        digest = file_hash(source)
+        if digest == known_hash and os.path.exists(output):
+            result.update(status="unchanged", sha256=digest)
+        else:
+            batches = iter_dataset_batches(source, EXPORT_CHUNK_SIZE)
+            points = write_batches(batches, output, data_type, _metadata([source]), compact)
+            result.update(status="converted", sha256=digest, points=points)
+    except _INPUT_ERRORS as e:
+        result.update(status="failed", error=str(e))
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def validate_file(source):
+    """Stream one export and report its point count, value ranges and non-finite readings."""
+    result = {"source": source, "status": "ok", "points": 0, "non_finite": 0}
+    x_range = y_range = (math.inf, -math.inf)
+    try:
+        for xs, ys in iter_dataset_batches(source, EXPORT_CHUNK_SIZE):
+            finite = np.isfinite(xs) & np.isfinite(ys)
+            result["points"] += len(xs)
+            result["non_finite"] += int(len(xs) - np.count_nonzero(finite))
+            if finite.any():
+                xs, ys = xs[finite], ys[finite]
+                x_range = (min(x_range[0], float(xs.min())), max(x_range[1], float(xs.max())))
+                y_range = (min(y_range[0], float(ys.min())), max(y_range[1], float(ys.max())))
+    except _INPUT_ERRORS as e:
+        return {"source": source, "status": "failed", "error": str(e)}
+    if result["points"] > result["non_finite"]:
+        result.update(x_range=x_range, y_range=y_range)
+    return result
+
+
+# Pair each input with its output path, or report why it has none
+def plan_conversions(sources, data_type, output_dir=None):
+    planned, skipped, outputs = [], [], {}
+    for source in sources:
+        if data_type_of(source) is None:
+            skipped.append((source, "not an export"))
+            continue
+        if data_type_of(source) == data_type:
+            skipped.append((source, f"already {data_type}"))
+            continue
+        stem = os.path.splitext(os.path.basename(source))[0]
+        output = os.path.join(output_dir or os.path.dirname(source), stem + FORMATS[data_type])
+        if output in outputs:
+            skipped.append((source, f"{os.path.basename(output)} is also converted from {outputs[output]}"))
+            continue
+        outputs[output] = os.path.basename(source)
+        planned.append((source, output))
+    return planned, skipped
+
+
+# Why an existing output must not be overwritten without --force, or None if this tool wrote it
+def _overwrite_conflict(output, entry, source=None):
+    if entry is None:
+        return f"{output} exists and was not written by this tool"
+    if source is not None and entry.get("source", os.path.abspath(source)) != os.path.abspath(source):
+        return f"{output} was converted from {entry['source']}"
+    return None
+
+
+def run_convert(args):
+    sources = expand_inputs(args.inputs)
+    planned, skipped = plan_conversions(sources, args.to, args.output_dir)
+    for source, reason in skipped:
+        print(f"skip  {source}: {reason}")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    manifests = {}  # Output directory -> manifest
+    tasks = []
+    failures = 0
+    for source, output in planned:
+        directory = os.path.dirname(output) or "."
+        manifest = manifests.setdefault(directory, read_manifest(directory))
+        entry = manifest.get(os.path.basename(output))
+        known_hash = None
+        if not args.force and os.path.exists(output):
+            conflict = _overwrite_conflict(output, entry, source)
+            if conflict is not None:
+                print(f"skip  {source}: {conflict}; use --force to overwrite it")
+                failures += 1
+                continue
+            if "source" in entry:
+                if entry["size"] == os.path.getsize(source) and entry["mtime_ns"] == os.stat(source).st_mtime_ns:
+                    print(f"fresh {output}")
+                    continue
+                known_hash = entry["sha256"]  # Touched since; a worker checks whether it really changed
+        tasks.append((source, output, args.to, args.compact, known_hash))
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for result in pool.map(convert_file, *zip(*tasks)) if tasks else ():
+            directory = os.path.dirname(result["output"]) or "."
+            if result["status"] == "failed":
+                failures += 1
+                print(f"FAIL  {result['source']}: {result['error']}")
+                continue
+            manifests[directory][os.path.basename(result["output"])] = {
+                "source": os.path.abspath(result["source"]), "sha256": result["sha256"],
+                **_fingerprint(result["source"])}
+            if result["status"] == "unchanged":
+                print(f"fresh {result['output']} (source unchanged)")
+            else:
+                print(f"wrote {result['output']}: {result['points']:,} points in {result['seconds']:.2f} s")
+    for directory, manifest in manifests.items():
+        write_manifest(directory, manifest)
+    return 1 if failures else 0
+
+
+# The ordered inputs of a merge, each with the size, mtime and hash it had
+def _merge_sources(sources):
+    return [{"source": os.path.abspath(source), **_fingerprint(source), "sha256": file_hash(source)}
+            for source in sources]
+
+
+# If the manifest's merge was made from exactly these inputs, in this order, as they are now,
+# return its record of them with any touched inputs refreshed; otherwise None. Inputs whose
+# size or mtime changed are hashed to see whether their contents really did.
+def fresh_merge_sources(entry, sources):
+    recorded = (entry or {}).get("sources")
+    if recorded is None or [item["source"] for item in recorded] != [os.path.abspath(source) for source in sources]:
+        return None
+    refreshed = []
+    try:
+        for source, item in zip(sources, recorded):
+            fingerprint = _fingerprint(source)
+            if fingerprint != {"size": item["size"], "mtime_ns": item["mtime_ns"]}:
+                if file_hash(source) != item["sha256"]:
+                    return None
+                item = {**item, **fingerprint}
+            refreshed.append(item)
+    except OSError:
+        return None
+    return refreshed
+
+
+def run_merge(args):
+    sources = [source for source in expand_inputs(args.inputs) if data_type_of(source) is not None]
+    data_type = data_type_of(args.output)
+    if data_type is None:
+        print(f"Cannot tell the output format from {args.output}")
+        return 1
+    sources = [source for source in sources if os.path.abspath(source) != os.path.abspath(args.output)]
+    directory = os.path.dirname(args.output) or "."
+    manifest = read_manifest(directory)
+    entry = manifest.get(os.path.basename(args.output))
+    if not args.force and os.path.exists(args.output) and entry is None:
+        print(f"skip  {args.output}: {_overwrite_conflict(args.output, entry)}; use --force to overwrite it")
+        return 1
+    fresh = None if args.force or not os.path.exists(args.output) else fresh_merge_sources(entry, sources)
+    if fresh is not None:
+        if fresh != entry["sources"]:
+            manifest[os.path.basename(args.output)] = {"sources": fresh}
+            write_manifest(directory, manifest)
+        print(f"fresh {args.output}")
+        return 0
+    # Inputs are read one after another in order, so only one batch is in memory at a time
+    def batches():
+        for source in sources:
+            yield from iter_dataset_batches(source, EXPORT_CHUNK_SIZE)
+
+    try:
+        # Fingerprinted before reading, so a source that changes during the merge is merged again next time
+        merged_sources = _merge_sources(sources)
+        points = write_batches(batches(), args.output, data_type, _metadata(sources), args.compact)
+    except _INPUT_ERRORS as e:
+        print(f"FAIL  {args.output}: {e}")
+        return 1
+    manifest[os.path.basename(args.output)] = {"sources": merged_sources}
+    write_manifest(directory, manifest)
+    print(f"wrote {args.output}: {points:,} points from {len(sources)} files")
+    return 0
+
+
+def run_validate(args):
+    sources = [source for source in expand_inputs(args.inputs) if data_type_of(source) is not None]
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for result in pool.map(validate_file, sources):
+            if result["status"] == "failed":
+                failures += 1
+                print(f"FAIL  {result['source']}: {result['error']}")
+                continue
+            line = f"ok    {result['source']}: {result['points']:,} points"
+            if "x_range" in result:
+                line += (f", x {result['x_range'][0]:g}..{result['x_range'][1]:g}"
+                         f", y {result['y_range'][0]:g}..{result['y_range'][1]:g}")
+            if result["non_finite"]:
+                line += f", {result['non_finite']:,} non-finite"
+            print(line)
+    return 1 if failures else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert, merge and validate exports and recordings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert each input to another format")
+    convert.add_argument("inputs", nargs="+", help="export files or directories of them")
+    convert.add_argument("--to", choices=FORMATS, required=True)
+    convert.add_argument("--output-dir", help="where to write the outputs (default: next to each input)")
+    convert.add_argument("--force", action="store_true", help="convert even if the output is up to date, or was not written by this tool")
+    convert.add_argument("--compact", action="store_true", help="write JSON without indentation")
+    convert.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+
+    merge = commands.add_parser("merge", help="concatenate the inputs, in order, into one file")
+    merge.add_argument("inputs", nargs="+", help="export files or directories of them")
+    merge.add_argument("--output", required=True, help="merged file; its extension picks the format")
+    merge.add_argument("--force", action="store_true", help="merge even if the output is up to date, or was not written by this tool")
+    merge.add_argument("--compact", action="store_true", help="write JSON without indentation")
+
+    validate = commands.add_parser("validate", help="check that every input can be read, and summarize it")
+    validate.add_argument("inputs", nargs="+", help="export files or directories of them")
+    validate.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    commands = {"convert": run_convert, "merge": run_merge, "validate": run_validate}
+    sys.exit(commands[args.command](args))
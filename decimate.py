@@ -0,0 +1,146 @@
+import numpy as np
+
+# Screen pixels covered by one decimation bin along each axis
+PIXELS_PER_BIN = 2
+
+
+# Number of bins that fit in a plot of the given pixel size
+def grid_shape(width_px, height_px, pixels_per_bin=PIXELS_PER_BIN):
+    return max(1, int(width_px) // pixels_per_bin), max(1, int(height_px) // pixels_per_bin)
+
+
+# Map coordinates to flat bin indices; points outside the limits get -1
+def bin_indices(xs, ys, x_limits, y_limits, shape):
+    cols, rows = shape
+    x_min, x_max = x_limits
+    y_min, y_max = y_limits
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    cx = np.floor((xs - x_min) * (cols / max(x_max - x_min, 1e-12))).astype(np.int64)
+    cy = np.floor((ys - y_min) * (rows / max(y_max - y_min, 1e-12))).astype(np.int64)
+    inside = (cx >= 0) & (cx < cols) & (cy >= 0) & (cy < rows)
+    return np.where(inside, cy * cols + cx, -1)
+
+
+# One-shot decimation: keep the newest point that falls in each occupied bin
+def decimate_points(xs, ys, x_limits, y_limits, width_px, height_px):
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    bins = bin_indices(xs, ys, x_limits, y_limits, grid_shape(width_px, height_px))
+    # np.unique keeps the first occurrence, so search the reversed arrays for the newest
+    _, last = np.unique(bins[::-1], return_index=True)
+    keep = np.sort(len(bins) - 1 - last)
+    keep = keep[bins[keep] >= 0]
+    return xs[keep], ys[keep]
+
+
+# Min/max envelope of a time-sorted series: the lowest and highest value in each pixel
+# column, kept in time order, so a line through them still shows every spike
+def decimate_series(ts, values, t_limits, width_px):
+    ts = np.asarray(ts, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    columns = max(1, int(width_px))
+    if len(ts) <= 2 * columns:
+        return ts, values
+    t_min, t_max = t_limits
+    column = np.floor((ts - t_min) * (columns / max(t_max - t_min, 1e-12))).astype(np.int64)
+    # Sorted timestamps put each pixel column in one contiguous run
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+    run = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(ts))))
+    keep = []
+    for extreme in (np.minimum, np.maximum):
+        hits = np.flatnonzero(values == extreme.reduceat(values, starts)[run])
+        keep.append(hits[np.unique(run[hits], return_index=True)[1]])
+    keep = np.unique(np.concatenate(keep))
+    return ts[keep], values[keep]
+
+
+class PixelDecimator:
+    """Incremental per-pixel-bin occupancy grid over the plotted points.
+
+    Each bin remembers the newest point that landed in it, so the series
+    handed to DearPyGui never exceeds the number of bins no matter how
+    long the history is. Adding a batch costs O(batch); the grid only
+    has to be rebuilt from the full history when the plot size or the
+    axis limits change.
+    """
+
+    def __init__(self, x_limits, y_limits, width_px, height_px):
+        self.configure(x_limits, y_limits, width_px, height_px)
+
+    def configure(self, x_limits, y_limits, width_px, height_px):
+        self.x_limits = tuple(x_limits)
+        self.y_limits = tuple(y_limits)
+        self.size_px = (int(width_px), int(height_px))
+        self.shape = grid_shape(width_px, height_px)
+        cells = self.shape[0] * self.shape[1]
+        self._x = np.empty(cells, dtype=np.float64)
+        self._y = np.empty(cells, dtype=np.float64)
+        self._occupied = np.zeros(cells, dtype=bool)
+        self.version = 0  # Bumped whenever the visible set of points changes
+
+    # True if the view differs from the one the grid was built for
+    def needs_rebuild(self, x_limits, y_limits, width_px, height_px):
+        return (tuple(x_limits) != self.x_limits or tuple(y_limits) != self.y_limits
+                or (int(width_px), int(height_px)) != self.size_px)
+
+    def add(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        bins = bin_indices(xs, ys, self.x_limits, self.y_limits, self.shape)
+        inside = bins >= 0
+        if not inside.any():
+            return
+        # Fancy assignment applies in order, so later (newer) points win a shared bin
+        bins = bins[inside]
+        self._x[bins] = xs[inside]
+        self._y[bins] = ys[inside]
+        self._occupied[bins] = True
+        self.version += 1
+
+    def points(self):
+        """Return the decimated x and y columns."""
+        return self._x[self._occupied], self._y[self._occupied]
+
+
+# Screen pixels covered by one density cell; coarser than decimation so the heat map stays cheap to draw
+DENSITY_PIXELS_PER_BIN = 8
+
+
+class DensityGrid:
+    """Incremental 2D histogram of the plotted points for the heat map view.
+
+    Adding a batch is one vectorized binning pass plus a bincount, and
+    drawing it costs O(rows * cols) no matter how many points were added.
+    Like PixelDecimator, the grid is rebuilt from the history only when
+    the plot size or the axis limits change.
+    """
+
+    def __init__(self, x_limits, y_limits, width_px, height_px):
+        self.configure(x_limits, y_limits, width_px, height_px)
+
+    def configure(self, x_limits, y_limits, width_px, height_px):
+        self.x_limits = tuple(x_limits)
+        self.y_limits = tuple(y_limits)
+        self.size_px = (int(width_px), int(height_px))
+        self.shape = grid_shape(width_px, height_px, DENSITY_PIXELS_PER_BIN)
+        self.counts = np.zeros(self.shape[0] * self.shape[1], dtype=np.int64)
+        self.version = 0
+
+    def needs_rebuild(self, x_limits, y_limits, width_px, height_px):
+        return (tuple(x_limits) != self.x_limits or tuple(y_limits) != self.y_limits
+                or (int(width_px), int(height_px)) != self.size_px)
+
+    # `weights` counts each point that many times, e.g. the size of an aggregate bin
+    def add(self, xs, ys, weights=None):
+        bins = bin_indices(xs, ys, self.x_limits, self.y_limits, self.shape)
+        inside = bins >= 0
+        if inside.any():
+            weights = None if weights is None else np.asarray(weights)[inside]
+            self.counts += np.bincount(bins[inside], weights, minlength=len(self.counts)).astype(np.int64)
+            self.version += 1
+
+    def rows(self):
+        """Return the counts as a (rows, cols) array with the top row (highest y) first."""
+        cols, rows = self.shape
+        return self.counts.reshape(rows, cols)[::-1]
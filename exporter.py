@@ -0,0 +1,186 @@
+import json
+import math
+import threading
+
+import numpy as np
+
+from serializers import yaml_dump
+
+# Points formatted and written per chunk
+EXPORT_CHUNK_SIZE = 50_000
+
+# Same layout json.dump(..., indent=4) produces for one region
+_INDENTED_REGION = '        {{\n            "x": {},\n            "y": {}\n        }}'
+_COMPACT_REGION = '{{"x":{},"y":{}}}'
+
+
+# Format a float exactly as the json module would
+def _json_float(value):
+    if math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+
+# Yield (start, end) bounds of successive chunks
+def _chunks(count, chunk_size):
+    for start in range(0, count, chunk_size):
+        yield start, min(start + chunk_size, count)
+
+
+class JsonExportWriter:
+    """Writes {"metadata", "regions": [...]} to an open text file one batch at a time.
+
+    The total point count need not be known up front, so batches can come
+    straight from a streaming reader. The indented output is byte-for-byte
+    what json.dump(data, f, indent=4) writes; compact output drops all
+    optional whitespace.
+    """
+
+    def __init__(self, f, metadata=None, compact=False):
+        self.f = f
+        self.compact = compact
+        self.count = 0
+        self._template = _COMPACT_REGION if compact else _INDENTED_REGION
+        self._separator = "," if compact else ",\n"
+        if compact:
+            f.write("{")
+            if metadata is not None:
+                f.write('"metadata":' + json.dumps(metadata, separators=(",", ":")) + ",")
+            f.write('"regions":[')
+        else:
+            f.write("{\n")
+            if metadata is not None:
+                body = json.dumps(metadata, indent=4).replace("\n", "\n    ")
+                f.write(f'    "metadata": {body},\n')
+            f.write('    "regions": [')
+
+    def write(self, xs, ys):
+        if not len(xs):
+            return
+        regions = [self._template.format(_json_float(x), _json_float(y))
+                   for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())]
+        if self.count:
+            self.f.write(self._separator)
+        elif not self.compact:
+            self.f.write("\n")
+        self.f.write(self._separator.join(regions))
+        self.count += len(regions)
+
+    def close(self):
+        if self.compact:
+            self.f.write("]}")
+        else:
+            self.f.write(("\n    " if self.count else "") + "]\n}")
+
+
+class YamlExportWriter:
+    """Writes the same document as yaml.dump(data, default_flow_style=False), one batch at a time."""
+
+    def __init__(self, f, metadata=None):
+        self.f = f
+        self.count = 0
+        if metadata is not None:
+            yaml_dump({"metadata": metadata}, f, default_flow_style=False)
+
+    def write(self, xs, ys):
+        if not len(xs):
+            return
+        if not self.count:
+            self.f.write("regions:\n")
+        # A top-level block sequence has the same layout as one nested under "regions:"
+        regions = [{"x": x, "y": y} for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())]
+        yaml_dump(regions, self.f, default_flow_style=False)
+        self.count += len(regions)
+
+    def close(self):
+        if not self.count:
+            self.f.write("regions: []\n")
+
+
+class CsvExportWriter:
+    """Writes an "x,y" header and one row per point; CSV has no place for the metadata block."""
+
+    def __init__(self, f, metadata=None):
+        self.f = f
+        self.count = 0
+        f.write("x,y\n")
+
+    def write(self, xs, ys):
+        if not len(xs):
+            return
+        rows = [f"{_json_float(x)},{_json_float(y)}\n" for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())]
+        self.f.write("".join(rows))
+        self.count += len(rows)
+
+    def close(self):
+        pass
+
+
+# Writer for one of the text export types, ready for `write(xs, ys)` batches and a final `close()`
+def open_export_writer(f, data_type, metadata=None, compact=False):
+    if data_type == "json":
+        return JsonExportWriter(f, metadata, compact=compact)
+    if data_type == "yaml":
+        return YamlExportWriter(f, metadata)
+    if data_type == "csv":
+        return CsvExportWriter(f, metadata)
+    raise ValueError(f"Unsupported export type: {data_type}")
+
+
+def _write_columns(writer, xs, ys, chunk_size, progress):
+    count = len(xs)
+    for start, end in _chunks(count, chunk_size):
+        writer.write(xs[start:end], ys[start:end])
+        if progress is not None:
+            progress(end / count)
+    writer.close()
+
+
+def write_json_stream(f, xs, ys, metadata=None, compact=False, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Write {"metadata", "regions": [...]} to an open text file chunk by chunk (see JsonExportWriter)."""
+    _write_columns(JsonExportWriter(f, metadata, compact=compact), xs, ys, chunk_size, progress)
+
+
+def write_yaml_stream(f, xs, ys, metadata=None, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """Write the same document as yaml.dump(data, default_flow_style=False), chunk by chunk."""
+    _write_columns(YamlExportWriter(f, metadata), xs, ys, chunk_size, progress)
+
+
+# Write x/y columns to `path` as JSON, YAML or CSV
+def write_export(path, xs, ys, data_type, metadata=None, compact=False, progress=None):
+    with open(path, "w") as f:
+        _write_columns(open_export_writer(f, data_type, metadata, compact), xs, ys, EXPORT_CHUNK_SIZE, progress)
+
+
+class ExportJob:
+    """Writes a snapshot of x/y columns on a background thread.
+
+    `progress` (0.0 to 1.0), `done` and `error` are plain attributes so the
+    render loop can poll them without touching the worker.
+    """
+
+    def __init__(self, path, xs, ys, data_type, metadata=None, compact=False):
+        self.path = path
+        self.data_type = data_type
+        self.progress = 0.0
+        self.done = False
+        self.error = None
+        self._args = (xs, ys, data_type, metadata, compact)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _set_progress(self, fraction):
+        self.progress = fraction
+
+    def _run(self):
+        try:
+            write_export(self.path, *self._args, progress=self._set_progress)
+            self.progress = 1.0
+        except Exception as e:
+            self.error = e
+        finally:
+            self._args = None  # Release the snapshot
+            self.done = True
+
+    def start(self):
+        self._thread.start()
+        return self
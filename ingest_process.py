@@ -0,0 +1,147 @@
+import ctypes
+import logging
+import multiprocessing
+import os
+import socket
+
+from protocol import (MAX_CHANNEL, SEQUENCE_REPLAYED, FrameReader, HelloRefused, ProtocolError, SequenceTracker,
+                      backoff_delays, check_hello_reply, decode_points, decode_sequenced, encode_hello, peek_channel,
+                      recv_frames)
+from shm_ring import SharedPointRing
+
+log = logging.getLogger("ingest_process")
+
+# Points the shared ring holds before the ingest process laps a slow reader
+INGEST_RING_CAPACITY = 4_000_000
+
+# Seconds between checks of the stop event while the socket is idle
+_POLL_TIMEOUT = 0.5
+_CONNECT_TIMEOUT = 5.0
+
+# Stream counters the ingest process shares with its parent, in this order
+STREAM_COUNTERS = ("batches_replayed", "sequence_gaps", "batches_missed", "reconnects")
+_REPLAYED, _GAPS, _MISSED, _RECONNECTS = range(len(STREAM_COUNTERS))
+
+
+# Copy frames from a connected socket into the ring until the server goes away or we are
+# stopped; returns whether any frame arrived
+def _receive(client_socket, ring, wire_format, stop_event, hidden, tracker, counters):
+    reader = FrameReader()
+    received = False
+    answered = False  # The first frame is the server's answer to our hello
+    while not stop_event.is_set():
+        try:
+            frames = recv_frames(client_socket, reader)
+        except socket.timeout:
+            continue
+        if not frames:
+            log.info("Server closed the connection.")
+            return received
+        received = True
+        for frame in frames:
+            if not answered:
+                check_hello_reply(frame, wire_format)
+                answered = True
+                continue
+            try:
+                stream, sequence, _timestamp, flags, payload = decode_sequenced(frame)
+                gaps, missed = tracker.gaps, tracker.missed
+                if not tracker.accept(stream, sequence):
+                    continue
+                counters[_GAPS] += tracker.gaps - gaps
+                counters[_MISSED] += tracker.missed - missed
+                if flags & SEQUENCE_REPLAYED:
+                    counters[_REPLAYED] += 1
+                channel = peek_channel(payload, wire_format)
+                if hidden[channel]:
+                    continue
+                ring.write(*decode_points(payload, wire_format), channel)
+            except (ValueError, ProtocolError, KeyError, TypeError) as e:
+                log.error(f"Error decoding batch: {e}")
+    return received
+
+
+# Entry point of the ingest process: socket -> decode -> shared ring, reconnecting with
+# backoff (and resuming the sequenced stream) until stopped.
+# Batches of channels flagged in `hidden` are dropped before they are decoded.
+def ingest_main(ring_name, host, port, wire_format, stop_event, hidden, counters):
+    logging.basicConfig(level=os.environ.get("CLIENT_LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    ring = SharedPointRing.attach(ring_name)
+    tracker = SequenceTracker()
+    delays = backoff_delays()
+    try:
+        while not stop_event.is_set():
+            try:
+                with socket.create_connection((host, port), timeout=_CONNECT_TIMEOUT) as client_socket:
+                    client_socket.settimeout(_POLL_TIMEOUT)
+                    client_socket.sendall(encode_hello(wire_format, True, tracker.stream, tracker.last))
+                    if tracker.stream:
+                        counters[_RECONNECTS] += 1
+                    log.info(f"Ingest process connected to {host}:{port} ({wire_format})")
+                    if _receive(client_socket, ring, wire_format, stop_event, hidden, tracker, counters):
+                        delays = backoff_delays()
+            except HelloRefused as e:
+                log.error(f"{e}; not reconnecting")
+                return
+            except ProtocolError as e:
+                log.error(f"Protocol error, dropping connection: {e}")
+            except OSError as e:
+                log.warning(f"Connection to {host}:{port} failed: {e}")
+            delay = next(delays)
+            if not stop_event.wait(delay):
+                log.info(f"Reconnecting after {delay:.1f} s")
+    finally:
+        ring.close()
+
+
+class IngestProcess:
+    """Runs socket reading and decoding in a separate process.
+
+    Decoded points land in a SharedPointRing that this (GUI) process maps
+    as well, so each frame only copies the points added since the last one.
+    Channels hidden with `set_hidden` are skipped in the ingest process
+    before decoding. `counters` reports the process's STREAM_COUNTERS.
+    """
+
+    def __init__(self, host, port, wire_format, capacity=INGEST_RING_CAPACITY):
+        self.ring = SharedPointRing.create(capacity)
+        self.sequence = 0  # Ring total already handed to the caller
+        self.lost = 0      # Points overwritten before they could be read
+        context = multiprocessing.get_context("spawn")  # Never fork the GUI process
+        self._stop_event = context.Event()
+        # One flag per channel ID; single bytes, so no lock is needed to flip one
+        self._hidden = context.Array(ctypes.c_bool, MAX_CHANNEL + 1, lock=False)
+        # Only the ingest process writes these, so they need no lock either
+        self._counters = context.Array(ctypes.c_uint64, len(STREAM_COUNTERS), lock=False)
+        self._process = context.Process(target=ingest_main, daemon=True,
+                                        args=(self.ring.name, host, port, wire_format, self._stop_event,
+                                              self._hidden, self._counters))
+
+    def start(self):
+        self._process.start()
+        return self
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    @property
+    def counters(self):
+        return dict(zip(STREAM_COUNTERS, self._counters))
+
+    def set_hidden(self, channel, hidden):
+        self._hidden[channel] = hidden
+
+    # Points (and their channels) written by the ingest process since the previous call
+    def read_new(self):
+        xs, ys, channels, self.sequence, lost = self.ring.read_since(self.sequence)
+        self.lost += lost
+        return xs, ys, channels
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self.ring.close()
@@ -0,0 +1,458 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+import yaml
+
+from recording import (CHUNK_HEADER, FILE_HEADER, RECORDING_EXTENSION, RECORDING_MAGIC, RECORDING_VERSION,
+                       RecordingError, read_recording)
+from serializers import YamlLoader, yaml_load
+
+log = logging.getLogger("loader")
+
+# Binary cache written next to a loaded export so the next open can memory-map it.
+# Header: magic, version, flags, source size, source mtime (ns), point count, metadata length
+CACHE_MAGIC = b"PTCA"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sHHqqQQ")
+CACHE_EXTENSION = ".ptcache"
+POINT_DTYPE = np.dtype("<f8")
+
+# Exports with fewer points than this are parsed directly without writing a cache
+CACHE_MIN_POINTS = 100_000
+
+
+# Bytes read per step by the streaming readers
+STREAM_READ_SIZE = 1 << 20
+
+# Largest single JSON value (a point, or the metadata block) the streaming reader buffers
+# while waiting for it to end; past this the file is taken to be malformed
+_JSON_MAX_VALUE = 16 << 20
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_JSON_DELIMITER = re.compile(r"[ \t\n\r]*([,\]])[ \t\n\r]*")
+
+
+class DatasetError(Exception):
+    """Raised when a file is not a recognised export."""
+
+
+# Some early exports hold placeholder strings instead of readings; those points are skipped
+def _is_reading(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _report_skipped(skipped, path):
+    if skipped:
+        log.warning(f"Skipped {skipped} non-numeric points in {path}")
+
+
+# Parse an export's JSON in one pass, sending each {"x", "y"} object straight to the columns
+def parse_json_columns(f):
+    x_data, y_data = [], []
+    skipped = 0
+
+    def collect(pairs):
+        nonlocal skipped
+        obj = dict(pairs)
+        if len(obj) == 2 and "x" in obj and "y" in obj:
+            if _is_reading(obj["x"]) and _is_reading(obj["y"]):
+                x_data.append(obj["x"])
+                y_data.append(obj["y"])
+            else:
+                skipped += 1
+            return None  # The point already lives in the columns
+        return obj
+
+    document = json.load(f, object_pairs_hook=collect)
+    _report_skipped(skipped, f.name)
+    metadata = document.get("metadata") if isinstance(document, dict) else None
+    return np.array(x_data, dtype=np.float64), np.array(y_data, dtype=np.float64), metadata
+
+
+# Parse a YAML export and convert its regions to columns
+def parse_yaml_columns(f):
+    document = yaml_load(f)
+    regions = document.get("regions") if isinstance(document, dict) else document
+    metadata = document.get("metadata") if isinstance(document, dict) else None
+    try:
+        points = [(p["x"], p["y"]) for p in regions or []]
+    except (KeyError, TypeError) as e:
+        raise DatasetError(f"Unexpected region layout: {e}")
+    readings = [(x, y) for x, y in points if _is_reading(x) and _is_reading(y)]
+    _report_skipped(len(points) - len(readings), f.name)
+    columns = np.array(readings, dtype=np.float64).reshape(-1, 2)
+    return columns[:, 0].copy(), columns[:, 1].copy(), metadata
+
+
+# Points of a CSV export: an "x,y" header and one row per point. Rows that are not two
+# numbers (the header, placeholders) are skipped.
+def _csv_pairs(f):
+    for row in csv.reader(f):
+        if len(row) != 2:
+            continue
+        try:
+            yield float(row[0]), float(row[1])
+        except ValueError:
+            continue
+
+
+def parse_csv_columns(f):
+    columns = np.array(list(_csv_pairs(io.TextIOWrapper(f, newline=""))), dtype=np.float64).reshape(-1, 2)
+    return columns[:, 0].copy(), columns[:, 1].copy(), None
+
+
+def cache_path(path):
+    return path + CACHE_EXTENSION
+
+
+# Memory-map a cache if it was built from the current version of `path`
+def read_cache(path):
+    cache = cache_path(path)
+    try:
+        source = os.stat(path)
+        with open(cache, "rb") as f:
+            header = f.read(CACHE_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < CACHE_HEADER.size:
+        return None
+    magic, version, _flags, size, mtime_ns, count, metadata_len = CACHE_HEADER.unpack(header)
+    if (magic != CACHE_MAGIC or version != CACHE_VERSION
+            or size != source.st_size or mtime_ns != source.st_mtime_ns):
+        return None
+    columns = np.memmap(cache, dtype=POINT_DTYPE, mode="r", offset=CACHE_HEADER.size, shape=(2, count))
+    metadata = None
+    if metadata_len:
+        with open(cache, "rb") as f:
+            f.seek(CACHE_HEADER.size + columns.nbytes)
+            metadata = json.loads(f.read(metadata_len))
+    return columns[0], columns[1], metadata
+
+
+def write_cache(path, x_data, y_data, metadata):
+    source = os.stat(path)
+    metadata_bytes = json.dumps(metadata).encode('utf-8') if metadata is not None else b""
+    tmp = cache_path(path) + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, 0, source.st_size, source.st_mtime_ns,
+                                  len(x_data), len(metadata_bytes)))
+        f.write(np.ascontiguousarray(x_data, dtype=POINT_DTYPE).tobytes())
+        f.write(np.ascontiguousarray(y_data, dtype=POINT_DTYPE).tobytes())
+        f.write(metadata_bytes)
+    os.replace(tmp, cache_path(path))
+
+
+def load_dataset(path, use_cache=True):
+    """Load an export (JSON, YAML, CSV or binary recording) as (xs, ys, metadata).
+
+    Both export shapes are accepted: with or without a "metadata" block, and
+    a bare list of points. Large exports are cached as packed columns next
+    to the source file and memory-mapped on later opens.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == RECORDING_EXTENSION:
+        x_data, y_data, _start_time = read_recording(path)
+        return x_data, y_data, None
+
+    if use_cache:
+        cached = read_cache(path)
+        if cached is not None:
+            return cached
+
+    with open(path, "rb") as f:
+        try:
+            if extension == ".json":
+                x_data, y_data, metadata = parse_json_columns(f)
+            elif extension in (".yaml", ".yml"):
+                x_data, y_data, metadata = parse_yaml_columns(f)
+            elif extension == ".csv":
+                x_data, y_data, metadata = parse_csv_columns(f)
+            else:
+                raise DatasetError(f"Unsupported dataset type: {extension}")
+        except (ValueError, yaml.YAMLError) as e:
+            raise DatasetError(f"Could not parse {path}: {e}")
+
+    if use_cache and len(x_data) >= CACHE_MIN_POINTS:
+        try:
+            write_cache(path, x_data, y_data, metadata)
+        except OSError as e:
+            log.warning(f"Could not write cache for {path}: {e}")
+    return x_data, y_data, metadata
+
+
+# Group a stream of (x, y) pairs into column batches
+def _batched(pairs, batch_size):
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) == batch_size:
+            columns = np.array(batch, dtype=np.float64)
+            yield columns[:, 0], columns[:, 1]
+            batch = []
+    if batch:
+        columns = np.array(batch, dtype=np.float64)
+        yield columns[:, 0], columns[:, 1]
+
+
+class _JsonScanner:
+    """Reads a JSON document a block at a time, one token or complete value at a time.
+
+    Only the value being decoded (a point, or the metadata block) is held
+    in memory, never the whole file. Running out of input in the middle of
+    the document, or anything that is not JSON, raises DatasetError.
+    """
+
+    def __init__(self, f, path):
+        self.f = f
+        self.path = path
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.scan_once = json.JSONDecoder().scan_once  # The C scanner behind raw_decode
+
+    # Read another block, dropping what was already consumed; False at the end of the file
+    def _fill(self):
+        if self.eof:
+            return False
+        block = self.f.read(STREAM_READ_SIZE)
+        if not block:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def error(self, message):
+        return DatasetError(f"Could not parse {self.path}: {message} (character {self.pos} of the current block)")
+
+    # The next non-whitespace character, without consuming it; "" at the end of the file
+    def peek(self):
+        while True:
+            self.pos = _JSON_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    # Consume the next character, which must be one of `chars`
+    def expect(self, chars):
+        char = self.peek()
+        if not char:
+            raise self.error(f"file ends where one of {chars!r} was expected")
+        if char not in chars:
+            raise self.error(f"expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    # Decode the next complete value. One that runs into the end of the buffer may continue
+    # in the next block, so it is decoded again once more of the file has been read.
+    def value(self):
+        if not self.peek():
+            raise self.error("file ends where a value was expected")
+        while True:
+            try:
+                value, end = self.scan_once(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except (json.JSONDecodeError, StopIteration) as e:
+                message = getattr(e, "msg", "Expecting value")
+                if self.eof or len(self.buffer) - self.pos > _JSON_MAX_VALUE:
+                    raise self.error(message if self.eof else f"{message}, or a value larger than {_JSON_MAX_VALUE} characters")
+            if not self._fill():
+                self.eof = True
+
+
+# A decoded point as an (x, y) pair, or None for a placeholder that is not a reading
+def _json_point(scanner, point):
+    if type(point) is not dict or len(point) != 2 or "x" not in point or "y" not in point:
+        raise scanner.error(f"expected a point with x and y, found {str(point)[:80]}")
+    x, y = point["x"], point["y"]
+    if _is_reading(x) and _is_reading(y):
+        return float(x), float(y)
+    return None
+
+
+# Stream the points of a JSON array, checking each is a {"x", "y"} object like the exporter writes
+def _json_array_pairs(scanner, skipped):
+    scanner.expect("[")
+    if scanner.peek() == "]":
+        scanner.pos += 1
+        return
+    scan, delimiter = scanner.scan_once, _JSON_DELIMITER.match
+    while True:
+        # Fast path: decode straight from the buffer while each point and the delimiter after it
+        # are complete in it, which is all but the one point a block boundary cuts through
+        scanner.peek()
+        buffer, pos = scanner.buffer, scanner.pos
+        while True:
+            try:
+                point, end = scan(buffer, pos)
+            except (ValueError, StopIteration):
+                break
+            match = delimiter(buffer, end)
+            if match is None or match.end() == len(buffer):
+                break
+            if type(point) is dict and len(point) == 2 and type(point.get("x")) is float and type(point.get("y")) is float:
+                yield point["x"], point["y"]
+            else:
+                pair = _json_point(scanner, point)
+                if pair is None:
+                    skipped[0] += 1
+                else:
+                    yield pair
+            pos = match.end()
+            if match.group(1) == "]":
+                scanner.pos = pos
+                return
+        scanner.pos = pos
+        pair = _json_point(scanner, scanner.value())
+        if pair is None:
+            skipped[0] += 1
+        else:
+            yield pair
+        if scanner.expect(",]") == "]":
+            return
+
+
+# Parse a JSON export incrementally, never holding the whole file: either a bare list of points
+# or an object whose "regions" list holds them. Truncated or malformed files raise DatasetError.
+def _stream_json_pairs(path):
+    skipped = [0]
+    with open(path, encoding="utf-8") as f:
+        scanner = _JsonScanner(f, path)
+        first = scanner.peek()
+        if first == "[":
+            yield from _json_array_pairs(scanner, skipped)
+        elif first == "{":
+            scanner.expect("{")
+            if scanner.peek() == "}":
+                scanner.pos += 1
+            else:
+                while True:
+                    key = scanner.value()
+                    if not isinstance(key, str):
+                        raise scanner.error(f"expected a key, found {key!r}")
+                    scanner.expect(":")
+                    if key == "regions":
+                        if scanner.peek() != "[":
+                            raise scanner.error("regions is not a list")
+                        yield from _json_array_pairs(scanner, skipped)
+                    else:
+                        scanner.value()  # Metadata and anything else an export carries
+                    if scanner.expect(",}") == "}":
+                        break
+        elif first:
+            raise scanner.error(f"expected an export object or a list of points, found {first!r}")
+        else:
+            raise scanner.error("file is empty")
+        if scanner.peek():
+            raise scanner.error("unexpected data after the export")
+    _report_skipped(skipped[0], path)
+
+
+# Walk libyaml parser events so YAML exports are streamed instead of built as one document
+def _stream_yaml_pairs(path):
+    stack = []  # One entry per open collection; mappings are dicts tracking key/value state
+    with open(path, "rb") as f:
+        for event in yaml.parse(f, Loader=YamlLoader):
+            if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                if stack and stack[-1] is not None:
+                    stack[-1]["expect_key"] = True  # This collection is the parent's value
+                is_mapping = isinstance(event, yaml.MappingStartEvent)
+                stack.append({"expect_key": True, "key": None, "point": {}} if is_mapping else None)
+            elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                mapping = stack.pop()
+                if mapping is not None and len(mapping["point"]) == 2:
+                    yield mapping["point"]["x"], mapping["point"]["y"]
+            elif isinstance(event, yaml.ScalarEvent) and stack and stack[-1] is not None:
+                mapping = stack[-1]
+                if mapping["expect_key"]:
+                    mapping["key"] = event.value
+                    mapping["expect_key"] = False
+                    continue
+                mapping["expect_key"] = True
+                if mapping["key"] in ("x", "y") and event.implicit[0]:  # Plain, unquoted scalar
+                    try:
+                        mapping["point"][mapping["key"]] = float(event.value)
+                    except ValueError:
+                        pass
+
+
+def _stream_csv_pairs(path):
+    with open(path, newline="") as f:
+        yield from _csv_pairs(f)
+
+
+# Read a recording one chunk at a time
+def _stream_recording_columns(path):
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header)[:2] != (RECORDING_MAGIC, RECORDING_VERSION):
+            raise RecordingError(f"{path} is not a version {RECORDING_VERSION} recording")
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            (count,) = CHUNK_HEADER.unpack(header)
+            data = f.read(2 * count * POINT_DTYPE.itemsize)
+            if len(data) < 2 * count * POINT_DTYPE.itemsize:
+                return  # Chunk cut short by a crash
+            columns = np.frombuffer(data, dtype=POINT_DTYPE).reshape(2, count)
+            yield columns[0], columns[1]
+
+
+def iter_dataset_batches(path, batch_size):
+    """Stream an export or recording as (xs, ys) batches of up to `batch_size` points.
+
+    Memory use depends on the batch size, not the file size, so this works
+    on recordings far larger than RAM.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == RECORDING_EXTENSION:
+        x_rest = y_rest = np.empty(0, dtype=POINT_DTYPE)
+        for xs, ys in _stream_recording_columns(path):
+            x_rest, y_rest = np.concatenate((x_rest, xs)), np.concatenate((y_rest, ys))
+            while len(x_rest) >= batch_size:
+                yield x_rest[:batch_size], y_rest[:batch_size]
+                x_rest, y_rest = x_rest[batch_size:], y_rest[batch_size:]
+        if len(x_rest):
+            yield x_rest, y_rest
+    elif extension == ".json":
+        yield from _batched(_stream_json_pairs(path), batch_size)
+    elif extension in (".yaml", ".yml"):
+        yield from _batched(_stream_yaml_pairs(path), batch_size)
+    elif extension == ".csv":
+        yield from _batched(_stream_csv_pairs(path), batch_size)
+    else:
+        raise DatasetError(f"Unsupported dataset type: {extension}")
+
+
+class LoadJob:
+    """Loads a dataset on a background thread; poll `done`, then read `result` or `error`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.result = None
+        self.error = None
+        self.done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            self.result = load_dataset(self.path)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def start(self):
+        self._thread.start()
+        return self
@@ -0,0 +1,149 @@
+"""Synthetic high-rate load for sizing hardware.
+
+The batch generators here back `server.py --rate`: they build every batch
+with NumPy, so the server can emit millions of points per second. Run this
+module directly to open many concurrent client connections against a
+server and report what each of them receives.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from protocol import (FORMAT_BINARY, FRAME_HEADER, WIRE_FORMATS, ProtocolError, check_hello_reply, decode_points,
+                      encode_hello)
+
+# Reading ranges shared with the live feed
+VOLTAGE_RANGE = (0.0, 5.0)
+TEMPERATURE_RANGE = (-20.0, 80.0)
+
+DISTRIBUTIONS = ("uniform", "drift", "burst")
+
+# Batches per second the stress source aims for; batch size follows from the rate
+TARGET_BATCH_RATE = 100
+
+# Drift: per-point random-walk step, as a fraction of each range
+DRIFT_STEP = 0.002
+
+# Burst: a batch is a burst with this probability and then carries BURST_FACTOR times
+# the points; the remaining batches are empty, so the mean rate is unchanged
+BURST_PROBABILITY = 0.1
+BURST_FACTOR = 10
+BURST_SPREAD = 0.05  # Burst points cluster within this fraction of each range
+
+
+def uniform_batch(rng, size):
+    return rng.uniform(*VOLTAGE_RANGE, size), rng.uniform(*TEMPERATURE_RANGE, size)
+
+
+class DriftingSensor:
+    """Slowly wandering voltage/temperature curves, continued from batch to batch."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.position = np.array([np.mean(VOLTAGE_RANGE), np.mean(TEMPERATURE_RANGE)])
+
+    def batch(self, size):
+        low = np.array([VOLTAGE_RANGE[0], TEMPERATURE_RANGE[0]])
+        high = np.array([VOLTAGE_RANGE[1], TEMPERATURE_RANGE[1]])
+        steps = self.rng.normal(0.0, DRIFT_STEP, (size, 2)) * (high - low)
+        walk = self.position + np.cumsum(steps, axis=0)
+        # Fold the walk back into range instead of letting it stick to the edges
+        span = high - low
+        walk = low + np.abs((walk - low + span) % (2 * span) - span)
+        self.position = walk[-1]
+        return walk[:, 0], walk[:, 1]
+
+
+def burst_batch(rng, size):
+    if rng.random() >= BURST_PROBABILITY:
+        empty = np.empty(0)
+        return empty, empty
+    count = size * BURST_FACTOR
+    centre_x = rng.uniform(*VOLTAGE_RANGE)
+    centre_y = rng.uniform(*TEMPERATURE_RANGE)
+    xs = rng.normal(centre_x, BURST_SPREAD * np.ptp(VOLTAGE_RANGE), count)
+    ys = rng.normal(centre_y, BURST_SPREAD * np.ptp(TEMPERATURE_RANGE), count)
+    return np.clip(xs, *VOLTAGE_RANGE), np.clip(ys, *TEMPERATURE_RANGE)
+
+
+# Batch size and interval that produce `rate` points per second
+def stress_schedule(rate, batch_size=None):
+    if batch_size is None:
+        batch_size = max(1, int(rate) // TARGET_BATCH_RATE)
+    return batch_size, batch_size / rate
+
+
+def stress_batches(batch_size, distribution="uniform", seed=None):
+    """Endless stream of vectorized batches drawn from `distribution`.
+
+    Burst streams include empty batches; they keep the schedule but are not sent.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution: {distribution}")
+    rng = np.random.default_rng(seed)
+    sensor = DriftingSensor(rng)
+    while True:
+        if distribution == "uniform":
+            yield uniform_batch(rng, batch_size)
+        elif distribution == "drift":
+            yield sensor.batch(batch_size)
+        else:
+            yield burst_batch(rng, batch_size)
+
+
+# One load client: read frames as fast as possible and count what arrives
+async def sink_client(host, port, wire_format, deadline, totals):
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(encode_hello(wire_format))
+        header = await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), deadline - time.monotonic())
+        check_hello_reply(await reader.readexactly(FRAME_HEADER.unpack(header)[0]), wire_format)
+        while time.monotonic() < deadline:
+            header = await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), deadline - time.monotonic())
+            (length,) = FRAME_HEADER.unpack(header)
+            payload = await reader.readexactly(length)
+            xs, _ys = decode_points(payload, wire_format)
+            totals["points"] += len(xs)
+            totals["bytes"] += FRAME_HEADER.size + length
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+        pass
+    except OSError as e:  # Refused, reset, or lost
+        totals["errors"] += 1
+        print(f"Load client connection failed: {e}")
+    except ProtocolError as e:
+        totals["errors"] += 1
+        print(f"Load client was refused: {e}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_clients(host, port, connections, wire_format, duration):
+    deadline = time.monotonic() + duration
+    totals = [{"points": 0, "bytes": 0, "errors": 0} for _ in range(connections)]
+    await asyncio.gather(*(sink_client(host, port, wire_format, deadline, t) for t in totals))
+    points = np.array([t["points"] for t in totals])
+    print(f"{connections} connections over {duration:.1f} s: "
+          f"{points.sum() / duration:,.0f} pts/s total, per connection "
+          f"min {points.min() / duration:,.0f} / median {np.median(points) / duration:,.0f} / "
+          f"max {points.max() / duration:,.0f} pts/s, "
+          f"{sum(t['bytes'] for t in totals) / duration / 1e6:.1f} MB/s, "
+          f"{sum(t['errors'] for t in totals)} connection errors")
+
+
+if __name__ == "__main__":
+    from server import HOST, PORT
+
+    parser = argparse.ArgumentParser(description="Open many concurrent connections to a running server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--format", choices=WIRE_FORMATS, default=FORMAT_BINARY,
+                        help="wire format to request; the xor formats are meant for slowly varying signals, "
+                             "and fall back to binary batches for data that does not compress")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to stay connected")
+    args = parser.parse_args()
+    asyncio.run(run_clients(args.host, args.port, args.connections, args.format, args.duration))
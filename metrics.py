@@ -0,0 +1,121 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds: 1 µs to 10 s, four buckets per decade
+BUCKET_BOUNDS = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+
+# Samples kept by MetricsSampler for the overlay plots (one per sample interval)
+SAMPLE_HISTORY = 120
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing a value is one bisect and one increment."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+
+# Upper bound of the bucket holding the p-th percentile (0-100) of `counts`
+def bucket_percentile(counts, p):
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = total * p / 100.0
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return BUCKET_BOUNDS[min(index, len(BUCKET_BOUNDS) - 1)]
+    return BUCKET_BOUNDS[-1]
+
+
+class Metrics:
+    """Process-wide counters and timing histograms, safe to update from any thread."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self._counters),
+                    "histograms": {name: list(h.counts) for name, h in self._histograms.items()}}
+
+
+# Registry shared by everything in this process
+metrics = Metrics()
+
+
+class MetricsSampler:
+    """Turns periodic registry snapshots into rates and recent percentiles.
+
+    Each sample covers only the interval since the previous one. Samples
+    are kept for the overlay and, when `dump_path` is set, appended to that
+    file as JSON lines.
+    """
+
+    def __init__(self, registry=metrics, interval=1.0, dump_path=None):
+        self.registry = registry
+        self.interval = interval
+        self.history = deque(maxlen=SAMPLE_HISTORY)
+        self._previous = registry.snapshot()
+        self._previous_time = time.monotonic()
+        self._dump = open(dump_path, "a") if dump_path else None
+
+    # Take a sample if the interval has elapsed; returns the new sample or None
+    def poll(self):
+        now = time.monotonic()
+        elapsed = now - self._previous_time
+        if elapsed < self.interval:
+            return None
+        current = self.registry.snapshot()
+        sample = {"time": time.time(), "rates": {}, "p50_ms": {}, "p99_ms": {}, "counts": {}}
+        for name, value in current["counters"].items():
+            sample["rates"][name] = (value - self._previous["counters"].get(name, 0)) / elapsed
+        for name, counts in current["histograms"].items():
+            previous = self._previous["histograms"].get(name, [0] * len(counts))
+            window = [c - p for c, p in zip(counts, previous)]
+            sample["counts"][name] = sum(window)
+            sample["p50_ms"][name] = bucket_percentile(window, 50) * 1000
+            sample["p99_ms"][name] = bucket_percentile(window, 99) * 1000
+        self._previous, self._previous_time = current, now
+        self.history.append(sample)
+        if self._dump is not None:
+            self._dump.write(json.dumps(sample) + "\n")
+            self._dump.flush()
+        return sample
+
+    def set_dump_path(self, dump_path):
+        if self._dump is not None:
+            self._dump.close()
+        self._dump = open(dump_path, "a") if dump_path else None
+
+    def close(self):
+        self.set_dump_path(None)
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import numpy as np
+
+# Default number of points kept before the oldest ones are overwritten
+DEFAULT_CAPACITY = 1_000_000
+
+# Offset that turns the monotonic clock into seconds since the epoch as of startup
+_EPOCH_OFFSET = time.time() - time.monotonic()
+
+
+# Arrival timestamp for stored points: never goes backwards, yet reads as wall-clock time
+def timestamp():
+    return time.monotonic() + _EPOCH_OFFSET
+
+
+class PointStore:
+    """Bounded ring buffer of (x, y) points held in preallocated float64 columns.
+
+    Appends are O(batch); once the buffer is full the oldest points are
+    overwritten. Every point is stamped with its arrival time, and since
+    the stamps never decrease, `time_slice` finds a time range by binary
+    search. All methods are safe to call from several threads.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self._x = np.empty(self.capacity, dtype=np.float64)
+        self._y = np.empty(self.capacity, dtype=np.float64)
+        self._t = np.empty(self.capacity, dtype=np.float64)
+        self._head = 0   # Index of the next slot to write
+        self._size = 0   # Number of valid points in the buffer
+        self.total = 0   # Points appended since creation, including overwritten ones
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, xs, ys):
+        """Append matching sequences (or arrays) of x and y values, stamped with the current time."""
+        xs = np.asarray(xs, dtype=np.float64).ravel()
+        ys = np.asarray(ys, dtype=np.float64).ravel()
+        if xs.shape != ys.shape:
+            raise ValueError("x and y must have the same length")
+        n = xs.size
+        if n == 0:
+            return
+        appended = n
+        # Only the newest `capacity` points of an oversized batch can survive
+        if n > self.capacity:
+            xs, ys = xs[-self.capacity:], ys[-self.capacity:]
+            n = self.capacity
+
+        with self._lock:
+            now = timestamp()
+            start = self._head
+            first = min(n, self.capacity - start)
+            self._x[start:start + first] = xs[:first]
+            self._y[start:start + first] = ys[:first]
+            self._t[start:start + first] = now
+            if first < n:
+                # Wrap around to the start of the buffer
+                self._x[:n - first] = xs[first:]
+                self._y[:n - first] = ys[first:]
+                self._t[:n - first] = now
+            self._head = (start + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+            self.total += appended
+
+    def extend_points(self, points):
+        """Append a list of {"x": ..., "y": ...} dicts as sent by the server."""
+        self.append([p["x"] for p in points], [p["y"] for p in points])
+
+    def snapshot(self):
+        """Return copies of the x and y columns in arrival order (oldest first)."""
+        with self._lock:
+            start = (self._head - self._size) % self.capacity
+            if start + self._size <= self.capacity:
+                return self._x[start:start + self._size].copy(), self._y[start:start + self._size].copy()
+            return (np.concatenate((self._x[start:], self._x[:self._head])),
+                    np.concatenate((self._y[start:], self._y[:self._head])))
+
+    def read_since(self, total):
+        """Return (xs, ys, new_total) for points appended after `total` was read.
+
+        If some of those points have already been overwritten, only the ones
+        still in the buffer are returned.
+        """
+        with self._lock:
+            n = min(self.total - total, self._size)
+            if n <= 0:
+                empty = np.empty(0, dtype=np.float64)
+                return empty, empty, self.total
+            start = (self._head - n) % self.capacity
+            if start < self._head:
+                xs, ys = self._x[start:self._head].copy(), self._y[start:self._head].copy()
+            else:
+                xs = np.concatenate((self._x[start:], self._x[:self._head]))
+                ys = np.concatenate((self._y[start:], self._y[:self._head]))
+            return xs, ys, self.total
+
+    # Logical index (0 = oldest point) where `t` would be inserted into the time column.
+    # The column is sorted in arrival order, which is at most two physical runs.
+    def _search_time(self, t, side):
+        start = (self._head - self._size) % self.capacity
+        if start + self._size <= self.capacity:
+            return int(np.searchsorted(self._t[start:start + self._size], t, side))
+        first = self.capacity - start
+        index = int(np.searchsorted(self._t[start:], t, side))
+        if index < first:
+            return index
+        return first + int(np.searchsorted(self._t[:self._head], t, side))
+
+    # Copies of a column's points with logical indices lo..hi-1
+    def _copy_range(self, column, lo, hi):
+        start = (self._head - self._size + lo) % self.capacity
+        n = hi - lo
+        if start + n <= self.capacity:
+            return column[start:start + n].copy()
+        return np.concatenate((column[start:], column[:n - (self.capacity - start)]))
+
+    def time_slice(self, t_start, t_end):
+        """Return (ts, xs, ys) for the points that arrived between `t_start` and `t_end` inclusive.
+
+        Costs two binary searches plus a copy of the points in the range,
+        however many points the store holds.
+        """
+        with self._lock:
+            lo = self._search_time(t_start, "left")
+            hi = max(lo, self._search_time(t_end, "right"))
+            return (self._copy_range(self._t, lo, hi), self._copy_range(self._x, lo, hi),
+                    self._copy_range(self._y, lo, hi))
+
+    def time_bounds(self):
+        """Return the arrival times of the oldest and newest points, or None if the store is empty."""
+        with self._lock:
+            if not self._size:
+                return None
+            return float(self._t[(self._head - self._size) % self.capacity]), float(self._t[self._head - 1])
+
+    def drop_before(self, total):
+        """Forget the points appended before `total` points had been appended in all."""
+        with self._lock:
+            self._size = min(self._size, max(0, self.total - total))
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._size = 0
+            self.total = 0
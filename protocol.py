@@ -0,0 +1,439 @@
+import random
+import re
+import struct
+import zlib
+from typing import NamedTuple
+
+import numpy as np
+
+from serializers import MSGPACK_CODEC, STDLIB_JSON, json_codec, json_dumps, json_loads, msgpack_first_entry
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Every message on the stream is a 4-byte big-endian payload length followed by the payload
+FRAME_HEADER = struct.Struct("!I")
+
+# Upper bound on a single payload, to catch a corrupted or foreign stream early
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Size of each socket read on the client side
+RECV_SIZE = 65536
+
+
+class ProtocolError(Exception):
+    """Raised when the byte stream cannot be split into valid frames."""
+
+
+class HelloRefused(ProtocolError):
+    """Raised when the server refuses the client's hello, e.g. an unsupported wire format."""
+
+
+# Wrap a payload in a length-prefixed frame
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameReader:
+    """Incremental decoder that splits a received byte stream into frames.
+
+    Feed it whatever `recv` returned; it returns every payload that is now
+    complete and keeps any partial frame buffered for the next call.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        offset = 0
+        buffered = len(self._buffer)
+        header_size = FRAME_HEADER.size
+        while buffered - offset >= header_size:
+            (length,) = FRAME_HEADER.unpack_from(self._buffer, offset)
+            if length > self.max_frame_size:
+                raise ProtocolError(f"Frame length {length} exceeds {self.max_frame_size}")
+            end = offset + header_size + length
+            if end > buffered:
+                break
+            frames.append(bytes(self._buffer[offset + header_size:end]))
+            offset = end
+        # Drop consumed bytes in one step rather than once per frame
+        if offset:
+            del self._buffer[:offset]
+        return frames
+
+    def pending(self):
+        """Number of bytes buffered towards an incomplete frame."""
+        return len(self._buffer)
+
+
+# Receive from a socket until at least one frame is complete; returns [] on EOF
+def recv_frames(sock, reader, recv_size=RECV_SIZE):
+    while True:
+        data = sock.recv(recv_size)
+        if not data:
+            return []
+        frames = reader.feed(data)
+        if frames:
+            return frames
+
+
+# Wire formats a client can ask for in its hello frame; JSON is the default.
+# The XOR formats compress each column (see encode_points_xor), which pays off for slowly varying
+# signals and costs CPU for nothing on noisy ones; lz4 is only offered if installed, and so is
+# msgpack, which carries the x and y columns as two arrays.
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMAT_XOR_ZLIB = "xor-zlib"
+FORMAT_XOR_LZ4 = "xor-lz4"
+FORMAT_MSGPACK = "msgpack"
+XOR_FORMATS = (FORMAT_XOR_ZLIB,) + ((FORMAT_XOR_LZ4,) if lz4_frame is not None else ())
+WIRE_FORMATS = ((FORMAT_JSON, FORMAT_BINARY) + XOR_FORMATS
+                + ((FORMAT_MSGPACK,) if MSGPACK_CODEC is not None else ()))
+
+# Binary batch header: magic, version, flags (FLAG_*), point count (little-endian)
+BINARY_MAGIC = b"PT"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<2sBBI")
+
+# Points follow the header as interleaved little-endian float64 (x, y) pairs
+POINT_DTYPE = np.dtype("<f8")
+
+# XOR batches share the binary header layout under their own magic; the count is points, not bytes.
+# A batch that does not compress is sent as a plain binary batch instead, told apart by its magic.
+XOR_MAGIC = b"PX"
+XOR_ZLIB_LEVEL = 1  # Most of the gain comes from the XOR step; higher levels cost far more CPU
+
+# Multi-channel servers tag each batch with a channel ID (one per battery pack);
+# untagged batches belong to the default channel
+DEFAULT_CHANNEL = 0
+MAX_CHANNEL = 0xFFFF
+
+# Binary flag bit: the header is followed by a uint16 channel ID, padded so the points stay 8-byte aligned
+FLAG_CHANNEL = 0x01
+CHANNEL_FIELD = struct.Struct("<H6x")
+
+# A tagged JSON batch is {"channel": <id>, "points": [...]} with the channel key first
+_JSON_CHANNEL = re.compile(rb'\s*\{\s*"channel"\s*:\s*(\d+)')
+
+
+# Sequenced streams prefix every batch with the server's stream ID (random per server run),
+# its sequence number (from 1), the server time it was generated and SEQUENCE_* flags,
+# so a reconnecting client can ask for exactly the batches it missed
+SEQUENCE_HEADER = struct.Struct("!IQdB")
+SEQUENCE_REPLAYED = 0x01  # Sent from the server's replay buffer after a reconnect
+
+
+class Hello(NamedTuple):
+    wire_format: str
+    sequenced: bool = False  # Whether batches carry a SEQUENCE_HEADER
+    stream: int = 0          # Stream the client last received from; 0 for a fresh connection
+    resume_after: int = 0    # Last sequence number the client received from that stream
+
+
+# First frame sent by a client to choose the wire format and, optionally, a sequenced stream.
+# A client that was connected before passes the stream and last sequence number it saw.
+def encode_hello(wire_format=FORMAT_JSON, sequenced=False, stream=0, resume_after=0):
+    if wire_format not in WIRE_FORMATS:
+        raise ProtocolError(f"Unknown wire format: {wire_format}")
+    hello = {"format": wire_format}
+    if sequenced:
+        hello["resume"] = {"stream": stream, "after": resume_after}
+    return encode_frame(json_dumps(hello))
+
+
+def decode_hello(payload):
+    try:
+        hello = json_loads(payload)
+        wire_format = hello["format"]
+        resume = hello.get("resume")
+        if resume is not None:
+            stream, resume_after = resume["stream"], resume["after"]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ProtocolError(f"Malformed hello: {e}")
+    if wire_format not in WIRE_FORMATS:
+        raise ProtocolError(f"Unknown wire format: {wire_format}")
+    if resume is None:
+        return Hello(wire_format)
+    if not all(isinstance(value, int) and value >= 0 for value in (stream, resume_after)):
+        raise ProtocolError(f"Invalid resume point: {resume!r}")
+    return Hello(wire_format, True, stream, resume_after)
+
+
+# The server answers every hello with one frame: the wire format it will send, or the reason
+# it refused the hello, after which it closes the connection. Clients that send no hello get
+# no answer and JSON, as before hellos existed.
+def encode_hello_reply(wire_format=None, error=None):
+    return encode_frame(json_dumps({"error": error} if error is not None else {"format": wire_format}))
+
+
+# Check the server's answer to a hello asking for `wire_format`
+def check_hello_reply(payload, wire_format):
+    try:
+        reply = json_loads(payload)
+        error, chosen = reply.get("error"), reply.get("format")
+    except (ValueError, AttributeError) as e:
+        raise ProtocolError(f"Malformed hello reply: {e}")
+    if error is not None:
+        raise HelloRefused(f"Server refused the {wire_format} wire format: {error}")
+    if chosen != wire_format:
+        raise HelloRefused(f"Asked for the {wire_format} wire format but the server chose {chosen}")
+
+
+def encode_sequenced(stream, sequence, timestamp, payload, flags=0):
+    return SEQUENCE_HEADER.pack(stream, sequence, timestamp, flags) + payload
+
+
+# Split a sequenced batch into (stream, sequence, timestamp, flags, batch payload)
+def decode_sequenced(payload):
+    if len(payload) < SEQUENCE_HEADER.size:
+        raise ProtocolError("Sequenced batch shorter than its header")
+    stream, sequence, timestamp, flags = SEQUENCE_HEADER.unpack_from(payload)
+    return stream, sequence, timestamp, flags, payload[SEQUENCE_HEADER.size:]
+
+
+class SequenceTracker:
+    """Follows the sequence numbers of a stream across reconnects.
+
+    `accept` returns False for a batch already received (nothing is lost by
+    dropping it) and counts batches skipped over as missed. That happens
+    when the server drops batches for a client that falls behind, and when
+    a client was away longer than the server's replay buffer covers.
+    A new stream ID means the server restarted; counting starts over.
+    """
+
+    def __init__(self):
+        self.stream = 0     # Stream ID of the server last received from
+        self.last = 0       # Highest sequence number received from it
+        self.gaps = 0       # Times the stream skipped ahead
+        self.missed = 0     # Batches skipped over
+        self.restarts = 0   # Times the server came back as a new stream
+
+    def accept(self, stream, sequence):
+        if stream != self.stream:
+            if self.stream:
+                self.restarts += 1
+            self.stream, self.last = stream, 0
+        if sequence <= self.last:
+            return False
+        if self.last and sequence > self.last + 1:
+            self.gaps += 1
+            self.missed += sequence - self.last - 1
+        self.last = sequence
+        return True
+
+
+# Reconnect delays: doubling from `initial` up to `maximum`, with jitter so clients
+# that lost the same server do not all come back at once
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+
+
+def backoff_delays(initial=RECONNECT_INITIAL_DELAY, maximum=RECONNECT_MAX_DELAY):
+    delay = initial
+    while True:
+        yield delay * random.uniform(0.5, 1.0)
+        delay = min(delay * 2, maximum)
+
+
+def _check_channel(channel):
+    if not 0 <= channel <= MAX_CHANNEL:
+        raise ProtocolError(f"Channel {channel} is outside 0..{MAX_CHANNEL}")
+    return channel
+
+
+# Encode a batch of points as a JSON list of {"x", "y"} objects, wrapped with its channel if tagged
+def encode_points_json(xs, ys, channel=None):
+    xs, ys = np.asarray(xs), np.asarray(ys)
+    # Only stdlib json keeps non-finite readings (as NaN/Infinity) instead of turning them into null
+    codec = json_codec if np.isfinite(xs).all() and np.isfinite(ys).all() else STDLIB_JSON
+    points = [{"x": x, "y": y} for x, y in zip(xs.tolist(), ys.tolist())]
+    if channel is not None:
+        return codec.dumps({"channel": _check_channel(channel), "points": points})
+    return codec.dumps(points)
+
+
+# Encode a batch of points as a binary header plus packed float64 pairs
+def encode_points_binary(xs, ys, channel=None):
+    pairs = np.empty((len(xs), 2), dtype=POINT_DTYPE)
+    pairs[:, 0] = xs
+    pairs[:, 1] = ys
+    if channel is not None:
+        return (BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, FLAG_CHANNEL, len(pairs))
+                + CHANNEL_FIELD.pack(_check_channel(channel)) + pairs.tobytes())
+    return BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(pairs)) + pairs.tobytes()
+
+
+# Encode a batch as a msgpack map of x and y arrays. A tagged batch has its channel as the map's
+# first entry, so peek_channel reads it without unpacking the points.
+def encode_points_msgpack(xs, ys, channel=None):
+    batch = {} if channel is None else {"channel": _check_channel(channel)}
+    batch["x"] = np.asarray(xs, dtype=np.float64).tolist()
+    batch["y"] = np.asarray(ys, dtype=np.float64).tolist()
+    return MSGPACK_CODEC.dumps(batch)
+
+
+def _peek_channel_msgpack(payload):
+    try:
+        first = msgpack_first_entry(payload)
+    except Exception as e:  # msgpack raises a variety of ValueError subclasses and its own errors
+        raise ProtocolError(f"Malformed msgpack batch: {e}")
+    if first is None or first[0] != "channel":
+        return DEFAULT_CHANNEL
+    if not isinstance(first[1], int):
+        raise ProtocolError(f"Invalid channel in msgpack batch: {first[1]!r}")
+    return _check_channel(first[1])
+
+
+def _unpack_msgpack(payload):
+    try:
+        batch = MSGPACK_CODEC.loads(payload)
+    except Exception as e:  # msgpack raises a variety of ValueError subclasses and its own errors
+        raise ProtocolError(f"Malformed msgpack batch: {e}")
+    if not isinstance(batch, dict):
+        raise ProtocolError("A msgpack batch must be a map")
+    return batch
+
+
+def decode_points_msgpack(payload):
+    batch = _unpack_msgpack(payload)
+    xs, ys = np.asarray(batch["x"], dtype=np.float64), np.asarray(batch["y"], dtype=np.float64)
+    if xs.shape != ys.shape:
+        raise ProtocolError(f"msgpack batch has {len(xs)} x values but {len(ys)} y values")
+    return xs, ys
+
+
+def encode_points(xs, ys, wire_format=FORMAT_JSON, channel=None):
+    if wire_format == FORMAT_BINARY:
+        return encode_points_binary(xs, ys, channel)
+    if wire_format in XOR_FORMATS:
+        return encode_points_xor(xs, ys, wire_format, channel)
+    if wire_format == FORMAT_MSGPACK:
+        return encode_points_msgpack(xs, ys, channel)
+    return encode_points_json(xs, ys, channel)
+
+
+def _compress(body, wire_format):
+    if wire_format == FORMAT_XOR_LZ4:
+        return lz4_frame.compress(body)
+    return zlib.compress(body, XOR_ZLIB_LEVEL)
+
+
+# Decompress at most `size` bytes, the size the batch header promises, so a small frame
+# cannot expand into gigabytes; a block that holds more than that (or less) is rejected
+def _decompress(body, wire_format, size):
+    try:
+        if wire_format == FORMAT_XOR_LZ4:
+            decompressor = lz4_frame.LZ4FrameDecompressor()
+            data = decompressor.decompress(body, max_length=size)
+            complete = decompressor.eof and not decompressor.unused_data
+        else:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(body, size)
+            complete = decompressor.eof and not decompressor.unconsumed_tail and not decompressor.unused_data
+    except Exception as e:  # zlib.error, or lz4's RuntimeError
+        raise ProtocolError(f"Corrupt compressed batch: {e}")
+    if not complete or len(data) != size:
+        raise ProtocolError(f"Compressed batch does not hold the {size} bytes its header promises")
+    return data
+
+
+# XOR each float64 with its predecessor, then regroup the result by byte position. Slowly
+# changing readings share sign, exponent and leading mantissa bits, so the high byte
+# planes come out mostly zero and the compressor squeezes them to almost nothing.
+def _xor_shuffle(values):
+    bits = np.ascontiguousarray(values, dtype=POINT_DTYPE).view("<u8")
+    deltas = bits.copy()
+    deltas[1:] ^= bits[:-1]
+    return deltas.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _xor_unshuffle(planes, count):
+    deltas = np.ascontiguousarray(np.frombuffer(planes, dtype=np.uint8).reshape(8, count).T).view("<u8").ravel()
+    return np.bitwise_xor.accumulate(deltas).view(POINT_DTYPE)
+
+
+# Encode a batch as the binary header plus one compressed block of XOR-delta, byte-shuffled columns,
+# or as a plain binary batch when that block would be no smaller than the raw points (noisy signals)
+def encode_points_xor(xs, ys, wire_format=FORMAT_XOR_ZLIB, channel=None):
+    flags, channel_field = 0, b""
+    if channel is not None:
+        flags, channel_field = FLAG_CHANNEL, CHANNEL_FIELD.pack(_check_channel(channel))
+    body = _compress(_xor_shuffle(xs) + _xor_shuffle(ys), wire_format)
+    if len(body) >= 2 * len(xs) * POINT_DTYPE.itemsize:
+        return encode_points_binary(xs, ys, channel)
+    return BINARY_HEADER.pack(XOR_MAGIC, BINARY_VERSION, flags, len(xs)) + channel_field + body
+
+
+def decode_points_xor(payload, wire_format=FORMAT_XOR_ZLIB):
+    if len(payload) < BINARY_HEADER.size:
+        raise ProtocolError("Compressed batch shorter than its header")
+    magic, version, flags, count = BINARY_HEADER.unpack_from(payload)
+    if magic == BINARY_MAGIC:  # Sent uncompressed because it did not compress
+        return decode_points_binary(payload)
+    if magic != XOR_MAGIC or version != BINARY_VERSION:
+        raise ProtocolError(f"Unsupported compressed batch (magic={magic!r}, version={version})")
+    offset = BINARY_HEADER.size + (CHANNEL_FIELD.size if flags & FLAG_CHANNEL else 0)
+    column_size = count * POINT_DTYPE.itemsize
+    if 2 * column_size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Compressed batch of {count} points would not fit in an uncompressed frame")
+    body = _decompress(payload[offset:], wire_format, 2 * column_size)
+    return _xor_unshuffle(body[:column_size], count), _xor_unshuffle(body[column_size:], count)
+
+
+# Channel of an encoded batch, read without decoding its points
+def peek_channel(payload, wire_format=FORMAT_JSON):
+    if wire_format == FORMAT_MSGPACK:
+        return _peek_channel_msgpack(payload)
+    if wire_format != FORMAT_JSON:  # Binary and XOR batches share the header layout
+        if len(payload) < BINARY_HEADER.size:
+            raise ProtocolError("Binary batch shorter than its header")
+        _magic, _version, flags, _count = BINARY_HEADER.unpack_from(payload)
+        if not flags & FLAG_CHANNEL:
+            return DEFAULT_CHANNEL
+        if len(payload) < BINARY_HEADER.size + CHANNEL_FIELD.size:
+            raise ProtocolError("Binary batch shorter than its channel field")
+        return CHANNEL_FIELD.unpack_from(payload, BINARY_HEADER.size)[0]
+    match = _JSON_CHANNEL.match(payload)
+    return _check_channel(int(match.group(1))) if match else DEFAULT_CHANNEL
+
+
+def decode_points_json(payload):
+    points = json_loads(payload)
+    if isinstance(points, dict):  # Tagged batch
+        points = points["points"]
+    xs = np.fromiter((p["x"] for p in points), dtype=np.float64, count=len(points))
+    ys = np.fromiter((p["y"] for p in points), dtype=np.float64, count=len(points))
+    return xs, ys
+
+
+# Decode a binary batch into x and y views over the payload (no per-point objects)
+def decode_points_binary(payload):
+    if len(payload) < BINARY_HEADER.size:
+        raise ProtocolError("Binary batch shorter than its header")
+    magic, version, flags, count = BINARY_HEADER.unpack_from(payload)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ProtocolError(f"Unsupported binary batch (magic={magic!r}, version={version})")
+    offset = BINARY_HEADER.size + (CHANNEL_FIELD.size if flags & FLAG_CHANNEL else 0)
+    expected = offset + count * 2 * POINT_DTYPE.itemsize
+    if len(payload) != expected:
+        raise ProtocolError(f"Binary batch is {len(payload)} bytes, expected {expected}")
+    pairs = np.frombuffer(payload, dtype=POINT_DTYPE, count=count * 2, offset=offset).reshape(count, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def decode_points(payload, wire_format=FORMAT_JSON):
+    if wire_format == FORMAT_BINARY:
+        return decode_points_binary(payload)
+    if wire_format in XOR_FORMATS:
+        return decode_points_xor(payload, wire_format)
+    if wire_format == FORMAT_MSGPACK:
+        return decode_points_msgpack(payload)
+    return decode_points_json(payload)
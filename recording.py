@@ -0,0 +1,135 @@
+import argparse
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from exporter import write_export
+
+# File header: magic, format version, reserved flags, start time (Unix seconds)
+RECORDING_MAGIC = b"PTRC"
+RECORDING_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHd")
+
+# Each chunk is a point count followed by the x column and then the y column (float64)
+CHUNK_HEADER = struct.Struct("<I")
+POINT_DTYPE = np.dtype("<f8")
+
+RECORDING_EXTENSION = ".ptrec"
+
+CHUNK_POINTS = 65536   # Points buffered before a chunk is written
+FLUSH_INTERVAL = 1.0   # Seconds after which a partial chunk is written anyway
+
+
+class RecordingError(Exception):
+    """Raised when a file is not a readable recording."""
+
+
+class Recorder:
+    """Appends incoming batches to a binary recording, one chunk at a time.
+
+    Work per batch is proportional to the batch, never to the history.
+    Each chunk is flushed as soon as it is written, so a crash loses at
+    most the points still buffered for the next chunk.
+    """
+
+    def __init__(self, path, chunk_points=CHUNK_POINTS, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.chunk_points = chunk_points
+        self.flush_interval = flush_interval
+        self.points_written = 0
+        self._pending_x = []
+        self._pending_y = []
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, 0, time.time()))
+        self._file.flush()
+
+    def append(self, xs, ys):
+        with self._lock:
+            if self._file is None:  # Batches racing a stop are dropped
+                return
+            self._pending_x.append(np.asarray(xs, dtype=POINT_DTYPE))
+            self._pending_y.append(np.asarray(ys, dtype=POINT_DTYPE))
+            self._pending_count += len(xs)
+            if (self._pending_count >= self.chunk_points
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._write_chunk()
+
+    def _write_chunk(self):
+        if self._pending_count:
+            xs = np.concatenate(self._pending_x)
+            ys = np.concatenate(self._pending_y)
+            self._file.write(CHUNK_HEADER.pack(len(xs)))
+            self._file.write(xs.tobytes())
+            self._file.write(ys.tobytes())
+            self._file.flush()
+            self.points_written += len(xs)
+            self._pending_x, self._pending_y, self._pending_count = [], [], 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._write_chunk()
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path):
+    """Return (xs, ys, start_time) from a recording, ignoring a truncated final chunk."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < FILE_HEADER.size:
+        raise RecordingError(f"{path} is too short to be a recording")
+    magic, version, _flags, start_time = FILE_HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise RecordingError(f"{path} is not a version {RECORDING_VERSION} recording")
+
+    x_chunks, y_chunks = [], []
+    offset = FILE_HEADER.size
+    while offset + CHUNK_HEADER.size <= len(data):
+        (count,) = CHUNK_HEADER.unpack_from(data, offset)
+        column_bytes = count * POINT_DTYPE.itemsize
+        end = offset + CHUNK_HEADER.size + 2 * column_bytes
+        if end > len(data):
+            break  # Chunk cut short by a crash
+        start = offset + CHUNK_HEADER.size
+        x_chunks.append(np.frombuffer(data, dtype=POINT_DTYPE, count=count, offset=start))
+        y_chunks.append(np.frombuffer(data, dtype=POINT_DTYPE, count=count, offset=start + column_bytes))
+        offset = end
+
+    if not x_chunks:
+        empty = np.empty(0, dtype=POINT_DTYPE)
+        return empty, empty, start_time
+    return np.concatenate(x_chunks), np.concatenate(y_chunks), start_time
+
+
+# Convert a recording to a JSON or YAML export using the regular exporters
+def convert_recording(path, output_path, data_type, compact=False):
+    xs, ys, start_time = read_recording(path)
+    metadata = {
+        "export_time": datetime.fromtimestamp(start_time).strftime("%Y-%m-%d %H:%M:%S"),
+        "source": f"Recording {os.path.basename(path)}"
+    }
+    write_export(output_path, xs, ys, data_type, metadata, compact=compact)
+    return len(xs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a binary recording to a JSON or YAML export.")
+    parser.add_argument("recording")
+    parser.add_argument("output", help="output path; its extension (.json or .yaml) picks the format")
+    parser.add_argument("--compact", action="store_true", help="write JSON without indentation")
+    args = parser.parse_args()
+    data_type = os.path.splitext(args.output)[1].lstrip(".").lower()
+    if data_type == "yml":
+        data_type = "yaml"
+    count = convert_recording(args.recording, args.output, data_type, compact=args.compact)
+    print(f"Wrote {count} points to {args.output}")
@@ -0,0 +1,157 @@
+import math
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+
+class RetentionTier(NamedTuple):
+    name: str
+    bin_seconds: float   # 0 for the raw tier
+    keep_seconds: float
+
+
+# Raw points for 10 minutes, 1-second aggregates for a day, 1-minute aggregates for 30 days
+DEFAULT_TIERS = (
+    RetentionTier("raw", 0, 10 * 60),
+    RetentionTier("1 s", 1, 24 * 3600),
+    RetentionTier("1 min", 60, 30 * 24 * 3600),
+)
+
+# Columns kept per aggregate bin
+AGGREGATE_FIELDS = ("start", "count", "x_min", "x_max", "x_mean", "y_min", "y_max", "y_mean")
+_START, _COUNT, _X_MIN, _X_MAX, _X_MEAN, _Y_MIN, _Y_MAX, _Y_MEAN = range(len(AGGREGATE_FIELDS))
+
+
+class AggregateTier:
+    """Fixed-size ring of per-bin aggregates: count, min, max and mean of x and y.
+
+    Bins are time-ordered and only the newest one is ever updated, so
+    adding a batch is O(batch) and memory is fixed at one row per bin in
+    the retention period.
+    """
+
+    def __init__(self, tier):
+        self.name = tier.name
+        self.bin_seconds = tier.bin_seconds
+        self.keep_seconds = tier.keep_seconds
+        self.capacity = int(math.ceil(tier.keep_seconds / tier.bin_seconds)) + 1
+        self._rows = np.zeros((self.capacity, len(AGGREGATE_FIELDS)), dtype=np.float64)
+        self._head = 0  # Row of the next new bin
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _newest(self):
+        return self._rows[(self._head - 1) % self.capacity]
+
+    def add(self, xs, ys, now):
+        if not len(xs):
+            return
+        start = math.floor(now / self.bin_seconds) * self.bin_seconds
+        count = len(xs)
+        x_mean, y_mean = float(np.mean(xs)), float(np.mean(ys))
+        if self._size and self._newest()[_START] == start:
+            row = self._newest()
+            total = row[_COUNT] + count
+            row[_X_MEAN] += (x_mean - row[_X_MEAN]) * count / total
+            row[_Y_MEAN] += (y_mean - row[_Y_MEAN]) * count / total
+            row[_X_MIN] = min(row[_X_MIN], np.min(xs))
+            row[_X_MAX] = max(row[_X_MAX], np.max(xs))
+            row[_Y_MIN] = min(row[_Y_MIN], np.min(ys))
+            row[_Y_MAX] = max(row[_Y_MAX], np.max(ys))
+            row[_COUNT] = total
+            return
+        self._rows[self._head] = (start, count, np.min(xs), np.max(xs), x_mean, np.min(ys), np.max(ys), y_mean)
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    # Forget bins that ended before the retention period
+    def expire(self, now):
+        cutoff = now - self.keep_seconds - self.bin_seconds
+        while self._size and self._rows[(self._head - self._size) % self.capacity, _START] < cutoff:
+            self._size -= 1
+
+    def bins_since(self, since):
+        """Return a dict of aggregate columns (oldest first) for bins starting at or after `since`."""
+        start = (self._head - self._size) % self.capacity
+        if start + self._size <= self.capacity:
+            rows = self._rows[start:start + self._size]
+        else:
+            rows = np.concatenate((self._rows[start:], self._rows[:self._head]))
+        rows = rows[np.searchsorted(rows[:, _START], since):]
+        return {name: rows[:, index] for index, name in enumerate(AGGREGATE_FIELDS)}
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+
+class TieredRetention:
+    """Keeps a PointStore's raw points for a limited time, plus coarser aggregates for longer.
+
+    Every batch goes to the store and is folded into the newest bin of each
+    aggregate tier as it arrives, so nothing has to be re-aggregated when
+    raw points age out: expiring just moves the store's oldest point (and
+    each tier's oldest bin) forward. Batches added without an arrival time,
+    such as a loaded dataset, are pinned: they and everything after them
+    stay until the store overwrites them or is cleared.
+    """
+
+    def __init__(self, store, tiers=DEFAULT_TIERS):
+        if tiers[0].bin_seconds != 0:
+            raise ValueError("The first retention tier must be the raw tier")
+        self.store = store
+        self.raw_keep_seconds = tiers[0].keep_seconds
+        self.aggregates = [AggregateTier(tier) for tier in tiers[1:]]
+        self._batches = deque()  # (store.total after the batch, arrival time)
+
+    def add(self, xs, ys, now=None):
+        self.store.append(xs, ys)
+        self._batches.append((self.store.total, math.inf if now is None else now))
+        if now is not None:
+            for tier in self.aggregates:
+                tier.add(xs, ys, now)
+
+    def expire(self, now):
+        """Drop raw points and bins older than their tiers keep; returns the raw points dropped."""
+        oldest = self.store.total - len(self.store)
+        # Batches the store has already overwritten need no bookkeeping
+        while self._batches and self._batches[0][0] <= oldest:
+            self._batches.popleft()
+        boundary = None
+        cutoff = now - self.raw_keep_seconds
+        while self._batches and self._batches[0][1] < cutoff:
+            boundary = self._batches.popleft()[0]
+        dropped = 0
+        if boundary is not None:
+            before = len(self.store)
+            self.store.drop_before(boundary)
+            dropped = before - len(self.store)
+        for tier in self.aggregates:
+            tier.expire(now)
+        return dropped
+
+    def pinned_since(self):
+        """store.total before the oldest pinned batch still held, or None if nothing is pinned."""
+        start = self.store.total - len(self.store)
+        for total, arrived in self._batches:
+            if arrived == math.inf:
+                return max(start, self.store.total - len(self.store))
+            start = total
+        return None
+
+    def tier_for_span(self, span):
+        """The finest tier that still covers `span` seconds: None for raw points, else an AggregateTier."""
+        if span <= self.raw_keep_seconds:
+            return None
+        for tier in self.aggregates:
+            if span <= tier.keep_seconds:
+                return tier
+        return self.aggregates[-1] if self.aggregates else None
+
+    def reset(self):
+        self._batches.clear()
+        for tier in self.aggregates:
+            tier.clear()
@@ -0,0 +1,95 @@
+import io
+import json
+import os
+from typing import Callable, NamedTuple
+
+import yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec(NamedTuple):
+    name: str
+    dumps: Callable  # object -> bytes
+    loads: Callable  # bytes or str -> object
+
+
+def _json_dumps(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+# orjson rejects the NaN/Infinity tokens stdlib json writes for non-finite floats; those
+# documents (and genuinely invalid ones, so callers see json.JSONDecodeError) go to stdlib
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+# Every JSON backend that is installed. The stdlib one is always there and is the only one
+# that writes non-finite floats (as NaN/Infinity); orjson writes them as null.
+STDLIB_JSON = Codec("json", _json_dumps, json.loads)
+JSON_CODECS = {"json": STDLIB_JSON}
+if orjson is not None:
+    JSON_CODECS["orjson"] = Codec("orjson", orjson.dumps, _orjson_loads)
+
+
+# The fastest installed backend, unless SERIALIZER_JSON names another one
+def _choose_json_codec(requested):
+    if not requested:
+        return JSON_CODECS.get("orjson", STDLIB_JSON)
+    if requested not in JSON_CODECS:
+        raise ValueError(f"SERIALIZER_JSON={requested!r} is not an installed JSON backend "
+                         f"(installed: {', '.join(JSON_CODECS)})")
+    return JSON_CODECS[requested]
+
+
+json_codec = _choose_json_codec(os.environ.get("SERIALIZER_JSON", ""))
+
+MSGPACK_CODEC = None
+if msgpack is not None:
+    MSGPACK_CODEC = Codec("msgpack", msgpack.packb, lambda data: msgpack.unpackb(data, raw=False))
+
+
+# First key and value of a msgpack map, or None for an empty map, parsed without unpacking
+# the rest of it: the unpacker only reads the bytes it needs from the front of `data`
+def msgpack_first_entry(data):
+    unpacker = msgpack.Unpacker(io.BytesIO(data), raw=False, read_size=64)
+    if unpacker.read_map_header() == 0:
+        return None
+    return unpacker.unpack(), unpacker.unpack()
+
+
+# libyaml's C parser and emitter are an order of magnitude faster than the pure-Python ones;
+# fall back when PyYAML was built without it
+try:
+    from yaml import CSafeDumper as YamlDumper, CSafeLoader as YamlLoader
+    YAML_BACKEND = "libyaml"
+except ImportError:
+    from yaml import SafeDumper as YamlDumper, SafeLoader as YamlLoader
+    YAML_BACKEND = "python"
+
+
+def json_dumps(obj):
+    return json_codec.dumps(obj)
+
+
+def json_loads(data):
+    return json_codec.loads(data)
+
+
+def yaml_dump(obj, stream=None, **kwargs):
+    return yaml.dump(obj, stream, Dumper=YamlDumper, **kwargs)
+
+
+def yaml_load(stream):
+    return yaml.load(stream, Loader=YamlLoader)
@@ -1,22 +1,353 @@
-import socket
-import time
+import argparse
+import asyncio
 import random
-import json
+import time
+from collections import deque
+
+import numpy as np
+
+from loader import iter_dataset_batches
+from loadgen import DISTRIBUTIONS, stress_batches, stress_schedule
+from protocol import (DEFAULT_CHANNEL, FORMAT_JSON, FRAME_HEADER, MAX_FRAME_SIZE, SEQUENCE_REPLAYED, Hello,
+                      ProtocolError, decode_hello, encode_frame, encode_hello_reply, encode_points, encode_sequenced)
+from shm_ring import HEARTBEAT_INTERVAL, SharedPointRing, local_ring_name
 
 HOST = '127.0.0.1'  # Localhost
 PORT = 65432        # Port to listen on
 
-# Create a socket and bind to the host/port
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-    server_socket.bind((HOST, PORT))
-    server_socket.listen()  # Start listening for connections
-    print(f"Server listening on {HOST}:{PORT}")
+BATCH_SIZE = 10       # Points per batch
+BATCH_INTERVAL = 1.0  # Seconds between batches
+HELLO_TIMEOUT = 1.0   # Seconds to wait for a client to choose a wire format
+
+# Frames buffered per client before the slow-client policy kicks in
+SEND_QUEUE_SIZE = 64
+
+# What to do with a client whose send queue is full:
+#   "drop"       - discard its oldest queued batch so it stays on the freshest data
+#   "disconnect" - close the connection
+SLOW_CLIENT_POLICIES = ("drop", "disconnect")
+
+# Recent batches kept so reconnecting clients can be sent the ones they missed; whichever
+# limit is reached first evicts the oldest batch. 2M points is about 32 MB of readings.
+REPLAY_BUFFER_BATCHES = 4096
+REPLAY_BUFFER_POINTS = 2_000_000
+
+# Seconds after the last sequenced client leaves that batches are still kept for it to resume.
+# With no sequenced client connected and no window open, nothing is kept.
+REPLAY_WINDOW = 60.0
+
+# Points in the shared-memory ring published for clients on this host (--shm)
+LOCAL_RING_CAPACITY = 4_000_000
+
+rng = np.random.default_rng()
+
+# Generate a batch of random battery voltage / temperature readings
+def generate_batch(size=BATCH_SIZE):
+    return rng.uniform(0, 5, size), rng.uniform(-20, 80, size)
+
+# Endless stream of random batches, the default source
+def random_batches(batch_size=BATCH_SIZE):
+    while True:
+        yield generate_batch(batch_size)
+
+# Stream a recorded export or recording from disk, optionally starting over at the end
+def replay_batches(path, batch_size=BATCH_SIZE, loop=False):
+    while True:
+        replayed = False
+        for batch in iter_dataset_batches(path, batch_size):
+            replayed = True
+            yield batch
+        if not (loop and replayed):
+            return
+
+# Read the client's hello frame and answer it. Clients that send nothing get unsequenced JSON
+# and no answer; an invalid or unsupported hello is refused, and None returned.
+async def negotiate_format(reader, writer):
+    try:
+        header = await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), HELLO_TIMEOUT)
+        (length,) = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise ProtocolError(f"Hello frame of {length} bytes is too large")
+        payload = await asyncio.wait_for(reader.readexactly(length), HELLO_TIMEOUT)
+        hello = decode_hello(payload)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return Hello(FORMAT_JSON)
+    except ProtocolError as e:
+        print(f"Refusing invalid hello from {writer.get_extra_info('peername')}: {e}")
+        writer.write(encode_hello_reply(error=str(e)))
+        return None
+    writer.write(encode_hello_reply(hello.wire_format))
+    return hello
+
+
+class Subscriber:
+    """A connected client with its own bounded queue of encoded frames."""
+
+    def __init__(self, writer, wire_format, sequenced=False, queue_size=SEND_QUEUE_SIZE):
+        self.writer = writer
+        self.wire_format = wire_format
+        self.sequenced = sequenced
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.peer = writer.get_extra_info("peername")
+        self.dropped = 0
+
+    # Queue a frame without blocking; returns False if the queue is full
+    def offer(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
 
-    conn, addr = server_socket.accept()  # Accept a connection
-    with conn:
-        print(f"Connected by {addr}")
+    # Make room by discarding the oldest frame, then queue the new one
+    def replace_oldest(self, frame):
+        try:
+            self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    # Discard everything queued and close the connection. Aborting the transport releases a
+    # sender stuck in drain() on a stalled client; the sentinel wakes one idle in queue.get()
+    def evict(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(None)
+        self.writer.transport.abort()
+
+
+class BroadcastServer:
+    """Generates each batch once and fans the encoded frames out to every client.
+
+    `source` is any iterable of (xs, ys) batches; it is only advanced while at
+    least one client is connected. An interval of 0 sends as fast as possible.
+    With more than one channel, consecutive batches are tagged with channel
+    IDs 0..channels-1 in turn, as if each came from a different battery pack.
+    Given a SharedPointRing as `local_ring`, every batch is also written to
+    it for clients on the same host, which read the points straight from
+    shared memory instead of over TCP; run() also keeps the ring's
+    heartbeat going so they can tell a slow server from a dead one.
+
+    Clients that ask for a sequenced stream get every batch prefixed with a
+    sequence number and timestamp. The last `replay_size` batches (and at
+    most `replay_points` points) are kept, so a client that reconnects with
+    the last sequence number it saw is first sent the batches it missed,
+    then the live stream. Batches are only kept while a sequenced client is
+    connected or one left less than `replay_window` seconds ago.
+    """
+
+    def __init__(self, host=HOST, port=PORT, source=None, interval=BATCH_INTERVAL,
+                 queue_size=SEND_QUEUE_SIZE, slow_client_policy="drop", channels=1, local_ring=None,
+                 replay_size=REPLAY_BUFFER_BATCHES, replay_points=REPLAY_BUFFER_POINTS,
+                 replay_window=REPLAY_WINDOW):
+        if slow_client_policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {slow_client_policy}")
+        self.host = host
+        self.port = port
+        self.source = source if source is not None else random_batches()
+        self.interval = interval
+        self.queue_size = queue_size
+        self.slow_client_policy = slow_client_policy
+        self.channels = channels
+        self.local_ring = local_ring
+        self.subscribers = set()
+        self.stream = random.randint(1, 0xFFFFFFFF)  # Tells reconnecting clients whether this is the same run
+        self.sequence = 0  # Sequence number of the latest batch
+        self.replay_buffer = deque()  # (sequence, timestamp, xs, ys, channel)
+        self.replay_size = replay_size
+        self.replay_points_limit = replay_points
+        self.replay_points = 0  # Points held in the replay buffer
+        self.replay_window = replay_window
+        self.sequenced_clients = 0
+        self.replay_open_until = 0.0  # time.monotonic() until which batches are kept with no sequenced client
+
+    async def handle_client(self, reader, writer):
+        hello = await negotiate_format(reader, writer)
+        if hello is None:
+            try:
+                await writer.drain()
+            except (ConnectionError, OSError):
+                pass
+            writer.close()
+            return
+        subscriber = Subscriber(writer, hello.wire_format, hello.sequenced, self.queue_size)
+        # The missed batches are picked and the client joins with no await in between, so live
+        # batches queue up behind the replay, in order, under the usual slow-client policy
+        missed = self.missed_batches(hello) if hello.sequenced else []
+        self.subscribers.add(subscriber)
+        self.sequenced_clients += hello.sequenced
+        print(f"Connected by {subscriber.peer} using {hello.wire_format} format"
+              f"{f', replaying {len(missed)} missed batches' if missed else ''} ({len(self.subscribers)} clients)")
+        try:
+            for batch in missed:
+                if writer.is_closing():  # Evicted mid-replay
+                    break
+                writer.write(self.encode_batch(subscriber, batch, SEQUENCE_REPLAYED))
+                await writer.drain()
+            while True:
+                frame = await subscriber.queue.get()
+                if frame is None:  # Sentinel queued when the client is evicted
+                    break
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f"Client {subscriber.peer} went away: {e}")
+        finally:
+            self.subscribers.discard(subscriber)
+            if hello.sequenced:
+                self.sequenced_clients -= 1
+                self.replay_open_until = time.monotonic() + self.replay_window  # Time for it to come back
+            writer.close()
+            print(f"Disconnected {subscriber.peer} (dropped {subscriber.dropped} batches, "
+                  f"{len(self.subscribers)} clients left)")
+
+    def encode_batch(self, subscriber, batch, flags=0):
+        sequence, timestamp, xs, ys, channel = batch
+        payload = encode_points(xs, ys, subscriber.wire_format, channel)
+        if subscriber.sequenced:
+            payload = encode_sequenced(self.stream, sequence, timestamp, payload, flags)
+        return encode_frame(payload)
+
+    # The buffered batches after a reconnecting client's resume point
+    def missed_batches(self, hello):
+        if hello.stream != self.stream:
+            return []  # A fresh client, or one from before a restart: start it on the live stream
+        return [batch for batch in self.replay_buffer if batch[0] > hello.resume_after]
+
+    # Keep a batch for replay while anyone could ask for it, within the buffer's limits
+    def record(self, batch):
+        if not self.sequenced_clients and time.monotonic() > self.replay_open_until:
+            self.replay_buffer.clear()
+            self.replay_points = 0
+            return
+        self.replay_buffer.append(batch)
+        self.replay_points += len(batch[2])
+        while self.replay_buffer and (len(self.replay_buffer) > self.replay_size
+                                      or self.replay_points > self.replay_points_limit):
+            self.replay_points -= len(self.replay_buffer.popleft()[2])
+
+    # Encode a batch once per wire format in use and queue it for every client
+    def broadcast(self, xs, ys, channel=None):
+        if self.local_ring is not None:
+            self.local_ring.write(xs, ys, DEFAULT_CHANNEL if channel is None else channel)
+        self.sequence += 1
+        batch = (self.sequence, time.time(), xs, ys, channel)
+        self.record(batch)
+        frames = {}
+        for subscriber in list(self.subscribers):
+            key = (subscriber.wire_format, subscriber.sequenced)
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = self.encode_batch(subscriber, batch)
+            if subscriber.offer(frame):
+                continue
+            if self.slow_client_policy == "drop":
+                subscriber.replace_oldest(frame)
+            else:
+                print(f"Disconnecting slow client {subscriber.peer}")
+                self.subscribers.discard(subscriber)
+                subscriber.evict()
+
+    async def produce(self):
+        loop = asyncio.get_running_loop()
+        batches = iter(self.source)
+        next_send = loop.time()
+        sent = 0
+        while True:
+            if not (self.subscribers or (self.local_ring is not None and self.local_ring.has_readers())):
+                # Hold the source (and the replay position) until someone is listening
+                await asyncio.sleep(0.1)
+                next_send = loop.time()
+                continue
+            batch = next(batches, None)
+            if batch is None:
+                print("Source exhausted; no more batches to send.")
+                return
+            if len(batch[0]):
+                # Single-channel servers send untagged batches, which every client understands
+                self.broadcast(*batch, sent % self.channels if self.channels > 1 else None)
+                sent += 1
+            # Schedule against a fixed clock so encoding time does not drift the rate
+            next_send += self.interval
+            await asyncio.sleep(max(0.0, next_send - loop.time()))
+
+    # Stamp the local ring for as long as the server runs, including between slow or no batches
+    async def heartbeat(self):
         while True:
-            # Generate random live data
-            data = [{"x": random.uniform(0, 5), "y": random.uniform(-20, 80)} for _ in range(10)]
-            conn.sendall(json.dumps(data).encode('utf-8'))  # Send data as JSON
-            time.sleep(1)  # Wait before sending the next batch
+            self.local_ring.beat()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def run(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"Server listening on {self.host}:{self.port}")
+        tasks = [server.serve_forever(), self.produce()]
+        if self.local_ring is not None:
+            tasks.append(self.heartbeat())
+        async with server:
+            await asyncio.gather(*tasks)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stream live battery data to any number of clients.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-size", type=int, help=f"points per batch (default {BATCH_SIZE})")
+    parser.add_argument("--interval", type=float, default=BATCH_INTERVAL, help="seconds between batches")
+    parser.add_argument("--queue-size", type=int, default=SEND_QUEUE_SIZE,
+                        help="frames buffered per client before the slow-client policy applies")
+    parser.add_argument("--slow-client-policy", choices=SLOW_CLIENT_POLICIES, default="drop")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay a recorded export (.json/.yaml) or recording (.ptrec) instead of random data")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed relative to --interval; 0 sends as fast as possible")
+    parser.add_argument("--loop", action="store_true", help="restart the replay when the file ends")
+    parser.add_argument("--rate", type=float,
+                        help="stress mode: generate this many points per second with NumPy "
+                             "(batch size defaults to rate/100 unless --batch-size is given)")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform",
+                        help="stress mode readings: uniform, slowly drifting sensor curves, or bursts")
+    parser.add_argument("--channels", type=int, default=1,
+                        help="tag batches round-robin with this many channel IDs (one per battery pack)")
+    parser.add_argument("--replay-buffer", type=int, default=REPLAY_BUFFER_BATCHES,
+                        help="recent batches kept for clients that reconnect")
+    parser.add_argument("--replay-points", type=int, default=REPLAY_BUFFER_POINTS,
+                        help="most points the replay buffer holds, however few batches that is")
+    parser.add_argument("--replay-window", type=float, default=REPLAY_WINDOW,
+                        help="seconds batches are kept for a sequenced client to reconnect after it leaves")
+    parser.add_argument("--shm", action="store_true",
+                        help="also publish batches in a shared-memory ring for clients on this host")
+    parser.add_argument("--shm-capacity", type=int, default=LOCAL_RING_CAPACITY,
+                        help="points the shared-memory ring holds before slow local clients lose data")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.rate:
+        batch_size, interval = stress_schedule(args.rate, args.batch_size)
+        source = stress_batches(batch_size, args.distribution)
+        print(f"Stress mode: {args.rate:,.0f} points/s as {args.distribution} batches of {batch_size}")
+    elif args.replay:
+        args.batch_size = args.batch_size or BATCH_SIZE
+        source = replay_batches(args.replay, args.batch_size, args.loop)
+        interval = args.interval / args.speed if args.speed > 0 else 0.0
+        print(f"Replaying {args.replay} in batches of {args.batch_size} "
+              f"({f'{args.speed}x' if args.speed > 0 else 'as fast as possible'})")
+    else:
+        source = random_batches(args.batch_size or BATCH_SIZE)
+        interval = args.interval
+    local_ring = None
+    if args.shm:
+        local_ring = SharedPointRing.create_replacing(args.shm_capacity, local_ring_name(args.port))
+        print(f"Publishing to shared-memory ring {local_ring.name} ({args.shm_capacity:,} points)")
+    server = BroadcastServer(args.host, args.port, source, interval, args.queue_size,
+                             args.slow_client_policy, args.channels, local_ring, args.replay_buffer,
+                             args.replay_points, args.replay_window)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("Server stopped.")
+    finally:
+        if local_ring is not None:
+            local_ring.close()
@@ -0,0 +1,211 @@
+import multiprocessing
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Header words (uint64) at the start of the segment
+RING_MAGIC = 0x50545249_4E470004  # "PTRING" + layout version 4
+_MAGIC, _CAPACITY, _TOTAL, _CLOSED, _READ_AT, _WRITE_BEGIN, _HEARTBEAT = 0, 1, 2, 3, 4, 5, 6
+HEADER_WORDS = 8  # Room for later fields; keeps the columns 64-byte aligned
+HEADER_BYTES = HEADER_WORDS * 8
+
+# Each point is an x and a y float64 plus the uint16 channel its batch was tagged with
+POINT_BYTES = 8 + 8 + 2
+
+# Seconds since its last read after which a RingReader no longer counts as attached
+READER_TIMEOUT = 2.0
+
+# Seconds between the heartbeats a live writer stamps in the header, whether or not it has
+# points to write
+HEARTBEAT_INTERVAL = 0.5
+
+# Seconds without a heartbeat after which a RingReader takes the writer for dead. A crashed
+# owner never flags its ring closed, so this is how readers notice it went away.
+WRITER_TIMEOUT = 5.0
+
+
+# Name of the ring a server publishes next to its TCP port, so local clients can find it
+def local_ring_name(port):
+    return f"ptserver-{port}"
+
+
+class SharedPointRing:
+    """Single-writer ring buffer of (x, y, channel) points in a shared-memory segment.
+
+    The header holds a monotonically increasing count of points ever
+    written, which doubles as the sequence counter, and works as a
+    sequence lock: before touching the columns the writer announces the
+    total it is about to reach (the write-begin word), and only after
+    they are filled does it publish that total. A reader that sees total
+    N can copy every point up to N; once the copy is done it reads the
+    write-begin word, and any slot a write announced by then may have
+    reused is dropped. So if the writer laps a reader, even in the middle
+    of its copy, the overwritten points are reported as lost instead of
+    returned torn.
+
+    Besides writing, the owner calls beat() every HEARTBEAT_INTERVAL
+    while it is alive, so readers can tell a quiet writer from a dead one.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.name = shm.name
+        self._owner = owner
+        self._header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if self._header[_MAGIC] != RING_MAGIC:
+            raise ValueError(f"Shared memory segment {shm.name} is not a point ring")
+        self.capacity = int(self._header[_CAPACITY])
+        self._x = np.ndarray((self.capacity,), dtype=np.float64, buffer=shm.buf, offset=HEADER_BYTES)
+        self._y = np.ndarray((self.capacity,), dtype=np.float64, buffer=shm.buf,
+                             offset=HEADER_BYTES + 8 * self.capacity)
+        self._channel = np.ndarray((self.capacity,), dtype=np.uint16, buffer=shm.buf,
+                                   offset=HEADER_BYTES + 16 * self.capacity)
+
+    @classmethod
+    def create(cls, capacity, name=None):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_BYTES + POINT_BYTES * capacity)
+        header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY] = capacity
+        header[_MAGIC] = RING_MAGIC
+        del header
+        ring = cls(shm, owner=True)
+        ring.beat()
+        return ring
+
+    @classmethod
+    def create_replacing(cls, capacity, name):
+        """Create a named ring, first unlinking one a crashed owner left behind."""
+        try:
+            return cls.create(capacity, name)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            return cls.create(capacity, name)
+
+    @classmethod
+    def attach(cls, name):
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the creating process may unlink the segment, so an unrelated process must stop
+        # its resource tracker from doing it at exit. Children started by multiprocessing
+        # share their parent's tracker, whose registration belongs to the creator.
+        if multiprocessing.parent_process() is None:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def total(self):
+        return int(self._header[_TOTAL])
+
+    def write(self, xs, ys, channel=0):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        n = len(xs)
+        if n == 0:
+            return
+        total = self.total
+        if n > self.capacity:
+            # Points that would be overwritten within this same write are skipped
+            total += n - self.capacity
+            xs, ys = xs[-self.capacity:], ys[-self.capacity:]
+            n = self.capacity
+        # Announce the slots about to be reused before touching them
+        self._header[_WRITE_BEGIN] = total + n
+        start = total % self.capacity
+        first = min(n, self.capacity - start)
+        self._x[start:start + first] = xs[:first]
+        self._y[start:start + first] = ys[:first]
+        self._channel[start:start + first] = channel
+        self._x[:n - first] = xs[first:]
+        self._y[:n - first] = ys[first:]
+        self._channel[:n - first] = channel
+        # Publish only after the columns are written
+        self._header[_TOTAL] = total + n
+        self.beat()
+
+    @property
+    def closed(self):
+        return bool(self._header[_CLOSED])
+
+    # Readers stamp the header so the writer can tell whether anyone is following the ring
+    def mark_read(self):
+        self._header[_READ_AT] = int(time.time() * 1000)
+
+    def has_readers(self, timeout=READER_TIMEOUT):
+        return time.time() * 1000 - int(self._header[_READ_AT]) < timeout * 1000
+
+    # The writer stamps the header the same way, so readers can tell it is still running
+    def beat(self):
+        self._header[_HEARTBEAT] = int(time.time() * 1000)
+
+    def writer_alive(self, timeout=WRITER_TIMEOUT):
+        return time.time() * 1000 - int(self._header[_HEARTBEAT]) < timeout * 1000
+
+    def read_since(self, sequence):
+        """Return (xs, ys, channels, new_sequence, lost) for points written after `sequence`."""
+        end = self.total
+        start = max(sequence, end - self.capacity)
+        n = end - start
+        if n <= 0:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty, np.empty(0, dtype=np.uint16), end, 0
+        first_index = start % self.capacity
+        first = min(n, self.capacity - first_index)
+        xs = np.concatenate((self._x[first_index:first_index + first], self._x[:n - first]))
+        ys = np.concatenate((self._y[first_index:first_index + first], self._y[:n - first]))
+        channels = np.concatenate((self._channel[first_index:first_index + first], self._channel[:n - first]))
+        # A write announced by now may have reused slots we copied, even one still in
+        # progress, so anything up to its end minus a lap is unreliable; drop it
+        overwritten = max(0, int(self._header[_WRITE_BEGIN]) - self.capacity - start)
+        if overwritten:
+            xs, ys, channels = xs[overwritten:], ys[overwritten:], channels[overwritten:]
+        lost = (start - sequence) + min(overwritten, n)
+        return xs, ys, channels, end, lost
+
+    def close(self):
+        if self._owner:
+            self._header[_CLOSED] = 1  # Readers still mapping the segment stop following it
+        self._header = self._x = self._y = self._channel = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """Follows a ring another process publishes, such as a server's local transport.
+
+    Reading starts at the ring's current total, so like a new TCP
+    connection it only sees batches written after it attached. Each read
+    copies just the new points straight out of shared memory, under the
+    ring's sequence lock: a reader that falls more than a lap behind, say
+    because its render loop stalled on a file dialog, loses the points
+    the writer reused but never sees torn ones.
+
+    The ring counts as closed once its owner flags it so, or when the
+    owner's heartbeat is more than `writer_timeout` seconds old, which is
+    how a writer that crashed without closing is noticed. A writer that is
+    merely slow, say one batch every ten seconds, keeps beating meanwhile.
+    """
+
+    def __init__(self, name, writer_timeout=WRITER_TIMEOUT):
+        self.ring = SharedPointRing.attach(name)
+        self.sequence = self.ring.total
+        self.lost = 0  # Points the writer overwrote before they could be read
+        self.writer_timeout = writer_timeout
+        self.ring.mark_read()
+
+    @property
+    def closed(self):
+        return self.ring.closed or not self.ring.writer_alive(self.writer_timeout)
+
+    # Points (and their channels) written since the previous call
+    def read_new(self):
+        self.ring.mark_read()
+        xs, ys, channels, self.sequence, lost = self.ring.read_since(self.sequence)
+        self.lost += lost
+        return xs, ys, channels
+
+    def close(self):
+        self.ring.close()
@@ -0,0 +1,162 @@
+from collections import deque
+
+import numpy as np
+
+# Cells per axis of the uniform grid; points outside the limits are kept in the edge cells
+GRID_CELLS = 256
+
+# Points per chunk; the tail is sorted by cell into a chunk each time it fills up
+CHUNK_POINTS = 65_536
+
+
+class _Chunk:
+    """A full chunk of points sorted by grid cell, with each point's store sequence number."""
+
+    __slots__ = ("cells", "xs", "ys", "seqs", "first_seq", "last_seq")
+
+    def __init__(self, cells, xs, ys, seqs):
+        order = np.argsort(cells, kind="stable")
+        self.cells = cells[order]
+        self.xs = xs[order]
+        self.ys = ys[order]
+        self.seqs = seqs[order]
+        self.first_seq = int(seqs[0])
+        self.last_seq = int(seqs[-1])
+
+
+# Concatenation of arange(lo[i], hi[i]) for every i, without a Python loop
+def _ranges(lo, hi):
+    lengths = hi - lo
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(lo - offsets, lengths) + np.arange(total)
+
+
+# Ray-casting point-in-polygon test, vectorized over the points
+def points_in_polygon(xs, ys, px, py):
+    inside = np.zeros(len(xs), dtype=bool)
+    j = len(px) - 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(len(px)):
+            crosses = (py[i] > ys) != (py[j] > ys)
+            inside ^= crosses & (xs < (px[j] - px[i]) * (ys - py[i]) / (py[j] - py[i]) + px[i])
+            j = i
+    return inside
+
+
+class SpatialIndex:
+    """Uniform-grid index over a PointStore for box, lasso and nearest-point queries.
+
+    New points go to an unsorted tail, which is sorted by cell into an
+    immutable chunk each time it reaches CHUNK_POINTS, so keeping up costs
+    O(batch) plus one small sort per chunk. A box query binary-searches
+    every chunk for the cell runs of each grid row it covers and filters
+    only those candidates exactly. Points are tagged with their store
+    sequence number, so ones the store has overwritten are dropped at
+    query time and whole chunks are forgotten once they all are.
+    """
+
+    def __init__(self, x_limits, y_limits, cells=GRID_CELLS, chunk_points=CHUNK_POINTS):
+        self.x_limits = tuple(x_limits)
+        self.y_limits = tuple(y_limits)
+        self.cells = cells
+        self.chunk_points = chunk_points
+        self.total = 0   # store.total already indexed
+        self.oldest = 0  # Sequence number of the oldest point still in the store
+        self._chunks = deque()
+        self._tail = []  # (xs, ys, seqs) batches not yet sorted into a chunk
+        self._tail_size = 0
+
+    def _cell_coords(self, xs, ys):
+        x_min, x_max = self.x_limits
+        y_min, y_max = self.y_limits
+        cx = np.floor((np.asarray(xs) - x_min) * (self.cells / (x_max - x_min))).astype(np.int64)
+        cy = np.floor((np.asarray(ys) - y_min) * (self.cells / (y_max - y_min))).astype(np.int64)
+        return np.clip(cx, 0, self.cells - 1), np.clip(cy, 0, self.cells - 1)
+
+    def _tail_columns(self):
+        if len(self._tail) > 1:
+            self._tail = [tuple(np.concatenate(column) for column in zip(*self._tail))]
+        if self._tail:
+            return self._tail[0]
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.int64)
+
+    def update(self, store):
+        """Index the points appended to `store` since the previous update."""
+        xs, ys, total = store.read_since(self.total)
+        self.oldest = total - len(store)
+        self.total = total
+        if len(xs):
+            self._tail.append((xs, ys, np.arange(total - len(xs), total, dtype=np.int64)))
+            self._tail_size += len(xs)
+        if self._tail_size >= self.chunk_points:
+            xs, ys, seqs = self._tail_columns()
+            full = len(xs) - len(xs) % self.chunk_points
+            for start in range(0, full, self.chunk_points):
+                end = start + self.chunk_points
+                cx, cy = self._cell_coords(xs[start:end], ys[start:end])
+                self._chunks.append(_Chunk(cy * self.cells + cx, xs[start:end], ys[start:end], seqs[start:end]))
+            self._tail = [(xs[full:], ys[full:], seqs[full:])] if full < len(xs) else []
+            self._tail_size = len(xs) - full
+        while self._chunks and self._chunks[0].last_seq < self.oldest:
+            self._chunks.popleft()
+
+    def query_box(self, x_range, y_range):
+        """Return the x and y columns of the points inside the box (bounds included)."""
+        x0, x1 = sorted(x_range)
+        y0, y1 = sorted(y_range)
+        (cx0, cx1), (cy0, cy1) = self._cell_coords([x0, x1], [y0, y1])
+        rows = np.arange(cy0, cy1 + 1) * self.cells
+        first_cells, end_cells = rows + cx0, rows + cx1 + 1
+        tail_xs, tail_ys, tail_seqs = self._tail_columns()
+        if len(tail_seqs) and tail_seqs[0] < self.oldest:
+            current = tail_seqs >= self.oldest
+            tail_xs, tail_ys = tail_xs[current], tail_ys[current]
+        parts = [(tail_xs, tail_ys)]
+        for chunk in self._chunks:
+            picked = _ranges(np.searchsorted(chunk.cells, first_cells), np.searchsorted(chunk.cells, end_cells))
+            if chunk.first_seq < self.oldest:
+                # Partly overwritten by the store; only the oldest chunk can be
+                picked = picked[chunk.seqs[picked] >= self.oldest]
+            if len(picked):
+                parts.append((chunk.xs[picked], chunk.ys[picked]))
+        xs = np.concatenate([part[0] for part in parts])
+        ys = np.concatenate([part[1] for part in parts])
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        return xs[inside], ys[inside]
+
+    def query_polygon(self, px, py):
+        """Return the points inside the polygon with vertices (px[i], py[i])."""
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        xs, ys = self.query_box((px.min(), px.max()), (py.min(), py.max()))
+        inside = points_in_polygon(xs, ys, px, py)
+        return xs[inside], ys[inside]
+
+    def nearest(self, x, y, max_distance=1.0):
+        """Return (x, y, distance) of the point closest to (x, y), or None.
+
+        Distances are measured in fractions of the axis ranges, so they
+        match what the user sees on the plot; nothing farther away than
+        `max_distance` is returned.
+        """
+        x_span = self.x_limits[1] - self.x_limits[0]
+        y_span = self.y_limits[1] - self.y_limits[0]
+        radius = 1.0 / self.cells
+        while True:
+            # Every point within `radius` lies in this box, so a hit that close is the nearest one
+            xs, ys = self.query_box((x - radius * x_span, x + radius * x_span),
+                                    (y - radius * y_span, y + radius * y_span))
+            if len(xs):
+                distances = np.hypot((xs - x) / x_span, (ys - y) / y_span)
+                best = int(np.argmin(distances))
+                if distances[best] <= radius or radius >= max_distance:
+                    if distances[best] > max_distance:
+                        return None
+                    return float(xs[best]), float(ys[best]), float(distances[best])
+            elif radius >= max_distance:
+                return None
+            radius = min(radius * 2, max_distance)
@@ -0,0 +1,160 @@
+from collections import deque
+
+import numpy as np
+
+HISTOGRAM_BINS = 50
+
+# Sliding window length in points, kept as whole blocks so old data is retired a block at a time
+WINDOW_POINTS = 100_000
+BLOCK_POINTS = 1_000
+
+
+class ColumnSummary:
+    """Count, mean, variance (Welford M2), min and max of one column.
+
+    Batches are folded in with the parallel form of Welford's update
+    (Chan et al.), so each batch costs one vectorized pass over its own
+    points and the history is never revisited.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        if len(values):
+            batch = ColumnSummary()
+            batch.count = len(values)
+            batch.mean = float(values.mean())
+            batch.m2 = float(((values - batch.mean) ** 2).sum())
+            batch.min = float(values.min())
+            batch.max = float(values.max())
+            self.merge(batch)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+
+class FixedHistogram:
+    """Counts over fixed, equal-width bins; values outside the range go to under/over."""
+
+    def __init__(self, low, high, bins=HISTOGRAM_BINS):
+        self.low = low
+        self.high = high
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.under = 0
+        self.over = 0
+
+    def bin_indices(self, values):
+        return np.floor((values - self.low) * (self.bins / (self.high - self.low))).astype(np.int64)
+
+    def add(self, values):
+        indices = self.bin_indices(values)
+        inside = (indices >= 0) & (indices < self.bins)
+        self.counts += np.bincount(indices[inside], minlength=self.bins)
+        self.under += int((indices < 0).sum())
+        self.over += int((indices >= self.bins).sum())
+
+    def edges(self):
+        return np.linspace(self.low, self.high, self.bins + 1)
+
+    def centers(self):
+        edges = self.edges()
+        return (edges[:-1] + edges[1:]) / 2
+
+
+class _Block:
+    """Summaries of one block of consecutive points in the sliding window."""
+
+    def __init__(self, x_range, y_range, bins):
+        self.count = 0
+        self.x = ColumnSummary()
+        self.y = ColumnSummary()
+        self.x_hist = FixedHistogram(*x_range, bins)
+        self.y_hist = FixedHistogram(*y_range, bins)
+
+    def add(self, xs, ys):
+        self.count += len(xs)
+        self.x.add(xs)
+        self.y.add(ys)
+        self.x_hist.add(xs)
+        self.y_hist.add(ys)
+
+
+class StreamStats:
+    """Session-wide and sliding-window statistics over a stream of (x, y) batches.
+
+    Adding a batch costs O(batch). The window is a deque of fixed-size
+    blocks, so reading it merges O(window / block) summaries and never
+    touches individual points.
+    """
+
+    def __init__(self, x_range, y_range, bins=HISTOGRAM_BINS,
+                 window_points=WINDOW_POINTS, block_points=BLOCK_POINTS):
+        self.x_range = x_range
+        self.y_range = y_range
+        self.bins = bins
+        self.block_points = block_points
+        self.max_blocks = max(1, window_points // block_points)
+        self.session = _Block(x_range, y_range, bins)
+        self._blocks = deque()
+        self._current = _Block(x_range, y_range, bins)
+
+    def add(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        self.session.add(xs, ys)
+        # Points older than a full window would be retired before anyone reads them
+        keep = (self.max_blocks + 1) * self.block_points
+        if len(xs) > keep:
+            xs, ys = xs[-keep:], ys[-keep:]
+        start = 0
+        while start < len(xs):
+            end = min(len(xs), start + self.block_points - self._current.count)
+            self._current.add(xs[start:end], ys[start:end])
+            start = end
+            if self._current.count == self.block_points:
+                self._blocks.append(self._current)
+                if len(self._blocks) > self.max_blocks:
+                    self._blocks.popleft()
+                self._current = _Block(self.x_range, self.y_range, self.bins)
+
+    def window(self):
+        """Merge the blocks in the window (plus the partial one) into a single summary."""
+        merged = _Block(self.x_range, self.y_range, self.bins)
+        for block in list(self._blocks) + [self._current]:
+            merged.count += block.count
+            merged.x.merge(block.x)
+            merged.y.merge(block.y)
+            for merged_hist, block_hist in ((merged.x_hist, block.x_hist), (merged.y_hist, block.y_hist)):
+                merged_hist.counts += block_hist.counts
+                merged_hist.under += block_hist.under
+                merged_hist.over += block_hist.over
+        return merged
+
+    def reset(self):
+        self.session = _Block(self.x_range, self.y_range, self.bins)
+        self._blocks.clear()
+        self._current = _Block(self.x_range, self.y_range, self.bins)
@@ -0,0 +1,50 @@
+import argparse
+import os
+import shutil
+
+import pytest
+
+from convert import run_convert, run_merge
+
+DATA = os.path.join(os.path.dirname(__file__), os.pardir, "data", "test1.json")
+
+
+def convert_args(*inputs, force=False, output_dir=None):
+    return argparse.Namespace(inputs=[str(source) for source in inputs], to="csv", output_dir=output_dir,
+                              force=force, compact=False, jobs=1)
+
+
+@pytest.fixture
+def source(tmp_path):
+    return shutil.copy(DATA, tmp_path / "export.json")
+
+
+def test_output_this_tool_did_not_write_is_kept(tmp_path, source, capsys):
+    output = tmp_path / "export.csv"
+    output.write_text("someone else's file\n")
+    assert run_convert(convert_args(source)) == 1
+    assert output.read_text() == "someone else's file\n"
+    assert "use --force" in capsys.readouterr().out
+
+    assert run_convert(convert_args(source, force=True)) == 0
+    assert output.read_text() != "someone else's file\n"
+    assert run_convert(convert_args(source)) == 0  # Now in the manifest, and up to date
+    assert "fresh" in capsys.readouterr().out
+
+
+def test_output_converted_from_another_source_is_kept(tmp_path, source, capsys):
+    assert run_convert(convert_args(source)) == 0
+    other = tmp_path / "other"
+    other.mkdir()
+    written = (tmp_path / "export.csv").read_text()
+    assert run_convert(convert_args(shutil.copy(source, other), output_dir=str(tmp_path))) == 1
+    assert (tmp_path / "export.csv").read_text() == written
+    assert "was converted from" in capsys.readouterr().out
+
+
+def test_merge_keeps_an_output_this_tool_did_not_write(tmp_path, source):
+    output = tmp_path / "merged.csv"
+    output.write_text("someone else's file\n")
+    args = argparse.Namespace(inputs=[str(source)], output=str(output), force=False, compact=False)
+    assert run_merge(args) == 1
+    assert output.read_text() == "someone else's file\n"
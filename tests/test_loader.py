@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+import loader
+from convert import validate_file
+from loader import DatasetError, iter_dataset_batches, load_dataset
+
+
+def stream(path, batch_size=64):
+    batches = list(iter_dataset_batches(str(path), batch_size))
+    if not batches:
+        return np.empty(0), np.empty(0)
+    return np.concatenate([xs for xs, _ in batches]), np.concatenate([ys for _, ys in batches])
+
+
+def write_export(tmp_path, points, name="export.json", **dump_options):
+    path = tmp_path / name
+    path.write_text(json.dumps({"metadata": {"source": "test"}, "regions": points}, **dump_options))
+    return path
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return [{"x": float(x), "y": float(y)} for x, y in rng.uniform(-50, 50, (300, 2))]
+
+
+@pytest.mark.parametrize("read_size", [7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_streamed_points_match_the_full_load(tmp_path, monkeypatch, points, read_size, indent):
+    monkeypatch.setattr(loader, "STREAM_READ_SIZE", read_size)  # Points straddle block boundaries
+    path = write_export(tmp_path, points, indent=indent)
+    xs, ys = stream(path)
+    full_xs, full_ys, _ = load_dataset(str(path), use_cache=False)
+    assert np.array_equal(xs, full_xs) and np.array_equal(ys, full_ys)
+    assert len(xs) == len(points)
+
+
+def test_points_in_any_key_order_and_lookalikes_in_metadata(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps({
+        "metadata": {"x": 100, "y": 200, "nested": [{"x": 1, "y": 2}]},
+        "regions": [{"y": 2.5, "x": 1}, {"x": 3, "y": "n/a"}, {"x": 4.0, "y": -1}],
+    }))
+    xs, ys = stream(path)
+    assert xs.tolist() == [1.0, 4.0]
+    assert ys.tolist() == [2.5, -1.0]
+
+
+def test_bare_list_of_points(tmp_path, points):
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps(points[:10]))
+    xs, _ = stream(path)
+    assert len(xs) == 10
+
+
+@pytest.mark.parametrize("cut", [1, 40, 2000, -1])
+def test_truncated_file_is_an_error(tmp_path, monkeypatch, points, cut):
+    monkeypatch.setattr(loader, "STREAM_READ_SIZE", 256)
+    text = write_export(tmp_path, points, indent=4).read_text()
+    path = tmp_path / "truncated.json"
+    path.write_text(text[:cut])
+    with pytest.raises(DatasetError):
+        stream(path)
+    assert validate_file(str(path))["status"] == "failed"
+
+
+@pytest.mark.parametrize("corruption", [
+    lambda text: text.replace('"y"', "'y'", 1),  # Not JSON
+    lambda text: text.replace("},", "}", 1),  # Missing comma between points
+    lambda text: text.replace('"x"', '"z"', 1),  # Not a point
+    lambda text: text.replace('"regions": [', '"regions": 3, "rest": [', 1),
+    lambda text: text + "{}",  # Trailing data
+    lambda text: "",
+])
+def test_corrupt_file_is_an_error(tmp_path, points, corruption):
+    path = tmp_path / "corrupt.json"
+    path.write_text(corruption(write_export(tmp_path, points).read_text()))
+    with pytest.raises(DatasetError):
+        stream(path)
+    assert validate_file(str(path))["status"] == "failed"
@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+
+import pytest
+
+from protocol import (FORMAT_BINARY, FORMAT_JSON, FRAME_HEADER, SEQUENCE_REPLAYED, Hello, ProtocolError,
+                      SequenceTracker, backoff_delays, check_hello_reply, decode_hello, decode_sequenced, encode_hello)
+from server import BroadcastServer, random_batches
+
+
+def hello_payload(frame):
+    (length,) = FRAME_HEADER.unpack_from(frame)
+    return frame[FRAME_HEADER.size:FRAME_HEADER.size + length]
+
+
+def test_hello_round_trip():
+    assert decode_hello(hello_payload(encode_hello(FORMAT_BINARY))) == Hello(FORMAT_BINARY)
+    assert decode_hello(hello_payload(encode_hello(FORMAT_JSON, sequenced=True))) == Hello(FORMAT_JSON, True, 0, 0)
+
+
+def test_hello_carries_resume_point():
+    hello = decode_hello(hello_payload(encode_hello(FORMAT_BINARY, True, stream=1234, resume_after=56)))
+    assert hello == Hello(FORMAT_BINARY, True, 1234, 56)
+
+
+@pytest.mark.parametrize("payload", [
+    b"not json",
+    b'{"resume": {"stream": 1, "after": 2}}',
+    b'{"format": "carrier-pigeon"}',
+    b'{"format": "json", "resume": {"stream": 1}}',
+    b'{"format": "json", "resume": {"stream": -1, "after": 2}}',
+    b'{"format": "json", "resume": {"stream": 1, "after": "2"}}',
+])
+def test_malformed_hello_is_rejected(payload):
+    with pytest.raises(ProtocolError):
+        decode_hello(payload)
+
+
+def test_encode_hello_rejects_unknown_format():
+    with pytest.raises(ProtocolError):
+        encode_hello("carrier-pigeon")
+
+
+def test_tracker_accepts_consecutive_batches():
+    tracker = SequenceTracker()
+    assert all(tracker.accept(7, sequence) for sequence in range(1, 6))
+    assert (tracker.last, tracker.gaps, tracker.missed, tracker.restarts) == (5, 0, 0, 0)
+
+
+def test_tracker_joining_mid_stream_is_not_a_gap():
+    tracker = SequenceTracker()
+    assert tracker.accept(7, 500)
+    assert (tracker.gaps, tracker.missed) == (0, 0)
+
+
+def test_tracker_counts_gaps_and_missed_batches():
+    tracker = SequenceTracker()
+    for sequence in (1, 2, 5, 6, 10):
+        assert tracker.accept(7, sequence)
+    assert (tracker.gaps, tracker.missed) == (2, 5)
+
+
+def test_tracker_drops_duplicates_after_a_replay():
+    tracker = SequenceTracker()
+    for sequence in (1, 2, 3):
+        tracker.accept(7, sequence)
+    assert not tracker.accept(7, 2)
+    assert not tracker.accept(7, 3)
+    assert tracker.accept(7, 4)
+    assert (tracker.last, tracker.gaps) == (4, 0)
+
+
+def test_tracker_starts_over_on_a_new_stream():
+    tracker = SequenceTracker()
+    tracker.accept(7, 100)
+    assert tracker.accept(8, 1)
+    assert (tracker.stream, tracker.last, tracker.restarts, tracker.gaps) == (8, 1, 1, 0)
+
+
+def test_backoff_doubles_up_to_the_maximum_with_jitter():
+    delays = list(itertools.islice(backoff_delays(initial=1.0, maximum=8.0), 8))
+    ceilings = [1.0, 2.0, 4.0, 8.0, 8.0, 8.0, 8.0, 8.0]
+    for delay, ceiling in zip(delays, ceilings):
+        assert ceiling / 2 <= delay <= ceiling
+
+
+# A BroadcastServer on an ephemeral port, fed by `source` every `interval` seconds
+async def start_server(source, interval=0.005, **kwargs):
+    server = BroadcastServer("127.0.0.1", 0, source, interval, **kwargs)
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    producer = asyncio.create_task(server.produce())
+    return server, listener, producer, listener.sockets[0].getsockname()[1]
+
+
+async def stop_server(listener, producer, *tasks):
+    for task in (producer,) + tasks:
+        task.cancel()
+    listener.close()
+
+
+async def connect(port, sequenced=True, stream=0, resume_after=0):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(encode_hello(FORMAT_BINARY, sequenced, stream, resume_after))
+    check_hello_reply(await read_frame(reader), FORMAT_BINARY)
+    return reader, writer
+
+
+async def read_frame(reader):
+    (length,) = FRAME_HEADER.unpack(await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), 5))
+    return await reader.readexactly(length)
+
+
+# (stream, sequence, replayed) of the next sequenced batch
+async def read_batch(reader):
+    stream, sequence, _timestamp, flags, _payload = decode_sequenced(await read_frame(reader))
+    return stream, sequence, bool(flags & SEQUENCE_REPLAYED)
+
+
+# An unsequenced client that keeps the server producing while the one under test is away
+async def keep_producing(port):
+    reader, _writer = await connect(port, sequenced=False)
+    while await reader.read(1 << 16):
+        pass
+
+
+# Receive a few batches, drop the connection and let the server send `away_batches` more
+async def leave_and_wait(server, port, away_batches):
+    reader, writer = await connect(port)
+    tracker = SequenceTracker()
+    for _ in range(3):
+        stream, sequence, _replayed = await read_batch(reader)
+        tracker.accept(stream, sequence)
+    writer.close()
+    left_at = tracker.last
+    while server.sequence < left_at + away_batches:
+        await asyncio.sleep(0.01)
+    return tracker
+
+
+# Reconnect from where `tracker` left off; returns the replayed and the first live sequence numbers
+async def come_back(port, tracker):
+    reader, writer = await connect(port, True, tracker.stream, tracker.last)
+    replayed = []
+    while True:
+        stream, sequence, was_replayed = await read_batch(reader)
+        tracker.accept(stream, sequence)
+        if not was_replayed:
+            writer.close()
+            return replayed, sequence
+        replayed.append(sequence)
+
+
+def test_reconnecting_client_is_replayed_the_batches_it_missed():
+    async def scenario():
+        server, listener, producer, port = await start_server(random_batches(10))
+        keeper = asyncio.create_task(keep_producing(port))
+        tracker = await leave_and_wait(server, port, away_batches=20)
+        left_at = tracker.last
+        replayed, live = await come_back(port, tracker)
+        await stop_server(listener, producer, keeper)
+        return left_at, replayed, live, tracker
+
+    left_at, replayed, live, tracker = asyncio.run(scenario())
+    assert len(replayed) >= 20
+    assert replayed == list(range(left_at + 1, left_at + 1 + len(replayed)))
+    assert live == replayed[-1] + 1
+    assert (tracker.gaps, tracker.missed) == (0, 0)
+
+
+def test_client_sees_a_gap_once_the_buffer_rolled_past_its_resume_point():
+    async def scenario():
+        # Five batches of ten points fit in the buffer
+        server, listener, producer, port = await start_server(random_batches(10), replay_points=50)
+        keeper = asyncio.create_task(keep_producing(port))
+        tracker = await leave_and_wait(server, port, away_batches=20)
+        held = (len(server.replay_buffer), server.replay_points)
+        left_at = tracker.last
+        replayed, _live = await come_back(port, tracker)
+        await stop_server(listener, producer, keeper)
+        return held, left_at, replayed, tracker
+
+    (batches, points), left_at, replayed, tracker = asyncio.run(scenario())
+    assert batches <= 5 and points <= 50
+    assert replayed and replayed[0] > left_at + 1
+    assert tracker.gaps == 1
+    assert tracker.missed == replayed[0] - left_at - 1
+
+
+def test_batches_are_only_kept_for_sequenced_clients():
+    async def scenario():
+        server, listener, producer, port = await start_server(random_batches(10), replay_window=0)
+        keeper = asyncio.create_task(keep_producing(port))
+        while server.sequence < 20:
+            await asyncio.sleep(0.01)
+        unsequenced_only = len(server.replay_buffer)
+        reader, writer = await connect(port)
+        first = server.sequence
+        while server.sequence < first + 10:
+            await asyncio.sleep(0.01)
+        kept_while_connected = len(server.replay_buffer)
+        writer.close()
+        while server.sequenced_clients:
+            await asyncio.sleep(0.01)
+        last = server.sequence
+        while server.sequence < last + 5:
+            await asyncio.sleep(0.01)
+        kept_after_window = len(server.replay_buffer)
+        await stop_server(listener, producer, keeper)
+        return unsequenced_only, kept_while_connected, kept_after_window
+
+    unsequenced_only, kept_while_connected, kept_after_window = asyncio.run(scenario())
+    assert unsequenced_only == 0
+    assert kept_while_connected >= 10
+    assert kept_after_window == 0
@@ -0,0 +1,66 @@
+import asyncio
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from server import BroadcastServer, random_batches
+from shm_ring import RingReader, SharedPointRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedPointRing.create(1000, f"test-ring-{uuid.uuid4().hex[:12]}")
+    yield ring
+    ring.close()
+
+
+def test_reader_sees_points_and_a_lap_as_lost(ring):
+    reader = RingReader(ring.name)
+    ring.write(np.arange(10.0), np.arange(10.0) * 2, channel=3)
+    xs, ys, channels = reader.read_new()
+    assert xs.tolist() == list(range(10)) and ys.tolist() == list(range(0, 20, 2))
+    assert set(channels) == {3}
+    ring.write(np.arange(1500.0), np.arange(1500.0))
+    xs, _, _ = reader.read_new()
+    assert len(xs) == 1000 and reader.lost == 500
+    reader.close()
+
+
+def test_quiet_writer_that_keeps_beating_is_alive(ring):
+    reader = RingReader(ring.name, writer_timeout=0.3)
+    for _ in range(6):
+        time.sleep(0.1)
+        ring.beat()
+        assert not reader.closed
+    reader.close()
+
+
+def test_writer_without_heartbeat_is_taken_for_dead(ring):
+    reader = RingReader(ring.name, writer_timeout=0.3)
+    assert not reader.closed
+    time.sleep(0.4)
+    assert reader.closed
+    reader.close()
+
+
+def test_slow_server_stays_alive_until_it_stops(ring):
+    async def scenario():
+        # One batch every ten seconds: far longer than the reader waits for a heartbeat
+        server = BroadcastServer(host="127.0.0.1", port=0, source=random_batches(10), interval=10.0,
+                                 local_ring=ring)
+        running = asyncio.create_task(server.run())
+        reader = RingReader(ring.name, writer_timeout=1.0)
+        try:
+            await asyncio.sleep(2.0)
+            assert not reader.closed
+            running.cancel()  # Dies without closing the ring, like a crashed server
+            await asyncio.gather(running, return_exceptions=True)
+            await asyncio.sleep(1.2)
+            assert reader.closed
+        finally:
+            running.cancel()
+            reader.close()
+
+    asyncio.run(scenario())
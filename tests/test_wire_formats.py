@@ -0,0 +1,188 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from protocol import (BINARY_HEADER, BINARY_MAGIC, BINARY_VERSION, FORMAT_BINARY, FORMAT_JSON, FORMAT_MSGPACK,
+                      FORMAT_XOR_LZ4, MAX_FRAME_SIZE, XOR_FORMATS, XOR_MAGIC, ProtocolError, decode_points,
+                      encode_points, peek_channel)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+needs_msgpack = pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+
+# lz4 is optional too; XOR_FORMATS only lists it when it is installed
+UNCOMPRESSED_FORMATS = [FORMAT_JSON, FORMAT_BINARY]
+ALWAYS_AVAILABLE = UNCOMPRESSED_FORMATS + list(XOR_FORMATS)
+
+# What the clients count as a malformed batch (JSON decoding surfaces the json module's own errors)
+MALFORMED = (ProtocolError, ValueError, KeyError, TypeError)
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 5, 500), rng.uniform(-20, 80, 500)
+
+
+def xor_payload(body, count, wire_format):
+    if wire_format == FORMAT_XOR_LZ4:
+        import lz4.frame
+        block = lz4.frame.compress(body)
+    else:
+        block = zlib.compress(body)
+    return BINARY_HEADER.pack(XOR_MAGIC, BINARY_VERSION, 0, count) + block
+
+
+@pytest.mark.parametrize("wire_format", ALWAYS_AVAILABLE)
+@pytest.mark.parametrize("channel", [None, 0, 7, 0xFFFF])
+def test_round_trip(points, wire_format, channel):
+    xs, ys = points
+    payload = encode_points(xs, ys, wire_format, channel)
+    assert peek_channel(payload, wire_format) == (0 if channel is None else channel)
+    decoded_xs, decoded_ys = decode_points(payload, wire_format)
+    np.testing.assert_array_equal(decoded_xs, xs)
+    np.testing.assert_array_equal(decoded_ys, ys)
+
+
+@pytest.mark.parametrize("wire_format", ALWAYS_AVAILABLE)
+def test_empty_batch(wire_format):
+    payload = encode_points(np.empty(0), np.empty(0), wire_format)
+    assert peek_channel(payload, wire_format) == 0
+    assert all(len(column) == 0 for column in decode_points(payload, wire_format))
+
+
+@pytest.mark.parametrize("wire_format", ALWAYS_AVAILABLE)
+def test_non_finite_readings_survive(wire_format):
+    xs = np.array([0.0, 1.0, 2.0])
+    ys = np.array([np.nan, np.inf, -np.inf])
+    decoded_xs, decoded_ys = decode_points(encode_points(xs, ys, wire_format), wire_format)
+    np.testing.assert_array_equal(decoded_xs, xs)
+    np.testing.assert_array_equal(decoded_ys, ys)
+
+
+@pytest.mark.parametrize("wire_format", ALWAYS_AVAILABLE)
+def test_truncated_batch_is_rejected(points, wire_format):
+    payload = encode_points(*points, wire_format, 3)
+    for cut in (0, 5, len(payload) // 2, len(payload) - 1):
+        with pytest.raises(MALFORMED):
+            decode_points(payload[:cut], wire_format)
+
+
+@pytest.mark.parametrize("payload", [b"{", b"[1, 2]", b'[{"x": 1}]', b'{"channel": 1}', b"null"])
+def test_malformed_json_is_rejected(payload):
+    with pytest.raises(MALFORMED):
+        decode_points(payload, FORMAT_JSON)
+
+
+def test_json_channel_out_of_range_is_rejected():
+    with pytest.raises(ProtocolError):
+        peek_channel(b'{"channel": 70000, "points": []}', FORMAT_JSON)
+
+
+@pytest.mark.parametrize("wire_format", [FORMAT_BINARY] + list(XOR_FORMATS))
+def test_wrong_magic_or_version_is_rejected(points, wire_format):
+    payload = encode_points(*points, wire_format)
+    for header in (b"ZZ" + payload[2:3], payload[:2] + bytes([BINARY_VERSION + 1])):
+        with pytest.raises(ProtocolError):
+            decode_points(header + payload[3:], wire_format)
+
+
+def test_binary_batch_with_extra_bytes_is_rejected(points):
+    with pytest.raises(ProtocolError):
+        decode_points(encode_points(*points, FORMAT_BINARY) + b"\0" * 16, FORMAT_BINARY)
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_slowly_varying_batch_is_compressed(wire_format):
+    xs = np.linspace(0, 10, 1000)
+    ys = 3.7 + 0.001 * np.sin(xs)
+    payload = encode_points(xs, ys, wire_format, 5)
+    assert payload[:2] == XOR_MAGIC
+    assert len(payload) < len(encode_points(xs, ys, FORMAT_BINARY, 5)) // 2
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_incompressible_batch_falls_back_to_binary(wire_format):
+    # Random bit patterns, NaNs included: nothing for the XOR step or the compressor to find
+    rng = np.random.default_rng(0)
+    xs, ys = (np.frombuffer(rng.bytes(8 * 1000), dtype="<f8") for _ in range(2))
+    payload = encode_points(xs, ys, wire_format, 5)
+    assert payload[:2] == BINARY_MAGIC
+    assert payload == encode_points(xs, ys, FORMAT_BINARY, 5)
+    assert peek_channel(payload, wire_format) == 5
+    decoded_xs, decoded_ys = decode_points(payload, wire_format)
+    assert decoded_xs.tobytes() == xs.tobytes() and decoded_ys.tobytes() == ys.tobytes()
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_corrupt_compressed_block_is_rejected(wire_format):
+    xs = np.linspace(0, 10, 1000)
+    payload = bytearray(encode_points(xs, xs, wire_format))
+    assert payload[:2] == XOR_MAGIC
+    payload[BINARY_HEADER.size + 2:] = bytes(len(payload) - BINARY_HEADER.size - 2)
+    with pytest.raises(ProtocolError):
+        decode_points(bytes(payload), wire_format)
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_block_larger_than_its_header_promises_is_rejected(wire_format):
+    # A few kilobytes that inflate to 64 MB, for a header that claims ten points
+    bomb = xor_payload(bytes(MAX_FRAME_SIZE), 10, wire_format)
+    assert len(bomb) < MAX_FRAME_SIZE // 100
+    with pytest.raises(ProtocolError):
+        decode_points(bomb, wire_format)
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_block_smaller_than_its_header_promises_is_rejected(wire_format):
+    with pytest.raises(ProtocolError):
+        decode_points(xor_payload(bytes(16 * 10), 11, wire_format), wire_format)
+
+
+@pytest.mark.parametrize("wire_format", XOR_FORMATS)
+def test_count_too_large_for_a_frame_is_rejected_before_decompressing(wire_format):
+    count = MAX_FRAME_SIZE // 16 + 1
+    with pytest.raises(ProtocolError, match="would not fit"):
+        decode_points(xor_payload(b"", count, wire_format), wire_format)
+
+
+@needs_msgpack
+@pytest.mark.parametrize("channel", [None, 0, 7, 0xFFFF])
+def test_msgpack_round_trip(points, channel):
+    xs, ys = points
+    payload = encode_points(xs, ys, FORMAT_MSGPACK, channel)
+    assert peek_channel(payload, FORMAT_MSGPACK) == (0 if channel is None else channel)
+    decoded_xs, decoded_ys = decode_points(payload, FORMAT_MSGPACK)
+    np.testing.assert_array_equal(decoded_xs, xs)
+    np.testing.assert_array_equal(decoded_ys, ys)
+
+
+@needs_msgpack
+def test_msgpack_peek_reads_only_the_channel(points):
+    xs, ys = points
+    payload = encode_points(xs, ys, FORMAT_MSGPACK, 3)
+    # Cutting the points off the end does not matter to peek_channel, only to decoding
+    truncated = payload[:len(payload) // 4]
+    assert peek_channel(truncated, FORMAT_MSGPACK) == 3
+    with pytest.raises(ProtocolError):
+        decode_points(truncated, FORMAT_MSGPACK)
+
+
+@needs_msgpack
+def test_msgpack_empty_batch():
+    payload = encode_points(np.empty(0), np.empty(0), FORMAT_MSGPACK)
+    assert peek_channel(payload, FORMAT_MSGPACK) == 0
+    assert all(len(column) == 0 for column in decode_points(payload, FORMAT_MSGPACK))
+
+
+@needs_msgpack
+@pytest.mark.parametrize("payload", [b"\xc1", [1, 2], {"channel": "a", "x": []}])
+def test_malformed_msgpack_is_rejected(payload):
+    if not isinstance(payload, bytes):
+        payload = msgpack.packb(payload)
+    with pytest.raises(ProtocolError):
+        peek_channel(payload, FORMAT_MSGPACK)